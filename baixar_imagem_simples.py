@@ -1,25 +1,31 @@
 import os
 import json
-import requests
 from pathlib import Path
 from bs4 import BeautifulSoup
 import time
 from tqdm import tqdm
+from src.armazem_imagens import ArmazemImagens
+from src.baixador import Baixador
+from src.variantes_imagens import url_grande
 
 # Configurações
 DATA_DIR = Path("data")
 IMOVEIS_JSON = DATA_DIR / "imoveis.json"
 IMOVEIS_COM_IMAGENS_JSON = DATA_DIR / "imoveis_com_imagens.json"
 IMAGES_DIR = DATA_DIR / "imagens_simples"
-
-# Criar diretórios se não existirem
-IMAGES_DIR.mkdir(exist_ok=True, parents=True)
+# As imagens ficam no armazém (data/armazem), na coleção imagens_simples de cada imóvel;
+# se a primeira imagem já foi baixada por outro script, o conteúdo não é duplicado
+ARMAZEM = ArmazemImagens()
+COLECAO = "imagens_simples"
 
 # Headers para simular um navegador real
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
+# Downloads com sessão compartilhada e retomáveis, gravados direto no armazém
+BAIXADOR = Baixador(HEADERS)
+
 def carregar_imoveis():
     """Carrega os dados dos imóveis do arquivo JSON."""
     print(f"Carregando dados de {IMOVEIS_JSON}...")
@@ -42,7 +48,7 @@ def obter_primeira_imagem(url):
         # Fazer requisição com retry
         for tentativa in range(3):
             try:
-                response = requests.get(url, headers=HEADERS, timeout=20)
+                response = BAIXADOR.sessao.get(url, headers=HEADERS, timeout=20)
                 response.raise_for_status()
                 break
             except Exception as e:
@@ -65,7 +71,7 @@ def obter_primeira_imagem(url):
             # Obter URL da imagem grande, não thumbnail
             imagem_url = primeiro_slide['src']
             # Converter de média (im) para grande (il)
-            imagem_url = imagem_url.replace('/im/', '/il/')
+            imagem_url = url_grande(imagem_url)
             print(f"  ✓ Encontrada primeira imagem do carrossel")
         
         # Método 2: Verificar atributo data-rsbigimg (contém a URL da imagem grande)
@@ -80,14 +86,14 @@ def obter_primeira_imagem(url):
             thumb_selecionada = soup.select_one(".rsNavSelected img.rsTmb")
             if thumb_selecionada and thumb_selecionada.has_attr('src'):
                 # Converter de thumbnail (it) para grande (il)
-                imagem_url = thumb_selecionada['src'].replace('/it/', '/il/')
+                imagem_url = url_grande(thumb_selecionada['src'])
                 print(f"  ✓ Usando imagem grande da thumbnail selecionada")
         
         # Método 4: Qualquer imagem principal do carrossel
         if not imagem_url:
             qualquer_img = soup.select_one(".royalSlider img.rsMainSlideImage")
             if qualquer_img and qualquer_img.has_attr('src'):
-                imagem_url = qualquer_img['src'].replace('/im/', '/il/')
+                imagem_url = url_grande(qualquer_img['src'])
                 print(f"  ✓ Usando imagem do slide principal")
         
         # Método 5: Elemento span com background-image (alternativa comum)
@@ -98,7 +104,7 @@ def obter_primeira_imagem(url):
                 bg_match = re.search(r'background-image: url\((.*?)\)', bg_span['style'])
                 if bg_match:
                     # Extrair URL do background e converter para versão grande
-                    imagem_url = bg_match.group(1).replace('/it/', '/il/')
+                    imagem_url = url_grande(bg_match.group(1))
                     print(f"  ✓ Extraído URL do background-image")
         
         # Ajustar URL relativa
@@ -121,31 +127,25 @@ def obter_primeira_imagem(url):
         print(f"  ✗ Erro ao acessar a página: {e}")
         return None
 
+def salvar_no_armazem(url, codigo):
+    """Baixa a URL para o armazém, registra a imagem do imóvel e retorna o caminho relativo para o JSON."""
+    blob = BAIXADOR.baixar_para_armazem(url, ARMAZEM)["blob"]
+    # Imagem sem alteração no servidor (304): o manifesto já aponta para o mesmo blob
+    if ARMAZEM.imagens(codigo, COLECAO).get(f"{codigo}.jpg") != blob:
+        ARMAZEM.registrar(codigo, COLECAO, f"{codigo}.jpg", blob)
+    return ARMAZEM.url_blob(blob)
+
 def baixar_imagem(url, codigo):
-    """Baixa a imagem e salva com o código do imóvel como nome."""
+    """Baixa a imagem e a registra no armazém com o código do imóvel como nome."""
     if not url:
         print(f"  ✗ URL vazia para o imóvel {codigo}")
         return None
     
-    # Nome do arquivo: código do imóvel + .jpg
-    nome_arquivo = f"{codigo}.jpg"
-    caminho_imagem = IMAGES_DIR / nome_arquivo
-    
     try:
-        response = requests.get(url, headers=HEADERS, stream=True, timeout=15)
-        
-        if response.status_code == 200:
-            with open(caminho_imagem, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-            
-            # Caminho relativo para salvar no JSON
-            caminho_relativo = f"imagens_simples/{nome_arquivo}"
-            print(f"  ✓ Imagem salva em {caminho_relativo}")
-            return caminho_relativo
-        else:
-            print(f"  ✗ Erro ao baixar imagem: Status {response.status_code}")
-            return None
+        # Caminho relativo para salvar no JSON
+        caminho_relativo = salvar_no_armazem(url, codigo)
+        print(f"  ✓ Imagem salva em {caminho_relativo}")
+        return caminho_relativo
     
     except Exception as e:
         print(f"  ✗ Erro ao baixar imagem: {e}")
@@ -155,28 +155,35 @@ def baixar_imagem_placeholder(codigo):
     """Baixa uma imagem de placeholder se não foi possível obter a imagem real."""
     print(f"  → Criando placeholder para imóvel {codigo}")
     
-    nome_arquivo = f"{codigo}.jpg"
-    caminho_imagem = IMAGES_DIR / nome_arquivo
-    
     placeholder_url = f"https://placehold.co/800x600/0d6efd/white?text=Im%C3%B3vel%20{codigo}"
     
     try:
-        response = requests.get(placeholder_url, stream=True, timeout=10)
-        
-        if response.status_code == 200:
-            with open(caminho_imagem, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-            
-            caminho_relativo = f"imagens_simples/{nome_arquivo}"
-            print(f"  ✓ Placeholder salvo em {caminho_relativo}")
-            return caminho_relativo
-        else:
-            return None
+        caminho_relativo = salvar_no_armazem(placeholder_url, codigo)
+        print(f"  ✓ Placeholder salvo em {caminho_relativo}")
+        return caminho_relativo
     except Exception as e:
         print(f"  ✗ Erro ao criar placeholder: {e}")
         return None
 
+def urls_anteriores():
+    """{codigo: URL da imagem} gravados na execução anterior, para conferir se a imagem mudou."""
+    if not IMOVEIS_COM_IMAGENS_JSON.exists():
+        return {}
+    try:
+        with open(IMOVEIS_COM_IMAGENS_JSON, 'r', encoding='utf-8') as f:
+            return {imovel.get("codigo"): imovel["imagem_url"] for imovel in json.load(f) if imovel.get("imagem_url")}
+    except (json.JSONDecodeError, AttributeError):
+        return {}
+
+def imagem_existente(codigo):
+    """Caminho relativo da imagem já baixada (no armazém ou no diretório antigo), ou None."""
+    blob = ARMAZEM.imagens(codigo, COLECAO).get(f"{codigo}.jpg")
+    if blob and ARMAZEM.caminho_blob(blob).exists():
+        return ARMAZEM.url_blob(blob)
+    if (IMAGES_DIR / f"{codigo}.jpg").exists():
+        return f"imagens_simples/{codigo}.jpg"
+    return None
+
 def main():
     """Função principal."""
     print("\n===== BAIXADOR SIMPLES DE IMAGENS DE IMÓVEIS =====\n")
@@ -189,6 +196,7 @@ def main():
     
     # Lista para armazenar os imóveis com imagens
     imoveis_atualizados = []
+    urls = urls_anteriores()
     
     # Processar cada imóvel
     for i, imovel in enumerate(tqdm(imoveis, desc="Processando imóveis")):
@@ -203,13 +211,16 @@ def main():
         print(f"\n[{i+1}/{len(imoveis)}] Processando imóvel {codigo}")
         
         # Verificar se a imagem já existe
-        nome_arquivo = f"{codigo}.jpg"
-        caminho_imagem = IMAGES_DIR / nome_arquivo
+        existente = imagem_existente(codigo)
         
-        if caminho_imagem.exists():
-            print(f"  ✓ Imagem já existe: imagens_simples/{nome_arquivo}")
+        if existente:
+            print(f"  ✓ Imagem já existe: {existente}")
+            # Com a URL da execução anterior, um pedido condicional traz a foto só se ela mudou
+            if urls.get(codigo):
+                existente = baixar_imagem(urls[codigo], codigo) or existente
+                imovel["imagem_url"] = urls[codigo]
             # Adicionar o caminho da imagem ao imóvel
-            imovel["imagem_principal"] = f"imagens_simples/{nome_arquivo}"
+            imovel["imagem_principal"] = existente
             imoveis_atualizados.append(imovel)
             continue
         
@@ -220,6 +231,8 @@ def main():
         caminho_salvo = None
         if imagem_url:
             caminho_salvo = baixar_imagem(imagem_url, codigo)
+            if caminho_salvo:
+                imovel["imagem_url"] = imagem_url
         
         # Se não conseguiu baixar, criar um placeholder
         if not caminho_salvo:
@@ -242,18 +255,18 @@ def main():
         if i < len(imoveis) - 1:
             time.sleep(1)
     
+    BAIXADOR.encerrar()
+    
     # Salvar o resultado final
     with open(IMOVEIS_COM_IMAGENS_JSON, 'w', encoding='utf-8') as f:
         json.dump(imoveis_atualizados, f, ensure_ascii=False, indent=4)
     
     print("\n===== PROCESSO CONCLUÍDO =====")
     print(f"Total de imóveis processados: {len(imoveis)}")
-    print(f"Imagens salvas em: {IMAGES_DIR}")
+    print(BAIXADOR.resumo())
+    print(f"Imagens salvas em: {ARMAZEM.raiz} (coleção {COLECAO})")
     print(f"Dados atualizados salvos em: {IMOVEIS_COM_IMAGENS_JSON}")
-    print("\nPara usar estas imagens no RAG:")
-    print("1. Modifique o arquivo app.py para incluir:")
-    print('   app.mount("/imagens_simples", StaticFiles(directory=str(DATA_DIR / "imagens_simples")), name="imagens_simples")')
-    print("2. Atualize o arquivo assistente.py para usar o novo caminho de imagens")
+    print("\nOs caminhos blobs/... gravados em imagem_principal são servidos pela API em /blobs.")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
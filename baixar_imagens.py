@@ -1,23 +1,94 @@
 import os
 import json
 import re
-import requests
 from pathlib import Path
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 import time
-import shutil
 from urllib.parse import urljoin
+from src.armazem_imagens import ArmazemImagens
+from src.baixador import Baixador
+from src.hash_perceptual import (carregar_hashes, calcular_hashes, distancia, duplicatas_do_imovel,
+                                 LIMITE_DHASH, LIMITE_PHASH)
 
 # Configurações
 DATA_DIR = Path("data")
 IMOVEIS_JSON = DATA_DIR / "imoveis.json"
-IMAGES_DIR = DATA_DIR / "images_new"
 ORIG_IMAGES_DIR = DATA_DIR / "images"
+# As imagens ficam no armazém (data/armazem), na coleção images_new de cada imóvel
+ARMAZEM = ArmazemImagens()
+COLECAO = "images_new"
+# URLs que repetem outra foto da mesma galeria, para não baixá-las de novo: {codigo: {url: url mantida}}
+ARQUIVO_URLS_DUPLICADAS = DATA_DIR / "urls_duplicadas.json"
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
+# Criados no primeiro uso: importar o módulo não abre sessão, pool de threads nem arquivos
+_baixador = None
+_hashes_perceptuais = None
+_hashes_por_conteudo = None
+_urls_duplicadas = None
+
+def baixador():
+    """Downloads com sessão compartilhada, em paralelo e retomáveis, gravados direto no armazém."""
+    global _baixador
+    if _baixador is None:
+        _baixador = Baixador(HEADERS)
+    return _baixador
+
+def hashes_perceptuais():
+    """Quase duplicatas calculadas por src/hash_perceptual.py (vazio se ainda não foi executado)."""
+    global _hashes_perceptuais
+    if _hashes_perceptuais is None:
+        _hashes_perceptuais = carregar_hashes()
+    return _hashes_perceptuais
+
+def hashes_por_conteudo():
+    """{hash do conteúdo: entrada} dos hashes perceptuais já calculados, para não decodificar a imagem de novo."""
+    global _hashes_por_conteudo
+    if _hashes_por_conteudo is None:
+        _hashes_por_conteudo = {entrada["hash"]: entrada for entrada in hashes_perceptuais().get("imagens", {}).values()
+                                if "hash" in entrada}
+    return _hashes_por_conteudo
+
+def urls_duplicadas():
+    global _urls_duplicadas
+    if _urls_duplicadas is None:
+        _urls_duplicadas = {}
+        if ARQUIVO_URLS_DUPLICADAS.exists():
+            try:
+                with open(ARQUIVO_URLS_DUPLICADAS, 'r', encoding='utf-8') as f:
+                    _urls_duplicadas = json.load(f)
+            except json.JSONDecodeError:
+                print(f"Arquivo {ARQUIVO_URLS_DUPLICADAS} inválido, conferindo todas as URLs de novo")
+    return _urls_duplicadas
+
+def salvar_urls_duplicadas():
+    if _urls_duplicadas is None:
+        return
+    ARQUIVO_URLS_DUPLICADAS.parent.mkdir(parents=True, exist_ok=True)
+    temporario = ARQUIVO_URLS_DUPLICADAS.with_suffix(".tmp")
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(_urls_duplicadas, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, ARQUIVO_URLS_DUPLICADAS)
+
+def hashes_do_blob(blob):
+    """(pHash, dHash) do blob, ou None se ele não for uma imagem válida.
+
+    Usa os hashes de src/hash_perceptual.py quando o mesmo conteúdo já foi processado.
+    """
+    entrada = hashes_por_conteudo().get(blob[:32])
+    if entrada is None:
+        _, entrada = calcular_hashes((blob, str(ARMAZEM.caminho_blob(blob)), 0, 0))
+        hashes_por_conteudo()[blob[:32]] = entrada
+    if "erro" in entrada:
+        return None
+    return int(entrada["phash"], 16), int(entrada["dhash"], 16)
+
+def mesma_foto(a, b):
+    return a is not None and b is not None and distancia(a[0], b[0]) <= LIMITE_PHASH and distancia(a[1], b[1]) <= LIMITE_DHASH
+
 def carregar_imoveis():
     """Carrega os dados dos imóveis do arquivo JSON."""
     print(f"Carregando dados de {IMOVEIS_JSON}...")
@@ -40,7 +111,7 @@ def obter_imagens_imovel(url, codigo):
         # Fazer a requisição com retry
         for tentativa in range(3):
             try:
-                response = requests.get(url, headers=HEADERS, timeout=20)
+                response = baixador().sessao.get(url, headers=HEADERS, timeout=20)
                 response.raise_for_status()
                 break
             except Exception as e:
@@ -93,58 +164,97 @@ def obter_imagens_imovel(url, codigo):
         print(f"  Erro ao processar imóvel {codigo}: {e}")
         return []
 
-def baixar_imagem(img_url, diretorio, nome_arquivo):
-    """Baixa uma imagem e salva no diretório especificado."""
-    caminho_completo = diretorio / nome_arquivo
-    
+def esperar_download(futuro):
+    """Espera o download agendado e retorna o blob, ou None se ele falhou."""
     try:
-        response = requests.get(img_url, headers=HEADERS, stream=True, timeout=10)
-        
-        if response.status_code == 200:
-            with open(caminho_completo, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-            print(f"    ✓ Imagem salva em {caminho_completo}")
-            return True
-        else:
-            print(f"    ✗ Erro ao baixar imagem: Status {response.status_code}")
-            return False
-            
+        return futuro.result()["blob"]
     except Exception as e:
         print(f"    ✗ Erro ao baixar imagem: {e}")
+        return None
+
+def registrar_download(futuro, codigo, nome_arquivo):
+    """Espera o download agendado e registra a imagem no armazém com o nome especificado."""
+    blob = esperar_download(futuro)
+    if blob is None:
         return False
+    ARMAZEM.registrar(codigo, COLECAO, nome_arquivo, blob)
+    print(f"    ✓ Imagem salva em {ARMAZEM.url_blob(blob)}")
+    return True
 
-def usar_imagens_existentes(codigo):
-    """Verifica se já existem imagens para este imóvel e as copia."""
+def baixar_imagem(img_url, codigo, nome_arquivo):
+    """Baixa uma imagem e a registra no armazém com o nome especificado."""
+    return registrar_download(baixador().agendar_para_armazem(img_url, ARMAZEM), codigo, nome_arquivo)
+
+def baixar_imagens_imovel(codigo, imagens):
+    """Baixa as imagens do imóvel em paralelo e as registra como 1.jpg, 2.jpg, ...
+
+    Uma foto quase idêntica a outra já mantida na galeria (mesmos limites de
+    src/hash_perceptual.py) não é registrada, e a URL dela não é baixada nas próximas execuções.
+    """
+    conhecidas = urls_duplicadas().setdefault(str(codigo), {})
+    for img_url in imagens:
+        if img_url in conhecidas:
+            print(f"    - Ignorada {img_url} (mesma foto que {conhecidas[img_url]})")
+    agendadas = [(img_url, baixador().agendar_para_armazem(img_url, ARMAZEM)) for img_url in imagens if img_url not in conhecidas]
+
+    mantidas = []  # (url, hashes)
+    for img_url, futuro in agendadas:
+        blob = esperar_download(futuro)
+        if blob is None:
+            continue
+        hashes = hashes_do_blob(blob)
+        repetida = next((url_mantida for url_mantida, outros in mantidas if mesma_foto(hashes, outros)), None)
+        if repetida is not None:
+            conhecidas[img_url] = repetida
+            print(f"    - Ignorada {img_url} (mesma foto que {repetida})")
+            continue
+        mantidas.append((img_url, hashes))
+        ARMAZEM.registrar(codigo, COLECAO, f"{len(mantidas)}.jpg", blob)
+        print(f"    ✓ Imagem salva em {ARMAZEM.url_blob(blob)}")
+    return len(mantidas)
+
+def imagens_existentes(codigo):
+    """Retorna {nome: (arquivo, blob ou None)} das imagens já baixadas em data/images (migradas ou não)."""
+    existentes = {nome: (ARMAZEM.caminho_blob(blob), blob)
+                  for nome, blob in ARMAZEM.imagens(codigo, "images").items() if nome.endswith('.jpg')}
     origem = ORIG_IMAGES_DIR / str(codigo)
-    destino = IMAGES_DIR / str(codigo)
+    if origem.exists():
+        for arquivo in origem.glob('*.jpg'):
+            existentes[arquivo.name] = (arquivo, None)
+    return existentes
+
+def usar_imagens_existentes(codigo):
+    """Verifica se já existem imagens para este imóvel e as registra, sem copiar, na coleção images_new."""
+    existentes = imagens_existentes(codigo)
     
-    # Se o diretório de origem existe e tem arquivos
-    if origem.exists() and list(origem.glob('*.jpg')):
-        print(f"  Copiando imagens existentes para o imóvel {codigo}")
+    # Se o imóvel já tem imagens baixadas
+    if existentes:
+        print(f"  Registrando imagens existentes para o imóvel {codigo}")
         
-        # Garantir que o diretório de destino exista
-        destino.mkdir(exist_ok=True, parents=True)
+        # A mesma foto em outro tamanho ou compressão aparece uma vez só na galeria
+        duplicatas = duplicatas_do_imovel(hashes_perceptuais(), codigo)
         
-        # Copiar cada arquivo
-        for i, arquivo in enumerate(sorted(origem.glob('*.jpg'))):
+        manifesto = ARMAZEM.manifesto(codigo)
+        colecao = manifesto.setdefault("colecoes", {}).setdefault(COLECAO, {})
+        for nome in sorted(duplicatas):
+            print(f"    - Ignorado {nome} (mesma foto que {duplicatas[nome]})")
+        for i, nome in enumerate(sorted(nome for nome in existentes if nome not in duplicatas)):
+            arquivo, blob = existentes[nome]
             novo_nome = f"{i+1}.jpg"
-            shutil.copy2(arquivo, destino / novo_nome)
-            print(f"    ✓ Copiado {arquivo.name} para {novo_nome}")
+            colecao[novo_nome] = blob or ARMAZEM.guardar_arquivo(arquivo)
+            print(f"    ✓ Registrado {nome} como {novo_nome}")
+        ARMAZEM.salvar_manifesto(manifesto)
         
         return True
     return False
 
 def baixar_imagens_alternativas(codigo):
     """Baixa imagens de placeholder para garantir que sempre haja uma imagem."""
-    diretorio = IMAGES_DIR / str(codigo)
-    diretorio.mkdir(exist_ok=True, parents=True)
-    
     # Se não tem nenhum arquivo, criar pelo menos um placeholder
-    if not list(diretorio.glob('*.jpg')):
+    if not ARMAZEM.imagens(codigo, COLECAO):
         print(f"  Criando imagem placeholder para imóvel {codigo}")
         placeholder_url = f"https://placehold.co/800x600/0d6efd/white?text=Im%C3%B3vel%20{codigo}"
-        baixar_imagem(placeholder_url, diretorio, "1.jpg")
+        baixar_imagem(placeholder_url, codigo, "1.jpg")
         return True
     
     return False
@@ -153,9 +263,6 @@ def main():
     """Função principal."""
     print("\n===== BAIXADOR DE IMAGENS DE IMÓVEIS =====\n")
     
-    # Criar diretório para as novas imagens
-    IMAGES_DIR.mkdir(exist_ok=True, parents=True)
-    
     # Carregar os imóveis
     imoveis = carregar_imoveis()
     if not imoveis:
@@ -181,10 +288,6 @@ def main():
                 
                 print(f"\n[Prioritário] Processando imóvel {codigo}")
                 
-                # Criar diretório para este imóvel
-                diretorio_imovel = IMAGES_DIR / str(codigo)
-                diretorio_imovel.mkdir(exist_ok=True, parents=True)
-                
                 # Verificar se já temos imagens para este imóvel
                 if usar_imagens_existentes(codigo):
                     processados.add(codigo)
@@ -194,9 +297,7 @@ def main():
                 imagens = obter_imagens_imovel(link, codigo)
                 
                 # Baixar as imagens
-                for j, img_url in enumerate(imagens[:10]):  # Limitar a 10 imagens por imóvel
-                    nome_arquivo = f"{j+1}.jpg"
-                    baixar_imagem(img_url, diretorio_imovel, nome_arquivo)
+                baixar_imagens_imovel(codigo, imagens[:10])  # Limitar a 10 imagens por imóvel
                 
                 # Se não encontrou imagens, criar pelo menos um placeholder
                 if not imagens:
@@ -221,10 +322,6 @@ def main():
         
         print(f"\n[{i+1}/{len(imoveis)}] Processando imóvel {codigo}")
         
-        # Criar diretório para este imóvel
-        diretorio_imovel = IMAGES_DIR / str(codigo)
-        diretorio_imovel.mkdir(exist_ok=True, parents=True)
-        
         # Verificar se já temos imagens para este imóvel
         if usar_imagens_existentes(codigo):
             continue
@@ -233,9 +330,7 @@ def main():
         imagens = obter_imagens_imovel(link, codigo)
         
         # Baixar as imagens
-        for j, img_url in enumerate(imagens[:10]):  # Limitar a 10 imagens por imóvel
-            nome_arquivo = f"{j+1}.jpg"
-            baixar_imagem(img_url, diretorio_imovel, nome_arquivo)
+        baixar_imagens_imovel(codigo, imagens[:10])  # Limitar a 10 imagens por imóvel
         
         # Se não encontrou imagens, criar pelo menos um placeholder
         if not imagens:
@@ -245,9 +340,13 @@ def main():
         if i < len(imoveis) - 1:
             time.sleep(1)
     
+    baixador().encerrar()
+    salvar_urls_duplicadas()
+    
     print("\n===== PROCESSO CONCLUÍDO =====")
-    print(f"As imagens foram salvas em: {IMAGES_DIR}")
-    print("Para usar estas imagens, modifique o arquivo app.py para apontar para o novo diretório.")
+    print(baixador().resumo())
+    print(f"As imagens foram salvas em: {ARMAZEM.raiz} (coleção {COLECAO})")
+    print("A API continua servindo os caminhos /images/<codigo>/<n>.jpg a partir do armazém.")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -6,6 +6,8 @@ from bs4 import BeautifulSoup
 import time
 from tqdm import tqdm
 import re
+from src.variantes_imagens import url_grande
+from src.links_imagens import limpar_imovel
 
 # Configurações
 DATA_DIR = Path("data")
@@ -62,7 +64,7 @@ def extrair_imagens_royal_slider(soup, url_base):
             img_url = url_base + ('' if img_url.startswith('/') else '/') + img_url
         
         # Substituir para obter versão de maior qualidade
-        img_url_grande = img_url.replace('/it/', '/il/').replace('/im/', '/il/')
+        img_url_grande = url_grande(img_url)
         
         if img_url_grande not in imagens:
             imagens.append(img_url_grande)
@@ -83,7 +85,7 @@ def extrair_imagens_royal_slider(soup, url_base):
                 img_url = url_base + ('' if img_url.startswith('/') else '/') + img_url
                 
             # Substituir para obter versão de maior qualidade
-            img_url_grande = img_url.replace('/it/', '/il/').replace('/im/', '/il/')
+            img_url_grande = url_grande(img_url)
             
             if img_url_grande not in imagens:
                 imagens.append(img_url_grande)
@@ -99,8 +101,8 @@ def extrair_imagens_royal_slider(soup, url_base):
             elif not img_url.startswith('http'):
                 img_url = url_base + ('' if img_url.startswith('/') else '/') + img_url
             
-            # Substituir '/it/' por '/il/' para obter imagens em tamanho maior
-            img_url_grande = img_url.replace('/it/', '/il/').replace('/im/', '/il/')
+            # Converter a miniatura (it) para a variante grande (il)
+            img_url_grande = url_grande(img_url)
             
             if img_url_grande not in imagens:
                 imagens.append(img_url_grande)
@@ -126,7 +128,7 @@ def extrair_todas_imagens(soup, url_base):
                 img_url = url_base + ('' if img_url.startswith('/') else '/') + img_url
             
             # Tentar converter para versão grande
-            img_url_grande = img_url.replace('/it/', '/il/').replace('/im/', '/il/')
+            img_url_grande = url_grande(img_url)
             
             if img_url_grande not in imagens:
                 imagens.append(img_url_grande)
@@ -210,18 +212,12 @@ def main():
         # Extrair links das imagens
         links_imagens = extrair_links_imagens(link, codigo)
         
-        # Atualizar o objeto do imóvel com os links das imagens
-        if links_imagens:
-            # Guardar todos os links
-            imovel["links_imagens"] = links_imagens
-            
-            # Guardar o primeiro link como imagem principal
-            imovel["imagem_principal"] = links_imagens[0]
-        else:
-            # Usar URL de placeholder
-            placeholder_url = f"https://placehold.co/800x600/0d6efd/white?text=Im%C3%B3vel%20{codigo}"
-            imovel["imagem_principal"] = placeholder_url
-            imovel["links_imagens"] = [placeholder_url]
+        # Guardar os links limpos (variante grande), as três variantes de cada imagem e o
+        # primeiro link como imagem principal. Sem imagens a lista fica vazia: a interface
+        # mostra o placeholder, que não é gravado como se fosse uma foto do imóvel
+        imovel["links_imagens"] = links_imagens
+        imovel["imagem_principal"] = links_imagens[0] if links_imagens else None
+        imovel = limpar_imovel(imovel)
         
         # Adicionar o imóvel atualizado à lista
         imoveis_atualizados.append(imovel)
@@ -247,6 +243,8 @@ def main():
     print("1. Use o arquivo JSON atualizado nos seus scripts da web")
     print("2. Na sua aplicação, use 'imagem_principal' para mostrar a principal")
     print("3. Use 'links_imagens' para mostrar todas as imagens do imóvel")
+    print("4. Use 'variantes_imagens' (it, im, il) para escolher o tamanho de cada uso")
+    print("\nPara remover os links mortos: python src/links_imagens.py")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""Controle de admissão das requisições da API.
+
+As rotas rápidas (busca e consulta de imóveis) e as perguntas ao assistente
+(/perguntar) passam por faixas separadas, cada uma com um limite de requisições em
+execução e uma fila limitada. Quando a fila de uma faixa está cheia, a requisição é
+recusada na hora (503) em vez de esperar, e um pico de perguntas não ocupa as threads
+usadas pelas rotas rápidas e pelos arquivos estáticos. A espera pelo modelo de
+linguagem não conta na faixa: ela é limitada em AssistenteImobiliaria.agerar_resposta,
+que responde com o texto estruturado quando a fila do modelo passa de LIMITE_FILA_LLM.
+"""
+
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+
+# Configurações
+FAIXA_RAPIDA_LIMITE = int(os.getenv("FAIXA_RAPIDA_LIMITE", "64"))  # requisições rápidas em execução
+FAIXA_RAPIDA_FILA = int(os.getenv("FAIXA_RAPIDA_FILA", "256"))  # requisições rápidas aguardando
+# Abaixo das 40 threads padrão do servidor, para sobrar threads para as rotas rápidas e os estáticos
+FAIXA_LLM_LIMITE = int(os.getenv("FAIXA_LLM_LIMITE", "16"))
+FAIXA_LLM_FILA = int(os.getenv("FAIXA_LLM_FILA", "64"))
+
+
+class Sobrecarga(Exception):
+    """A fila da faixa está cheia; a requisição deve ser recusada."""
+
+    def __init__(self, faixa: str):
+        super().__init__(f"Faixa {faixa} sobrecarregada")
+        self.faixa = faixa
+
+
+class Faixa:
+    """Limite de requisições simultâneas com fila limitada."""
+
+    def __init__(self, nome: str, limite: int, fila_max: int):
+        self.nome = nome
+        self.limite = limite
+        self.fila_max = fila_max
+        self.semaforo: Optional[asyncio.Semaphore] = None
+        self.em_execucao = 0
+        self.aguardando = 0
+        self.admitidas = 0
+        self.recusadas = 0
+
+    @asynccontextmanager
+    async def admitir(self):
+        """Entra na faixa, esperando na fila se preciso; lança Sobrecarga se a fila estiver cheia."""
+        if self.semaforo is None:
+            self.semaforo = asyncio.Semaphore(self.limite)
+        if self.em_execucao >= self.limite and self.aguardando >= self.fila_max:
+            self.recusadas += 1
+            raise Sobrecarga(self.nome)
+
+        self.aguardando += 1
+        try:
+            await self.semaforo.acquire()
+        finally:
+            self.aguardando -= 1
+
+        self.em_execucao += 1
+        self.admitidas += 1
+        try:
+            yield
+        finally:
+            self.em_execucao -= 1
+            self.semaforo.release()
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "limite": self.limite,
+            "fila_max": self.fila_max,
+            "em_execucao": self.em_execucao,
+            "aguardando": self.aguardando,
+            "admitidas": self.admitidas,
+            "recusadas": self.recusadas
+        }
+
+
+FAIXA_RAPIDA = Faixa("rapida", FAIXA_RAPIDA_LIMITE, FAIXA_RAPIDA_FILA)
+FAIXA_LLM = Faixa("llm", FAIXA_LLM_LIMITE, FAIXA_LLM_FILA)
@@ -0,0 +1,139 @@
+"""Registro de alterações (write-ahead log) dos imóveis.
+
+Inclusões, atualizações e exclusões feitas pela API administrativa são gravadas em
+data/imoveis_wal.jsonl antes de serem aplicadas ao índice em memória. Na carga, as
+alterações são reaplicadas sobre o índice montado dos arquivos de dados; de tempos em
+tempos elas são consolidadas no JSON de imóveis e no snapshot, e o registro é zerado.
+
+Formato: a primeira linha é o cabeçalho {"base": <versão dos dados>} e cada linha
+seguinte é uma alteração {"op": "salvar", "imovel": {...}} ou {"op": "remover", "codigo": "..."}.
+Se os arquivos de dados mudarem (ex.: nova raspagem) antes da consolidação, as
+alterações são reaplicadas sobre a versão nova e o cabeçalho passa a apontar para ela.
+As operações são idempotentes (substituir pelo código, excluir pelo código), então
+reaplicá-las sobre dados que já as contêm não muda nada.
+"""
+
+import os
+import json
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+REGISTRO_PADRAO = DATA_DIR / "imoveis_wal.jsonl"
+
+
+class RegistroAlteracoes:
+    """Arquivo de alterações compartilhado pelos workers do servidor."""
+
+    def __init__(self, caminho: Path = REGISTRO_PADRAO):
+        self.caminho = Path(caminho)
+        self.caminho_trava = self.caminho.with_suffix(".lock")
+        # A trava pode ser tomada de novo pela mesma thread (ex.: aplicar() dentro da consolidação)
+        self._trava_local = threading.RLock()
+        self._nivel = 0
+
+    @contextmanager
+    def travado(self):
+        """Trava o registro entre processos enquanto ele é lido ou modificado."""
+        with self._trava_local:
+            if self._nivel:
+                self._nivel += 1
+                try:
+                    yield
+                finally:
+                    self._nivel -= 1
+                return
+            with open(self.caminho_trava, 'a') as trava:
+                if fcntl:
+                    fcntl.flock(trava, fcntl.LOCK_EX)
+                self._nivel = 1
+                try:
+                    yield
+                finally:
+                    self._nivel = 0
+                    if fcntl:
+                        fcntl.flock(trava, fcntl.LOCK_UN)
+
+    def ler(self) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """Retorna a versão base e as alterações registradas (ignora uma última linha incompleta)."""
+        if not self.caminho.exists():
+            return None, []
+
+        base = None
+        alteracoes = []
+        with open(self.caminho, 'r', encoding='utf-8') as f:
+            for numero, linha in enumerate(f):
+                try:
+                    registro = json.loads(linha)
+                except json.JSONDecodeError:
+                    print(f"Linha {numero + 1} incompleta em {self.caminho}, ignorando o restante")
+                    break
+                if numero == 0:
+                    base = registro.get("base")
+                else:
+                    alteracoes.append(registro)
+        return base, alteracoes
+
+    def registrar(self, base: str, alteracao: Dict[str, Any]):
+        """Acrescenta a alteração ao registro e a grava em disco antes de retornar.
+
+        `base` só é usada quando o registro ainda não existe. Um cabeçalho com outra
+        versão (consolidação feita por outro worker, ou dados trocados desde a última
+        recarga) é mantido: na carga as alterações são reaplicadas sobre a versão atual.
+        """
+        linha = json.dumps(alteracao, ensure_ascii=False) + "\n"
+        with self.travado():
+            novo = not self.caminho.exists() or self.caminho.stat().st_size == 0
+            if not novo:
+                # Uma gravação interrompida pode ter deixado a última linha sem o "\n"
+                with open(self.caminho, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        linha = "\n" + linha
+            with open(self.caminho, 'a', encoding='utf-8') as f:
+                if novo:
+                    f.write(json.dumps({"base": base}) + "\n")
+                f.write(linha)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def reiniciar(self, base: str, alteracoes: List[Dict[str, Any]] = ()):
+        """Regrava o registro sobre a versão `base` dos dados, só com `alteracoes`.
+
+        Sem alterações, zera o registro depois que elas foram consolidadas.
+        """
+        temporario = self.caminho.with_suffix(".tmp")
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"base": base}) + "\n")
+            for alteracao in alteracoes:
+                f.write(json.dumps(alteracao, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.caminho)
+
+    def aplicar(self, indice):
+        """Retorna o índice (recém-carregado dos dados) com as alterações registradas aplicadas.
+
+        Se o registro foi gravado sobre outra versão dos dados, as alterações são
+        reaplicadas sobre a versão do índice e o cabeçalho é atualizado para ela.
+        """
+        with self.travado():
+            base, alteracoes = self.ler()
+            if base is not None and base != indice.versao:
+                print(f"Registro de alterações {self.caminho} era da versão {base} dos dados, "
+                      f"reaplicando sobre a versão {indice.versao}")
+                self.reiniciar(indice.versao, alteracoes)
+        if not alteracoes:
+            return indice
+
+        for alteracao in alteracoes:
+            indice = indice.aplicar(alteracao)
+        print(f"Aplicadas {len(alteracoes)} alterações do registro (versão {indice.versao})")
+        return indice
@@ -1,16 +1,30 @@
 import os
 import json
+import asyncio
+import secrets
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Union
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request, Form, HTTPException
+from fastapi import FastAPI, Request, Form, HTTPException, Query, Header, Depends
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, FileResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 
 from assistente import AssistenteImobiliaria
+from indice import assinatura_dados
+from alteracoes import REGISTRO_PADRAO
+from cache_http import calcular_etag, responder_json, codificar_json, etag_confere
+from projecoes import PROJECOES, campos_da_requisicao
+from admissao import FAIXA_RAPIDA, FAIXA_LLM, Sobrecarga
+from imagens import (RedimensionadorImagens, ImagemInvalida, FORMATOS, ARMAZEM, DIRETORIOS_LOCAIS,
+                     arquivo_local, entrada_catalogo, hash_do_blob, imagens_do_imovel, url_remota)
+from respostas import GerenciadorRespostas
+from sessoes import GerenciadorSessoes
+from metricas import METRICAS
 
 # Carregar variáveis de ambiente
 load_dotenv(Path(__file__).parent / '.env')
@@ -18,6 +32,11 @@ load_dotenv(Path(__file__).parent / '.env')
 # Configurações
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8000"))
+INTERVALO_DESCONEXAO = float(os.getenv("INTERVALO_DESCONEXAO", "0.25"))  # segundos entre verificações
+INTERVALO_RECARGA = float(os.getenv("INTERVALO_RECARGA", "5"))  # segundos entre verificações dos arquivos de dados (0 desativa)
+INTERVALO_CONSOLIDACAO = float(os.getenv("INTERVALO_CONSOLIDACAO", "300"))  # segundos entre consolidações do registro de alterações (0 desativa)
+LOTE_MAX_IMOVEIS = int(os.getenv("LOTE_MAX_IMOVEIS", "100"))  # códigos por requisição em /imoveis/lote
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # token exigido pelos endpoints /admin (vazio desativa)
 STATIC_DIR = Path(__file__).parent / "static"
 TEMPLATES_DIR = Path(__file__).parent / "templates"
 DATA_DIR = Path(__file__).parent.parent / "data"
@@ -25,24 +44,17 @@ DATA_DIR = Path(__file__).parent.parent / "data"
 # Criar o diretório de arquivos estáticos se não existir
 STATIC_DIR.mkdir(exist_ok=True)
 
-# Certificar-se de que o caminho da imagem de placeholder existe
+# A imagem de placeholder faz parte do repositório; nada é baixado na inicialização
 PLACEHOLDER_IMG = STATIC_DIR / "placeholder.jpg"
 if not PLACEHOLDER_IMG.exists():
-    # Se não existir, tentar criar um placeholder vazio
-    try:
-        import requests
-        print("Baixando imagem de placeholder...")
-        response = requests.get("https://placehold.co/600x400/e9ecef/495057?text=Im%C3%B3vel", stream=True)
-        if response.status_code == 200:
-            with open(PLACEHOLDER_IMG, 'wb') as f:
-                f.write(response.content)
-            print(f"Placeholder criado em {PLACEHOLDER_IMG}")
-    except Exception as e:
-        print(f"Erro ao criar imagem de placeholder: {e}")
+    print(f"AVISO: imagem de placeholder não encontrada em {PLACEHOLDER_IMG}")
 
 # Definir modelos de dados para a API
 class PerguntaRequest(BaseModel):
     pergunta: str = Field(..., description="Pergunta do usuário sobre imóveis")
+    assincrono: bool = Field(False, description="Retornar logo após a busca e gerar o texto em segundo plano")
+    sessao_id: Optional[str] = Field(None, description="Identificador da conversa, para perguntas de continuação")
+    incluir_metricas: bool = Field(False, description="Incluir na resposta o tempo de cada etapa, tokens e custo")
 
 class ImovelRelacionado(BaseModel):
     codigo: str = Field(..., description="Código do imóvel")
@@ -60,6 +72,33 @@ class RespostaAssistente(BaseModel):
     resposta: str = Field(..., description="Resposta do assistente")
     imoveis_relacionados: List[ImovelRelacionado] = Field(default_factory=list, description="Imóveis relacionados à pergunta")
     imagens_relacionadas: List[str] = Field(default_factory=list, description="Imagens relacionadas à pergunta")
+    answer_id: Optional[str] = Field(None, description="Identificador para consultar a resposta em /respostas/{answer_id}")
+    sessao_id: Optional[str] = Field(None, description="Identificador da conversa usada na resposta")
+    metricas: Optional[Dict[str, Any]] = Field(None, description="Tempo por etapa, caminho, tokens e custo da resposta")
+
+class RespostaPendente(BaseModel):
+    answer_id: str = Field(..., description="Identificador da resposta")
+    status: str = Field(..., description="Estado da geração: pendente, concluida ou erro")
+    resposta: Optional[str] = Field(None, description="Texto da resposta, quando concluída")
+
+class ImovelEntrada(BaseModel):
+    """Imóvel completo enviado para inclusão ou atualização (substitui o imóvel com o mesmo código)."""
+    model_config = {"extra": "allow"}
+    
+    codigo: str = Field(..., min_length=1, description="Código do imóvel")
+    titulo: str = Field("Sem título", description="Título do imóvel")
+    preco: str = Field("", description="Preço do imóvel (ex.: R$ 589.900,00)")
+    endereco: str = Field("", description="Endereço do imóvel")
+    caracteristicas: Dict[str, str] = Field(default_factory=dict, description="Características (Dormitórios, Garagem, Tipo...)")
+    descricao: str = Field("", description="Descrição do imóvel")
+    link: str = Field("", description="Link para a página do imóvel")
+    imagens: List[str] = Field(default_factory=list, description="Imagens do imóvel")
+    imagens_locais: List[str] = Field(default_factory=list, description="Imagens baixadas localmente")
+    links_imagens: List[str] = Field(default_factory=list, description="Links das imagens no site")
+    variantes_imagens: List[Dict[str, str]] = Field(default_factory=list, description="Variantes it, im e il de cada link de imagem")
+
+class LoteImoveis(BaseModel):
+    codigos: List[str] = Field(..., min_length=1, max_length=LOTE_MAX_IMOVEIS, description="Códigos dos imóveis")
 
 class FiltrosImoveis(BaseModel):
     dormitorios: Optional[int] = Field(None, description="Número de dormitórios")
@@ -67,11 +106,105 @@ class FiltrosImoveis(BaseModel):
     preco_max: Optional[float] = Field(None, description="Preço máximo")
     caracteristicas: Optional[List[str]] = Field(None, description="Lista de características desejadas")
 
+# Estado da aplicação, preenchido em segundo plano pelo lifespan
+assistente: Optional[AssistenteImobiliaria] = None
+gerenciador_respostas: Optional[GerenciadorRespostas] = None
+gerenciador_sessoes = GerenciadorSessoes()
+redimensionador: Optional[RedimensionadorImagens] = None
+erro_inicializacao: Optional[str] = None
+
+def carregar_assistente():
+    """Carrega os dados e o modelo do assistente (executado fora do loop de eventos)."""
+    global assistente, gerenciador_respostas, erro_inicializacao
+    try:
+        novo_assistente = AssistenteImobiliaria()
+        gerenciador_respostas = GerenciadorRespostas(novo_assistente)
+        assistente = novo_assistente
+    except Exception as e:
+        erro_inicializacao = str(e)
+        print(f"Erro ao inicializar o assistente: {e}")
+
+async def recarregar_dados() -> bool:
+    """Monta o novo índice fora do loop de eventos e o troca no assistente."""
+    return await run_in_threadpool(assistente.recarregar_dados)
+
+async def observar_dados(assinatura):
+    """Recarrega o índice quando os arquivos de imóveis ou o snapshot mudam.
+    
+    A recarga só acontece depois que os arquivos ficam um intervalo inteiro sem mudar,
+    para não ler um JSON que ainda está sendo gravado pelos scrapers.
+    """
+    pendente = None
+    while True:
+        await asyncio.sleep(INTERVALO_RECARGA)
+        atual = assinatura_dados(extras=[REGISTRO_PADRAO])
+        if assistente is None or atual == assinatura:
+            pendente = None
+            continue
+        if atual != pendente:
+            pendente = atual
+            continue
+        
+        assinatura, pendente = atual, None
+        try:
+            await recarregar_dados()
+        except Exception as e:
+            print(f"Erro ao recarregar os dados (mantendo a versão atual): {e}")
+
+async def consolidar_periodicamente():
+    """Consolida de tempos em tempos o registro de alterações no JSON de imóveis e no snapshot."""
+    while True:
+        await asyncio.sleep(INTERVALO_CONSOLIDACAO)
+        if assistente is None:
+            continue
+        try:
+            await run_in_threadpool(assistente.consolidar_alteracoes)
+        except Exception as e:
+            print(f"Erro ao consolidar o registro de alterações: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicia o carregamento dos dados sem bloquear a inicialização do servidor.
+    
+    O servidor aceita conexões imediatamente; /pronto indica quando os dados estão carregados.
+    Depois disso, alterações nos arquivos de dados são recarregadas sem reiniciar o servidor.
+    """
+    # A assinatura é lida antes do carregamento para não perder alterações feitas durante ele
+    assinatura = assinatura_dados(extras=[REGISTRO_PADRAO])
+    carregamento = asyncio.create_task(run_in_threadpool(carregar_assistente))
+    tarefas = []
+    if INTERVALO_RECARGA > 0:
+        tarefas.append(asyncio.create_task(observar_dados(assinatura)))
+    if INTERVALO_CONSOLIDACAO > 0:
+        tarefas.append(asyncio.create_task(consolidar_periodicamente()))
+    yield
+    for tarefa in tarefas:
+        tarefa.cancel()
+    if redimensionador is not None:
+        redimensionador.encerrar()
+    if not carregamento.done():
+        print("Servidor encerrado antes de terminar o carregamento dos dados")
+
+def obter_assistente() -> AssistenteImobiliaria:
+    """Retorna o assistente carregado ou responde 503 enquanto os dados estão sendo carregados."""
+    if assistente is None:
+        detalhe = f"Erro ao inicializar o assistente: {erro_inicializacao}" if erro_inicializacao else "Assistente ainda carregando os dados"
+        raise HTTPException(status_code=503, detail=detalhe, headers={"Retry-After": "1"})
+    return assistente
+
+def verificar_admin(token: Optional[str]):
+    """Exige o cabeçalho X-Admin-Token igual a ADMIN_TOKEN nos endpoints administrativos."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Endpoints administrativos desativados (defina ADMIN_TOKEN)")
+    if not token or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token administrativo inválido")
+
 # Inicializar o aplicativo FastAPI
 app = FastAPI(
     title="Assistente Imobiliário - Nova Torres",
     description="API para o assistente de IA da imobiliária Nova Torres",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurar templates
@@ -80,14 +213,60 @@ templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 # Configurar arquivos estáticos
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
-# Manter estes mounts para compatibilidade com versões antigas
-# Agora eles serão usados apenas como fallback
-app.mount("/images", StaticFiles(directory=str(DATA_DIR / "images_new")), name="images")
-app.mount("/data/images", StaticFiles(directory=str(DATA_DIR / "images")), name="data_images")
-app.mount("/imagens_simples", StaticFiles(directory=str(DATA_DIR / "imagens_simples")), name="imagens_simples")
+class ArquivosImutaveis(StaticFiles):
+    """Arquivos estáticos que nunca mudam no mesmo caminho (o nome é o hash do conteúdo)."""
+    
+    def file_response(self, *args, **kwargs) -> Response:
+        resposta = super().file_response(*args, **kwargs)
+        resposta.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return resposta
+
+# Imagens do armazém endereçado pelo conteúdo (src/armazem_imagens.py)
+ARMAZEM.dir_blobs.mkdir(parents=True, exist_ok=True)
+app.mount("/blobs", ArquivosImutaveis(directory=str(ARMAZEM.dir_blobs)), name="blobs")
+
+def rota_imagem_antiga(prefixo: str):
+    """Rota de um caminho antigo (/images, /data/images, /imagens_simples), resolvido pelo armazém."""
+    async def imagem_local_antiga(caminho: str):
+        arquivo = arquivo_local(f"{prefixo}/{caminho}")
+        if arquivo is None:
+            raise HTTPException(status_code=404, detail="Imagem não encontrada")
+        # Arquivos que não são imagens (downloads truncados, páginas HTML) não chegam ao navegador
+        entrada = entrada_catalogo(f"{prefixo}/{caminho}", arquivo)
+        if entrada is not None and not entrada["valida"]:
+            raise HTTPException(status_code=404, detail="Imagem inválida")
+        # Imagens já migradas vão para o blob, que o navegador guarda sem revalidar
+        if hash_do_blob(arquivo) is not None:
+            return RedirectResponse(url="/" + ARMAZEM.url_blob(arquivo.name), status_code=302)
+        return FileResponse(arquivo)
+    return imagem_local_antiga
+
+# Manter estes caminhos para compatibilidade com versões antigas
+for prefixo_antigo in DIRETORIOS_LOCAIS:
+    app.add_api_route(f"/{prefixo_antigo}/{{caminho:path}}", rota_imagem_antiga(prefixo_antigo),
+                      methods=["GET", "HEAD"], include_in_schema=False)
+
+@app.exception_handler(Sobrecarga)
+async def recusar_sobrecarga(request: Request, erro: Sobrecarga):
+    """Requisições recusadas pelo controle de admissão (ver admissao.py)."""
+    return JSONResponse(status_code=503, content={"detail": f"Servidor sobrecarregado ({erro.faixa}), tente novamente"},
+                        headers={"Retry-After": "1"})
+
+async def faixa_rapida():
+    """Dependência das rotas rápidas (busca e consulta de imóveis)."""
+    async with FAIXA_RAPIDA.admitir():
+        yield
+
+@app.get("/saude")
+async def saude():
+    """Liveness: o processo está de pé e respondendo."""
+    return {"status": "ok"}
 
-# Inicializar o assistente
-assistente = AssistenteImobiliaria()
+@app.get("/pronto")
+async def pronto():
+    """Readiness: os dados foram carregados e o assistente pode responder."""
+    obter_assistente()
+    return {"status": "pronto", "imoveis": len(assistente.indice), "versao": assistente.indice.versao}
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
@@ -97,54 +276,310 @@ async def index(request: Request):
         {"request": request, "title": "Assistente Imobiliário - Nova Torres"}
     )
 
+async def executar_enquanto_conectado(request: Request, corrotina):
+    """Executa a corrotina, cancelando-a se o cliente desconectar antes do fim.
+    
+    Retorna None quando o cliente desconectou; o cancelamento interrompe a chamada
+    ao modelo em andamento e libera a vaga de concorrência que ela ocupava.
+    """
+    tarefa = asyncio.ensure_future(corrotina)
+    try:
+        while True:
+            concluidas, _ = await asyncio.wait({tarefa}, timeout=INTERVALO_DESCONEXAO)
+            if concluidas:
+                return tarefa.result()
+            if await request.is_disconnected():
+                print("Cliente desconectou, cancelando a geração da resposta")
+                return None
+    finally:
+        if not tarefa.done():
+            tarefa.cancel()
+
+async def preparar_contexto(assistente: AssistenteImobiliaria, pergunta: str, sessao=None) -> Dict[str, Any]:
+    """Busca os imóveis e monta o prompt em uma thread, dentro da faixa de admissão das perguntas.
+    
+    A faixa limita só esta etapa, que ocupa threads do servidor; a espera pelo modelo é
+    controlada em agerar_resposta, que usa a resposta estruturada quando a fila está longa.
+    """
+    async with FAIXA_LLM.admitir():
+        return await run_in_threadpool(assistente.preparar_resposta, pergunta, sessao)
+
+async def responder_pergunta(pergunta: str, sessao=None) -> Dict[str, Any]:
+    """Busca os imóveis e gera a resposta, permitindo cancelamento entre as etapas."""
+    assistente = obter_assistente()
+    contexto = await preparar_contexto(assistente, pergunta, sessao)
+    return {
+        "resposta": await assistente.agerar_resposta(contexto),
+        "fragmentos_relacionados": contexto["fragmentos_relacionados"],
+        "imagens_relacionadas": contexto["imagens_relacionadas"],
+        "metricas": contexto["metricas"]
+    }
+
+def montar_resposta(resposta: str, fragmentos: List[bytes], imagens: List[str], answer_id: Optional[str],
+                    sessao_id: Optional[str], metricas: Optional[Dict[str, Any]]) -> Response:
+    """Monta o JSON de RespostaAssistente juntando os imóveis já serializados pelo índice.
+    
+    Os imóveis relacionados não passam por dicts, validação do pydantic nem json.dumps
+    a cada requisição: cada um é serializado uma vez por versão dos dados (IndiceImoveis.fragmento).
+    """
+    corpo = b"".join([
+        b'{"resposta":', codificar_json(resposta),
+        b',"imoveis_relacionados":[', b",".join(fragmentos), b"]",
+        b',"imagens_relacionadas":', codificar_json(imagens),
+        b',"answer_id":', codificar_json(answer_id),
+        b',"sessao_id":', codificar_json(sessao_id),
+        b',"metricas":', codificar_json(metricas),
+        b"}"
+    ])
+    return Response(content=corpo, media_type="application/json")
+
 @app.post("/perguntar", response_model=RespostaAssistente)
-async def perguntar(pergunta_request: PerguntaRequest):
+async def perguntar(pergunta_request: PerguntaRequest, request: Request):
     """Endpoint para fazer uma pergunta ao assistente."""
     pergunta = pergunta_request.pergunta
     
     if not pergunta or pergunta.strip() == "":
         raise HTTPException(status_code=400, detail="A pergunta não pode estar vazia")
     
+    assistente = obter_assistente()
+    sessao = gerenciador_sessoes.obter(pergunta_request.sessao_id) if pergunta_request.sessao_id else None
+    sessao_id = sessao.sessao_id if sessao else None
+    
     try:
-        resposta = assistente.responder(pergunta)
+        if pergunta_request.assincrono:
+            # Retornar os imóveis imediatamente e gerar o texto em segundo plano
+            contexto = await preparar_contexto(assistente, pergunta, sessao)
+            # Métricas parciais: a etapa do modelo ainda não aconteceu
+            metricas = contexto["metricas"].para_dict() if pergunta_request.incluir_metricas else None
+            return montar_resposta("", contexto["fragmentos_relacionados"], contexto["imagens_relacionadas"],
+                                   gerenciador_respostas.submeter(contexto), sessao_id, metricas)
+        
+        resposta = await executar_enquanto_conectado(request, responder_pergunta(pergunta, sessao))
+        if resposta is None:
+            # Ninguém vai ler a resposta; 499 é o código usado para "cliente encerrou a requisição"
+            return Response(status_code=499)
+        metricas = resposta["metricas"].para_dict() if pergunta_request.incluir_metricas else None
         
         # Nos certificamos que todas as imagens são URLs completas
         # Não é necessário modificá-las aqui, pois o assistente já retorna URLs completas
         
-        return resposta
+        return montar_resposta(resposta["resposta"], resposta["fragmentos_relacionados"],
+                               resposta["imagens_relacionadas"], None, sessao_id, metricas)
+    except Sobrecarga:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao processar a pergunta: {str(e)}")
 
+@app.get("/respostas/{answer_id}", response_model=RespostaPendente)
+async def obter_resposta(answer_id: str, aguardar: float = Query(0, ge=0, le=30, description="Segundos para aguardar a conclusão (long-polling)")):
+    """Endpoint para consultar uma resposta gerada em segundo plano."""
+    obter_assistente()
+    resultado = await gerenciador_respostas.obter(answer_id, aguardar)
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="Resposta não encontrada ou expirada")
+    return resultado
+
+@app.get("/metricas")
+async def obter_metricas():
+    """Endpoint com as métricas agregadas das respostas (latência por etapa, tokens e custo)."""
+    return {
+        **METRICAS.resumo(),
+        "admissao": {
+            "faixas": {faixa.nome: faixa.estado() for faixa in (FAIXA_RAPIDA, FAIXA_LLM)},
+            "fila_llm": assistente.fila_llm if assistente else 0
+        }
+    }
+
+@app.delete("/sessoes/{sessao_id}")
+async def encerrar_sessao(sessao_id: str):
+    """Endpoint para encerrar uma conversa e descartar seu estado."""
+    if not gerenciador_sessoes.encerrar(sessao_id):
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    return {"sessao_id": sessao_id, "encerrada": True}
+
+@app.post("/admin/recarregar")
+async def recarregar(x_admin_token: Optional[str] = Header(None)):
+    """Endpoint para recarregar os dados dos imóveis sem reiniciar o servidor."""
+    verificar_admin(x_admin_token)
+    assistente = obter_assistente()
+    try:
+        recarregado = await recarregar_dados()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao recarregar os dados: {str(e)}")
+    return {"recarregado": recarregado, "versao": assistente.indice.versao, "imoveis": len(assistente.indice)}
+
+@app.post("/admin/imoveis")
+async def salvar_imovel(imovel: ImovelEntrada, x_admin_token: Optional[str] = Header(None)):
+    """Endpoint para incluir um imóvel ou substituir o imóvel com o mesmo código."""
+    verificar_admin(x_admin_token)
+    assistente = obter_assistente()
+    novo = await run_in_threadpool(assistente.alterar_imovel, {"op": "salvar", "imovel": imovel.model_dump()})
+    return {"codigo": imovel.codigo, "versao": novo.versao, "imoveis": len(novo)}
+
+@app.delete("/admin/imoveis/{codigo}")
+async def remover_imovel(codigo: str, x_admin_token: Optional[str] = Header(None)):
+    """Endpoint para excluir um imóvel pelo código."""
+    verificar_admin(x_admin_token)
+    assistente = obter_assistente()
+    if assistente.indice.obter(codigo) is None:
+        raise HTTPException(status_code=404, detail=f"Imóvel {codigo} não encontrado")
+    novo = await run_in_threadpool(assistente.alterar_imovel, {"op": "remover", "codigo": codigo})
+    return {"codigo": codigo, "removido": True, "versao": novo.versao, "imoveis": len(novo)}
+
+@app.post("/admin/consolidar")
+async def consolidar(x_admin_token: Optional[str] = Header(None)):
+    """Endpoint para consolidar agora o registro de alterações no JSON de imóveis e no snapshot."""
+    verificar_admin(x_admin_token)
+    assistente = obter_assistente()
+    consolidado = await run_in_threadpool(assistente.consolidar_alteracoes)
+    return {"consolidado": consolidado, "versao": assistente.indice.versao}
+
 @app.get("/imagem/{path:path}")
-async def redirecionar_imagem(path: str):
-    """Redirecionar para links externos, caso necessário."""
-    # Verificar se o caminho é uma URL completa
-    if path.startswith(('http://', 'https://')):
-        return RedirectResponse(url=path)
-    
-    # Caso contrário, construir URL completa (assumindo que é um caminho relativo ao site da imobiliária)
-    url_completa = f"https://www.novatorres.com.br/{path.lstrip('/')}"
-    return RedirectResponse(url=url_completa)
-
-@app.post("/buscar", response_model=List[Dict[str, Any]])
-async def buscar(filtros: FiltrosImoveis):
-    """Endpoint para buscar imóveis com filtros específicos."""
+async def redirecionar_imagem(request: Request, path: str,
+                              w: Optional[int] = Query(None, ge=1, le=4096, description="Largura desejada em pixels"),
+                              fmt: Optional[str] = Query(None, description=f"Formato: {', '.join(FORMATOS)} (padrão: webp)")):
+    """Redirecionar para a imagem original ou, com `w`/`fmt`, servir a versão redimensionada.
+    
+    As versões geradas são identificadas pelo hash da imagem original, então podem ser
+    guardadas pelo navegador e por proxies sem revalidação.
+    """
+    if w is None and fmt is None:
+        return RedirectResponse(url=url_remota(path))
+    
+    global redimensionador
+    if redimensionador is None:
+        redimensionador = RedimensionadorImagens()
+    
+    async with FAIXA_RAPIDA.admitir():
+        try:
+            arquivo, chave = await run_in_threadpool(redimensionador.gerar, path, w, fmt or "webp")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except PermissionError as e:
+            raise HTTPException(status_code=403, detail=str(e))
+        except ImagemInvalida as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except Exception as e:
+            # Sem a versão redimensionada, o navegador ainda pode exibir a original
+            print(f"Erro ao redimensionar a imagem {path}: {e}")
+            if arquivo_local(path) is not None:
+                return RedirectResponse(url="/" + path.lstrip("/"))
+            return RedirectResponse(url=url_remota(path))
+    
+    etag = f'"{chave}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag_confere(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(arquivo, media_type=FORMATOS[fmt or "webp"], headers=headers)
+
+PARAMETRO_PROJECAO = Query(None, description=f"Projeção dos imóveis: {', '.join(PROJECOES)} (padrão: full)")
+PARAMETRO_FIELDS = Query(None, description="Campos separados por vírgula (ex.: codigo,preco,miniatura); tem prioridade sobre projecao")
+
+def campos_ou_400(projecao: Optional[str], fields: Optional[str]) -> Optional[List[str]]:
+    try:
+        return campos_da_requisicao(projecao, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def responder_busca(request: Request, filtros: FiltrosImoveis, projecao: Optional[str] = None,
+                    fields: Optional[str] = None) -> Response:
+    """Executa a busca com ETag derivado da versão do índice, dos filtros e dos campos pedidos.
+    
+    Consultas repetidas na mesma versão dos dados são respondidas do cache (ou com 304).
+    """
+    assistente = obter_assistente()
+    campos = campos_ou_400(projecao, fields)
+    
     try:
         # Converter para dicionário e remover valores None
         filtros_dict = filtros.dict()
         filtros_dict = {k: v for k, v in filtros_dict.items() if v is not None}
         
-        resultados = assistente.buscar_imoveis(filtros_dict)
-        return resultados
+        indice = assistente.indice
+        etag = calcular_etag(indice.versao, "buscar", filtros_dict, campos)
+        return responder_json(request, etag, lambda: assistente.buscar_imoveis(filtros_dict, indice=indice, campos=campos))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao processar a busca: {str(e)}")
 
+@app.post("/buscar", response_model=List[Dict[str, Any]], dependencies=[Depends(faixa_rapida)])
+async def buscar(filtros: FiltrosImoveis, request: Request,
+                 projecao: Optional[str] = PARAMETRO_PROJECAO, fields: Optional[str] = PARAMETRO_FIELDS):
+    """Endpoint para buscar imóveis com filtros específicos."""
+    return responder_busca(request, filtros, projecao, fields)
+
+@app.get("/buscar", response_model=List[Dict[str, Any]], dependencies=[Depends(faixa_rapida)])
+async def buscar_get(request: Request,
+                     dormitorios: Optional[int] = Query(None, description="Número de dormitórios"),
+                     bairro: Optional[str] = Query(None, description="Bairro ou área"),
+                     preco_max: Optional[float] = Query(None, description="Preço máximo"),
+                     caracteristicas: Optional[List[str]] = Query(None, description="Lista de características desejadas"),
+                     projecao: Optional[str] = PARAMETRO_PROJECAO, fields: Optional[str] = PARAMETRO_FIELDS):
+    """Endpoint de busca via GET, que pode ser revalidado com If-None-Match (304)."""
+    filtros = FiltrosImoveis(dormitorios=dormitorios, bairro=bairro, preco_max=preco_max, caracteristicas=caracteristicas)
+    return responder_busca(request, filtros, projecao, fields)
+
+@app.get("/imovel/{codigo}", dependencies=[Depends(faixa_rapida)])
+async def obter_imovel(codigo: str, request: Request,
+                       projecao: Optional[str] = PARAMETRO_PROJECAO, fields: Optional[str] = PARAMETRO_FIELDS):
+    """Endpoint para consultar um imóvel pelo código, sem passar pelo assistente."""
+    assistente = obter_assistente()
+    campos = campos_ou_400(projecao, fields)
+    indice = assistente.indice
+    posicao = indice.por_codigo.get(codigo)
+    if posicao is None:
+        raise HTTPException(status_code=404, detail=f"Imóvel {codigo} não encontrado")
+    
+    etag = calcular_etag(indice.versao, "imovel", codigo, campos)
+    return responder_json(request, etag, lambda: indice.projetado(posicao, campos))
+
+@app.get("/imovel/{codigo}/imagens", dependencies=[Depends(faixa_rapida)])
+async def obter_imagens_imovel(codigo: str):
+    """Imagens locais válidas do imóvel com dimensões, segundo o catálogo de imagens.
+    
+    Permite à interface escolher a largura pedida a /imagem sem abrir os arquivos.
+    """
+    return {"codigo": codigo, "imagens": await run_in_threadpool(imagens_do_imovel, codigo)}
+
+@app.post("/imoveis/lote", dependencies=[Depends(faixa_rapida)])
+async def obter_imoveis_lote(lote: LoteImoveis, request: Request,
+                             projecao: Optional[str] = PARAMETRO_PROJECAO, fields: Optional[str] = PARAMETRO_FIELDS):
+    """Endpoint para consultar vários imóveis pelo código de uma vez.
+    
+    Retorna os imóveis encontrados na ordem pedida e a lista dos códigos não encontrados.
+    """
+    assistente = obter_assistente()
+    campos = campos_ou_400(projecao, fields)
+    indice = assistente.indice
+    codigos = list(dict.fromkeys(lote.codigos))
+    
+    def gerar():
+        imoveis = []
+        nao_encontrados = []
+        for codigo in codigos:
+            posicao = indice.por_codigo.get(codigo)
+            if posicao is None:
+                nao_encontrados.append(codigo)
+            else:
+                imoveis.append(indice.projetado(posicao, campos))
+        return {"imoveis": imoveis, "nao_encontrados": nao_encontrados}
+    
+    etag = calcular_etag(indice.versao, "lote", codigos, campos)
+    return responder_json(request, etag, gerar)
+
 # Função para executar o aplicativo diretamente
-def main():
-    """Função para executar o aplicativo diretamente."""
+def main(workers: int = 1, reload: bool = False):
+    """Função para executar o aplicativo diretamente.
+    
+    Com reload=True o servidor reinicia a cada alteração no código (desenvolvimento).
+    Com workers > 1 são iniciados vários processos; o índice dos imóveis é lido do
+    mesmo snapshot mapeado em memória, compartilhado entre eles pelo sistema operacional.
+    """
     import uvicorn
-    print(f"Iniciando servidor em http://{HOST}:{PORT}")
-    uvicorn.run("app:app", host=HOST, port=PORT, reload=True)
+    if reload and workers > 1:
+        raise ValueError("O modo com recarregamento automático não suporta vários workers")
+    modo = "recarregamento automático" if reload else f"{workers} worker(s)"
+    print(f"Iniciando servidor em http://{HOST}:{PORT} ({modo})")
+    uvicorn.run("app:app", host=HOST, port=PORT, reload=reload, workers=workers)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main(reload=True) 
\ No newline at end of file
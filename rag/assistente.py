@@ -1,12 +1,19 @@
 import os
 import json
 import re
+import time
+import asyncio
+import threading
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
 from dotenv import load_dotenv
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+
+from modelos import criar_modelo
+from indice import carregar_indice, gerar_snapshot, arquivo_origem
+from alteracoes import RegistroAlteracoes
+from projecoes import CAMPOS_RELACIONADO
+from metricas import Medicao, METRICAS, CAMINHO_CODIGO, CAMINHO_BUSCA, CAMINHO_ERRO
 
 # Carregar variáveis de ambiente
 load_dotenv(Path(__file__).parent / '.env')
@@ -14,78 +21,109 @@ load_dotenv(Path(__file__).parent / '.env')
 # Configuração do armazenamento de documentos
 DOCUMENTOS_JSON = os.path.join(os.path.dirname(os.getenv("CHROMA_PERSIST_DIRECTORY", "./db")), "documentos.json")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+LIMITE_LLM = int(os.getenv("LIMITE_LLM", "8"))  # chamadas simultâneas ao modelo de linguagem
+LIMITE_FILA_LLM = int(os.getenv("LIMITE_FILA_LLM", "16"))  # respostas esperando o modelo antes de usar a resposta estruturada
+LIMITE_CANDIDATOS_SESSAO = 200  # imóveis guardados na sessão para refinar nas próximas perguntas
+LIMITE_IMAGENS = 5  # imagens devolvidas em cada resposta
+DATA_DIR = Path(__file__).parent.parent / "data"
 
 class AssistenteImobiliaria:
     """Assistente de IA para responder perguntas sobre imóveis."""
     
     def __init__(self):
         """Inicializa o assistente."""
-        self.dados_imoveis = None
+        self.indice = None  # IndiceImoveis com colunas normalizadas e mapa de códigos
+        self.registro = RegistroAlteracoes()  # Alterações feitas pela API administrativa (alteracoes.py)
+        self._trava_indice = threading.Lock()  # Evita duas recargas ou alterações do índice ao mesmo tempo
         self.llm = None  # Modelo de linguagem para respostas mais inteligentes
+        self._semaforo_llm = None  # Limita as chamadas assíncronas simultâneas ao modelo
+        self.fila_llm = 0  # Respostas esperando uma vaga no modelo
         self.inicializar()
     
     def inicializar(self):
         """Carrega os dados e configura o assistente."""
-        import os
-        import json
-        from pathlib import Path
-        from dotenv import load_dotenv
-        import sys
-        
-        # Garantir que estamos no diretório raiz
-        if os.path.basename(os.getcwd()) == "rag":
-            os.chdir('..')
-        
-        # Adicionar diretório raiz ao path para importações
-        sys.path.append(os.getcwd())
-        
-        # Configurações
-        self.data_dir = Path("data")
-        
-        # Tentar carregar dados com links de imagens primeiro
-        imoveis_com_links = self.data_dir / "imoveis_com_links.json"
-        imoveis_com_imagens = self.data_dir / "imoveis_com_imagens.json"
-        imoveis_json = self.data_dir / "imoveis.json"
-        
-        # Carregar o arquivo de imóveis (tentar primeiro os com links)
-        if imoveis_com_links.exists():
-            print("Usando arquivo com links de imagens...")
-            with open(imoveis_com_links, 'r', encoding='utf-8') as f:
-                self.dados_imoveis = json.load(f)
-        elif imoveis_com_imagens.exists():
-            print("Usando arquivo com caminhos locais de imagens...")
-            with open(imoveis_com_imagens, 'r', encoding='utf-8') as f:
-                self.dados_imoveis = json.load(f)
-        else:
-            print("Usando arquivo básico de imóveis...")
-            with open(imoveis_json, 'r', encoding='utf-8') as f:
-                self.dados_imoveis = json.load(f)
+        # Caminhos relativos a este arquivo, sem depender do diretório atual
+        self.data_dir = DATA_DIR
         
-        print(f"Carregados dados de {len(self.dados_imoveis)} imóveis.")
+        # Carregar o índice do snapshot binário (run_rag.py process) ou, se não houver
+        # snapshot atualizado, do arquivo JSON (tentando primeiro o com links de imagens),
+        # com as alterações ainda não consolidadas aplicadas por cima
+        self.indice = self._carregar_indice()
         
-        # Carregar configuração OpenAI
-        load_dotenv(Path("rag") / ".env")
+        print(f"Carregados dados de {len(self.dados_imoveis)} imóveis.")
         
-        # Configurar o modelo de linguagem se possível
+        # Configurar o modelo de linguagem se possível (OpenAI e/ou modelo local, conforme LLM_BACKEND)
         try:
-            from langchain_openai import ChatOpenAI
-            import os
-            
-            openai_api_key = os.getenv("OPENAI_API_KEY")
-            if openai_api_key and openai_api_key != "sua_chave_aqui":
-                self.llm = ChatOpenAI(
-                    model=os.getenv("LLM_MODEL", "gpt-3.5-turbo-0125"),
-                    temperature=0.2
-                )
-                print(f"Usando modelo OpenAI: {os.getenv('LLM_MODEL', 'gpt-3.5-turbo-0125')}")
+            self.llm = criar_modelo()
+            if self.llm:
+                print(f"Usando modelo: {self.llm.nome}")
             else:
-                print("AVISO: API Key da OpenAI não configurada. Usando respostas pré-definidas.")
+                print("AVISO: Nenhum modelo configurado (OPENAI_API_KEY ou LOCAL_MODEL_PATH). Usando respostas pré-definidas.")
         except Exception as e:
             print(f"Erro ao inicializar modelo de linguagem: {e}")
             print("Usando respostas pré-definidas como fallback.")
         
         print("Assistente inicializado com sucesso!")
     
+    @property
+    def dados_imoveis(self):
+        """Imóveis da versão atual do índice."""
+        return self.indice.imoveis if self.indice is not None else None
+    
+    def _carregar_indice(self):
+        return self.registro.aplicar(carregar_indice(self.data_dir))
+    
+    def recarregar_dados(self) -> bool:
+        """Monta um novo índice a partir dos arquivos de dados e o coloca no lugar do atual.
+        
+        O índice novo é montado por completo antes da troca, que é uma única atribuição:
+        requisições em andamento terminam com a versão que já tinham obtido. Retorna
+        False se os dados não mudaram (mesma versão).
+        """
+        with self._trava_indice:
+            novo = self._carregar_indice()
+            anterior = self.indice
+            if anterior is not None and novo.versao == anterior.versao:
+                return False
+            self.indice = novo
+        print(f"Índice recarregado: versão {anterior.versao if anterior else '-'} -> {novo.versao} ({len(novo)} imóveis)")
+        return True
+    
+    def alterar_imovel(self, alteracao: Dict[str, Any]):
+        """Grava a alteração no registro e troca o índice por um com ela aplicada.
+        
+        `alteracao` segue o formato de IndiceImoveis.aplicar. Só as colunas e o imóvel
+        alterados são recalculados, então a mudança aparece na próxima busca.
+        """
+        with self._trava_indice:
+            novo = self.indice.aplicar(alteracao)
+            self.registro.registrar(self.indice.base, alteracao)
+            self.indice = novo
+        return novo
+    
+    def consolidar_alteracoes(self) -> bool:
+        """Grava as alterações do registro no JSON de imóveis e no snapshot e zera o registro.
+        
+        Parte dos arquivos em disco (e não do índice em memória), para incluir também
+        alterações feitas por outros workers. Retorna False se não havia alterações.
+        """
+        with self._trava_indice, self.registro.travado():
+            base = carregar_indice(self.data_dir)
+            indice = self.registro.aplicar(base)
+            if indice is base:
+                return False
+            
+            origem = arquivo_origem(self.data_dir)
+            temporario = origem.with_suffix(".tmp")
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(list(indice.ativos()), f, ensure_ascii=False, indent=4)
+            os.replace(temporario, origem)
+            
+            self.indice = gerar_snapshot(self.data_dir)
+            self.registro.reiniciar(self.indice.versao)
+        print(f"Alterações consolidadas em {origem} (versão {self.indice.versao})")
+        return True
+    
     def _buscar_documentos_relevantes(self, pergunta: str, k: int = 5) -> List[Dict[str, Any]]:
         """Busca os documentos mais relevantes para a pergunta."""
         if not self.dados_imoveis:
@@ -314,15 +352,119 @@ class AssistenteImobiliaria:
         
         return caracteristicas
     
-    def responder(self, pergunta: str) -> Dict[str, Any]:
+    def responder(self, pergunta: str, sessao=None) -> Dict[str, Any]:
         """Responde a uma pergunta sobre imóveis."""
+        contexto = self.preparar_resposta(pergunta, sessao)
+        
+        return {
+            "resposta": self.gerar_resposta(contexto),
+            "imoveis_relacionados": contexto["imoveis_relacionados"],
+            "imagens_relacionadas": contexto["imagens_relacionadas"]
+        }
+    
+    def gerar_resposta(self, contexto: Dict[str, Any]) -> str:
+        """Gera o texto da resposta a partir do contexto montado em preparar_resposta."""
+        prompt = contexto.get("prompt")
+        resposta = contexto["resposta_padrao"]
+        usou_modelo = False
+        
+        if prompt and self.llm:
+            # Gerar resposta com o modelo de linguagem
+            inicio = time.perf_counter()
+            try:
+                resposta = self.llm.predict(prompt)
+                usou_modelo = True
+            except Exception as e:
+                print(f"Erro ao gerar resposta com o modelo: {e}")
+                # Fallback para resposta estruturada simples
+            contexto["metricas"].registrar_etapa("llm", inicio)
+        
+        self._concluir_resposta(contexto, resposta, usou_modelo)
+        return resposta
+    
+    def _concluir_resposta(self, contexto: Dict[str, Any], resposta: str, usou_modelo: bool):
+        """Guarda o turno na sessão (se houver) e registra as métricas da resposta."""
+        sessao = contexto.get("sessao")
+        if sessao is not None:
+            sessao.registrar_turno(contexto["pergunta"], resposta)
+        
+        medicao = contexto["metricas"]
+        if usou_modelo:
+            medicao.registrar_tokens(self.llm.nome, contexto["prompt"], resposta)
+        else:
+            medicao.fallback = True
+        medicao.finalizar()
+        METRICAS.registrar(medicao)
+    
+    async def agerar_resposta(self, contexto: Dict[str, Any]) -> str:
+        """Versão assíncrona de gerar_resposta, que pode ser cancelada durante a chamada ao modelo.
+        
+        O número de chamadas simultâneas ao modelo é limitado por LIMITE_LLM; uma tarefa
+        cancelada (por exemplo, quando o cliente desconecta) libera sua vaga na hora.
+        Se já houver LIMITE_FILA_LLM respostas esperando o modelo (ou o contexto vier
+        marcado com "degradar"), a resposta estruturada é usada sem entrar na fila.
+        """
+        prompt = contexto.get("prompt")
+        resposta = contexto["resposta_padrao"]
+        usou_modelo = False
+        
+        if prompt and self.llm and (contexto.get("degradar") or self.fila_llm >= LIMITE_FILA_LLM):
+            # Sobrecarga: responder na hora com os imóveis e o texto padrão
+            contexto["metricas"].degradada = True
+            prompt = None
+        
+        if prompt and self.llm:
+            if self._semaforo_llm is None:
+                self._semaforo_llm = asyncio.Semaphore(LIMITE_LLM)
+            
+            inicio = time.perf_counter()
+            try:
+                self.fila_llm += 1
+                try:
+                    await self._semaforo_llm.acquire()
+                finally:
+                    self.fila_llm -= 1
+                try:
+                    # Tempo esperando uma vaga no modelo, separado do tempo de geração
+                    contexto["metricas"].registrar_etapa("fila_llm", inicio)
+                    inicio = time.perf_counter()
+                    resposta = await self.llm.apredict(prompt)
+                    usou_modelo = True
+                finally:
+                    self._semaforo_llm.release()
+            except Exception as e:
+                print(f"Erro ao gerar resposta com o modelo: {e}")
+                # Fallback para resposta estruturada simples
+            contexto["metricas"].registrar_etapa("llm", inicio)
+        
+        self._concluir_resposta(contexto, resposta, usou_modelo)
+        return resposta
+    
+    def preparar_resposta(self, pergunta: str, sessao=None) -> Dict[str, Any]:
+        """Busca os imóveis relacionados à pergunta e monta o prompt, sem chamar o modelo.
+        
+        Retorna um dicionário com os imóveis e imagens relacionados, o prompt para o
+        modelo de linguagem (ou None) e a resposta padrão usada quando não há modelo.
+        Com uma sessão (ver sessoes.py), a busca reaproveita os candidatos da conversa
+        e o histórico compactado entra no prompt.
+        """
         import re
         
+        medicao = Medicao()
+        # Usar a mesma versão do índice do início ao fim, mesmo que ele seja recarregado no meio
+        indice = self.indice
+        
         # Verificar se temos os dados carregados
-        if not self.dados_imoveis:
+        if indice is None or not indice.imoveis:
             return {
-                "resposta": "Desculpe, ainda não tenho dados sobre imóveis para responder.",
+                "pergunta": pergunta,
+                "sessao": sessao,
+                "versao_indice": indice.versao if indice is not None else None,
+                "metricas": medicao,
+                "prompt": None,
+                "resposta_padrao": "Desculpe, ainda não tenho dados sobre imóveis para responder.",
                 "imoveis_relacionados": [],
+                "fragmentos_relacionados": [],
                 "imagens_relacionadas": []
             }
         
@@ -332,23 +474,35 @@ class AssistenteImobiliaria:
         if match_codigo:
             codigo_imovel = match_codigo.group(1)
             
+        prompt = None
         resposta = ""
         imoveis_relacionados = []
+        fragmentos_relacionados = []  # JSON já serializado de cada imóvel relacionado
         imagens_relacionadas = []
         
         try:
             # Se perguntou sobre um imóvel específico
             if codigo_imovel:
+                medicao.caminho = CAMINHO_CODIGO
+                
                 # Buscar o imóvel pelo código
-                imovel = next((item for item in self.dados_imoveis if item["codigo"] == codigo_imovel), None)
+                with medicao.etapa("busca"):
+                    imovel = indice.obter(codigo_imovel)
                 
                 if imovel:
+                    # Perguntas seguintes na sessão passam a se referir a este imóvel
+                    if sessao is not None:
+                        sessao.filtros = {}
+                        sessao.candidatos = [imovel]
+                        sessao.versao_indice = indice.versao
+                    
                     # Construir resposta detalhada para este imóvel
                     caracteristicas = imovel.get("caracteristicas", {})
                     dormitorios = caracteristicas.get("Dormitórios", "não informado")
                     banheiros = caracteristicas.get("Banheiros", "não informado")
                     area = caracteristicas.get("Área total", "não informado")
                     
+                    inicio_prompt = time.perf_counter()
                     if self.llm:
                         # Construir o prompt para o modelo de linguagem
                         prompt = f"""
@@ -420,46 +574,22 @@ class AssistenteImobiliaria:
                         
                         NÃO mencione que você é uma IA ou modelo de linguagem. Responda como se fosse um corretor real.
                         """
-                        
-                        # Gerar resposta com o modelo de linguagem
-                        try:
-                            resposta = self.llm.predict(prompt)
-                        except Exception as e:
-                            print(f"Erro ao gerar resposta com o modelo: {e}")
-                            # Fallback para resposta estruturada simples
-                            resposta = f"O imóvel {codigo_imovel} é {imovel['titulo']} e custa {imovel['preco']}. "
-                            resposta += f"Está localizado em {imovel['endereco']}. "
-                            resposta += f"Possui {dormitorios} dormitório(s), {banheiros} banheiro(s) e área total de {area}. "
-                            resposta += f"\n\n{imovel['descricao']}"
-                    else:
-                        # Resposta estruturada simples
-                        resposta = f"O imóvel {codigo_imovel} é {imovel['titulo']} e custa {imovel['preco']}. "
-                        resposta += f"Está localizado em {imovel['endereco']}. "
-                        resposta += f"Possui {dormitorios} dormitório(s), {banheiros} banheiro(s) e área total de {area}. "
-                        resposta += f"\n\n{imovel['descricao']}"
-                    
-                    # Adicionar imovel relacionado
-                    imovel_info = {
-                        "codigo": imovel["codigo"],
-                        "titulo": imovel["titulo"],
-                        "preco": imovel["preco"],
-                        "link": imovel["link"],
-                        "dormitorios": caracteristicas.get("Dormitórios", ""),
-                        "banheiros": caracteristicas.get("Banheiros", ""),
-                        "garagem": caracteristicas.get("Vagas na garagem", ""),
-                        "area": caracteristicas.get("Área total", ""),
-                        "tipo": caracteristicas.get("Tipo", ""),
-                        "features": [f"{k}: {v}" for k, v in caracteristicas.items()]
-                    }
-                    imoveis_relacionados.append(imovel_info)
-                    
-                    # PRIORIZAR LINKS DIRETOS DAS IMAGENS - esta é a parte que precisamos corrigir
-                    # Verificar se o imóvel tem links_imagens (novo formato com URLs diretas)
-                    if "links_imagens" in imovel and imovel["links_imagens"]:
-                        # Filtrar links inválidos
-                        imagens_relacionadas = [link for link in imovel["links_imagens"] 
-                                              if link and not link.endswith('/') 
-                                              and not link == "https://www.novatorres.com.br/"]
+                    
+                    # Resposta estruturada simples (usada sem modelo ou se o modelo falhar)
+                    resposta = f"O imóvel {codigo_imovel} é {imovel['titulo']} e custa {imovel['preco']}. "
+                    resposta += f"Está localizado em {imovel['endereco']}. "
+                    resposta += f"Possui {dormitorios} dormitório(s), {banheiros} banheiro(s) e área total de {area}. "
+                    resposta += f"\n\n{imovel['descricao']}"
+                    medicao.registrar_etapa("prompt", inicio_prompt)
+                    
+                    # Adicionar imovel relacionado (projeção e JSON montados uma vez por versão do índice)
+                    posicao = indice.por_codigo[codigo_imovel]
+                    imoveis_relacionados.append(indice.projetado(posicao, CAMPOS_RELACIONADO))
+                    fragmentos_relacionados.append(indice.fragmento(posicao))
+                    
+                    # PRIORIZAR LINKS DIRETOS DAS IMAGENS (já limpos ao montar o índice)
+                    if imovel.get("links_imagens"):
+                        imagens_relacionadas = imovel["links_imagens"][:LIMITE_IMAGENS]
                     # Se não tiver links_imagens, verificar se tem imagem_principal
                     elif "imagem_principal" in imovel and imovel["imagem_principal"]:
                         imagens_relacionadas = [imovel["imagem_principal"]]
@@ -473,9 +603,16 @@ class AssistenteImobiliaria:
             
             # Caso contrário, buscar documentos relevantes e responder
             else:
+                medicao.caminho = CAMINHO_BUSCA
+                
                 # Buscar imóveis que possam ser relevantes
-                imoveis_filtrados = self.buscar_imoveis_por_texto(pergunta)
+                with medicao.etapa("busca"):
+                    if sessao is not None:
+                        imoveis_filtrados = self.buscar_imoveis_sessao(pergunta, sessao, medicao, indice)
+                    else:
+                        imoveis_filtrados = self.buscar_imoveis_por_texto(pergunta, indice)
                 
+                inicio_prompt = time.perf_counter()
                 if imoveis_filtrados and self.llm:
                     # Construir informações sobre os imóveis para o modelo
                     contexto_imoveis = ""
@@ -490,11 +627,16 @@ class AssistenteImobiliaria:
                         contexto_imoveis += f"Banheiros: {caract.get('Banheiros', 'Não informado')}\n"
                         contexto_imoveis += f"Área: {caract.get('Área total', 'Não informada')}\n"
                     
+                    # Histórico compactado da conversa, para entender perguntas de continuação
+                    historico = ""
+                    if sessao is not None and (sessao.historico or sessao.resumo):
+                        historico = f"Conversa até agora:\n{sessao.historico_texto()}\n\n"
+                    
                     # Construir o prompt para o modelo de linguagem
                     prompt = f"""
                     Você é Torres Virtual, um assistente especializado em imóveis da Nova Torres Imobiliária, com personalidade calorosa e entusiasmada.
                     
-                    O usuário perguntou: "{pergunta}"
+                    {historico}O usuário perguntou: "{pergunta}"
                     
                     Com base nesta pergunta, encontrei os seguintes imóveis que podem ser relevantes:
                     {contexto_imoveis}
@@ -557,46 +699,22 @@ class AssistenteImobiliaria:
                     
                     NÃO mencione que você é uma IA ou modelo de linguagem. Responda como se fosse um corretor real.
                     """
-                    
-                    # Gerar resposta com o modelo de linguagem
-                    try:
-                        resposta = self.llm.predict(prompt)
-                    except Exception as e:
-                        print(f"Erro ao gerar resposta com o modelo: {e}")
-                        # Fallback para resposta estruturada simples
-                        resposta = self._gerar_resposta_generica(pergunta)
-                else:
-                    # Usar resposta genérica como fallback
-                    resposta = self._gerar_resposta_generica(pergunta)
+                
+                # Resposta genérica (usada sem modelo ou se o modelo falhar)
+                resposta = self._gerar_resposta_generica(pergunta)
+                medicao.registrar_etapa("prompt", inicio_prompt)
                 
                 # Adicionar até 3 imóveis aos resultados
-                for imovel in imoveis_filtrados[:3]:
-                    codigo = imovel["codigo"]
-                    caracteristicas = imovel.get("caracteristicas", {})
-                    
-                    imovel_info = {
-                        "codigo": codigo,
-                        "titulo": imovel["titulo"],
-                        "preco": imovel["preco"],
-                        "link": imovel["link"],
-                        "dormitorios": caracteristicas.get("Dormitórios", ""),
-                        "banheiros": caracteristicas.get("Banheiros", ""),
-                        "garagem": caracteristicas.get("Vagas na garagem", ""),
-                        "area": caracteristicas.get("Área total", ""),
-                        "tipo": caracteristicas.get("Tipo", ""),
-                        "features": [f"{k}: {v}" for k, v in caracteristicas.items()]
-                    }
-                    imoveis_relacionados.append(imovel_info)
+                for imovel, posicao in zip(imoveis_filtrados[:3], indice.posicoes(imoveis_filtrados[:3])):
+                    imoveis_relacionados.append(indice.projetado(posicao, CAMPOS_RELACIONADO))
+                    fragmentos_relacionados.append(indice.fragmento(posicao))
                     
                     # Se ainda não temos imagens, adicionar as do primeiro imóvel
                     if not imagens_relacionadas and len(imoveis_relacionados) == 1:
                         # PRIORIZAÇÃO DE LINKS DIRETOS
-                        # Primeiro tentar usar os links diretos (novo formato)
-                        if "links_imagens" in imovel and imovel["links_imagens"]:
-                            # Filtrar links inválidos
-                            imagens_relacionadas = [link for link in imovel["links_imagens"][:5] 
-                                                  if link and not link.endswith('/') 
-                                                  and not link == "https://www.novatorres.com.br/"]
+                        # Primeiro tentar usar os links diretos (já limpos ao montar o índice)
+                        if imovel.get("links_imagens"):
+                            imagens_relacionadas = imovel["links_imagens"][:LIMITE_IMAGENS]
                         # Se não tiver links diretos, usar a imagem principal
                         elif "imagem_principal" in imovel and imovel["imagem_principal"]:
                             imagens_relacionadas = [imovel["imagem_principal"]]
@@ -609,18 +727,22 @@ class AssistenteImobiliaria:
             import traceback
             print(f"Erro ao processar pergunta: {e}")
             print(traceback.format_exc())
+            prompt = None
+            medicao.caminho = CAMINHO_ERRO
             resposta = "Desculpe, ocorreu um erro ao processar sua pergunta. Por favor, tente novamente mais tarde."
         
         # Limitar o número de imagens retornadas
-        imagens_relacionadas = imagens_relacionadas[:5] if imagens_relacionadas else []
-        
-        # Garantir que todas as imagens sejam URLs diretas
-        imagens_relacionadas = [img if img.startswith("http") else f"https://www.novatorres.com.br/{img.lstrip('/')}" 
-                             for img in imagens_relacionadas if img]
+        imagens_relacionadas = imagens_relacionadas[:LIMITE_IMAGENS]
         
         return {
-            "resposta": resposta,
+            "pergunta": pergunta,
+            "sessao": sessao,
+            "versao_indice": indice.versao,
+            "metricas": medicao,
+            "prompt": prompt,
+            "resposta_padrao": resposta,
             "imoveis_relacionados": imoveis_relacionados,
+            "fragmentos_relacionados": fragmentos_relacionados,
             "imagens_relacionadas": imagens_relacionadas
         }
         
@@ -701,8 +823,42 @@ Confira estas opções especiais:
 
 ---------------"""
         
-    def buscar_imoveis_por_texto(self, texto: str) -> List[Dict[str, Any]]:
+    def buscar_imoveis_por_texto(self, texto: str, indice=None) -> List[Dict[str, Any]]:
         """Busca imóveis com base em um texto livre."""
+        return self.buscar_imoveis(self.extrair_criterios(texto), indice=indice)
+    
+    def buscar_imoveis_sessao(self, texto: str, sessao, medicao: Optional[Medicao] = None,
+                              indice=None) -> List[Dict[str, Any]]:
+        """Busca imóveis para uma pergunta dentro de uma sessão de conversa.
+        
+        Perguntas de continuação que só acrescentam critérios (ex.: "e tem com garagem?")
+        refinam os candidatos guardados na sessão; se algum critério anterior mudar,
+        a busca é refeita com os filtros combinados. Candidatos de uma versão anterior
+        do índice são descartados e a busca é refeita com os filtros da sessão.
+        """
+        indice = indice or self.indice
+        if sessao.versao_indice != indice.versao:
+            sessao.candidatos = []
+            sessao.versao_indice = indice.versao
+        
+        novos = self.extrair_criterios(texto)
+        refinar = bool(sessao.candidatos) and (not novos or (bool(sessao.filtros) and not set(novos) & set(sessao.filtros)))
+        if medicao is not None:
+            medicao.registrar_cache("candidatos_sessao", refinar)
+        
+        if refinar:
+            print(f"Refinando {len(sessao.candidatos)} candidatos da sessão com {novos}")
+            candidatos = self.buscar_imoveis(novos, imoveis=sessao.candidatos, limite=None, indice=indice)
+        else:
+            novos = {**sessao.filtros, **novos} if sessao.filtros else novos
+            candidatos = self.buscar_imoveis(novos, limite=LIMITE_CANDIDATOS_SESSAO, indice=indice)
+        
+        sessao.filtros = {**sessao.filtros, **novos}
+        sessao.candidatos = candidatos
+        return candidatos[:10]
+    
+    def extrair_criterios(self, texto: str) -> Dict[str, Any]:
+        """Extrai filtros estruturados (preço, quartos, garagem, localização) de um texto livre."""
         import re
         
         # Extrair critérios da pergunta
@@ -727,6 +883,10 @@ Confira estas opções especiais:
         if match_quartos:
             criterios["dormitorios"] = int(match_quartos.group(1))
         
+        # Buscar por garagem
+        if re.search(r'garage[mn]|vagas?\b', texto.lower()):
+            criterios["garagem"] = True
+        
         # Buscar por localização
         locais = ["centro", "praia", "cal", "grande", "torres", "jardim", "predial"]
         for local in locais:
@@ -734,74 +894,25 @@ Confira estas opções especiais:
                 criterios["localizacao"] = local
                 break
         
-        # Realizar a busca
-        return self.buscar_imoveis(criterios)
-        
-    def buscar_imoveis(self, filtros: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Busca imóveis com base em filtros específicos."""
-        if not self.dados_imoveis:
-            return []
+        return criterios
         
-        resultados = []
+    def buscar_imoveis(self, filtros: Dict[str, Any], imoveis: Optional[List[Dict[str, Any]]] = None,
+                       limite: Optional[int] = 10, indice=None,
+                       campos: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Busca imóveis com base em filtros específicos.
         
-        for imovel in self.dados_imoveis:
-            # Flag para controlar se o imóvel atende a todos os critérios
-            atende_criterios = True
-            
-            # Verificar preço mínimo
-            if "preco_min" in filtros:
-                try:
-                    # Extrair apenas números do preço
-                    import re
-                    preco_numerico = float(re.sub(r'[^\d.]', '', imovel.get("preco", "0").replace(".", "").replace(",", ".")))
-                    if preco_numerico < filtros["preco_min"]:
-                        atende_criterios = False
-                        continue
-                except:
-                    # Se não conseguir converter o preço, ignorar este critério
-                    pass
-            
-            # Verificar preço máximo
-            if "preco_max" in filtros:
-                try:
-                    # Extrair apenas números do preço
-                    import re
-                    preco_numerico = float(re.sub(r'[^\d.]', '', imovel.get("preco", "0").replace(".", "").replace(",", ".")))
-                    if preco_numerico > filtros["preco_max"]:
-                        atende_criterios = False
-                        continue
-                except:
-                    # Se não conseguir converter o preço, ignorar este critério
-                    pass
-            
-            # Verificar número de dormitórios
-            if "dormitorios" in filtros:
-                try:
-                    dormitorios = imovel.get("caracteristicas", {}).get("Dormitórios", "0")
-                    dormitorios_num = int(re.sub(r'[^\d]', '', dormitorios))
-                    if dormitorios_num != filtros["dormitorios"]:
-                        atende_criterios = False
-                        continue
-                except:
-                    # Se não conseguir converter, ignorar este critério
-                    pass
-            
-            # Verificar localização
-            if "localizacao" in filtros:
-                loc = filtros["localizacao"].lower()
-                endereco = imovel.get("endereco", "").lower()
-                titulo = imovel.get("titulo", "").lower()
-                
-                if loc not in endereco and loc not in titulo:
-                    atende_criterios = False
-                    continue
-            
-            # Se passou por todos os filtros, adicionar aos resultados
-            if atende_criterios:
-                resultados.append(imovel)
+        Por padrão busca em todos os imóveis; `imoveis` restringe a busca a um subconjunto
+        (ex.: candidatos de uma sessão) e `limite=None` retorna todos os resultados.
+        `indice` fixa a versão do índice usada (padrão: a atual) e `campos` restringe
+        os campos de cada imóvel (ver projecoes.py).
+        """
+        indice = indice or self.indice
+        if indice is None or not indice.imoveis:
+            return []
         
-        # Limitar a 10 resultados
-        return resultados[:10]
+        # Os filtros usam as colunas já normalizadas do índice (ver indice.py)
+        posicoes = None if imoveis is None else indice.posicoes(imoveis)
+        return indice.filtrar(filtros, posicoes, limite, campos)
 
 
 # Para teste direto
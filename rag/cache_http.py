@@ -0,0 +1,159 @@
+"""Validação condicional (ETag / If-None-Match) e compressão das respostas da API.
+
+As respostas de busca e de imóveis só mudam quando muda a versão dos dados, então o
+ETag é derivado da versão do índice e dos parâmetros da consulta. Com ele é possível
+responder 304 sem refazer a busca, e guardar o corpo já serializado e comprimido
+para as consultas repetidas.
+"""
+
+import os
+import json
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele, apenas gzip
+    brotli = None
+
+# Configurações
+CACHE_RESPOSTAS_MAX = int(os.getenv("CACHE_RESPOSTAS_MAX", "512"))  # corpos serializados mantidos em memória
+CACHE_MAX_AGE = int(os.getenv("CACHE_MAX_AGE", "0"))  # segundos; 0 = o cliente sempre revalida com If-None-Match
+TAMANHO_MINIMO_COMPRESSAO = 1024  # corpos menores que isso não compensam a compressão
+NIVEL_GZIP = 6
+QUALIDADE_BROTLI = 5
+
+
+def calcular_etag(*partes) -> str:
+    """ETag forte a partir da versão dos dados e dos parâmetros da consulta."""
+    chave = json.dumps(partes, sort_keys=True, ensure_ascii=False, default=str)
+    return '"' + hashlib.sha256(chave.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def codificar_json(conteudo: Any) -> bytes:
+    """Serializa como o JSONResponse do FastAPI (UTF-8, sem espaços)."""
+    return json.dumps(conteudo, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def escolher_codificacao(accept_encoding: str) -> Optional[str]:
+    """Escolhe br ou gzip conforme o cabeçalho Accept-Encoding (None = sem compressão)."""
+    aceitas = {}
+    for item in accept_encoding.lower().split(","):
+        nome, _, parametros = item.strip().partition(";")
+        qualidade = 1.0
+        if parametros.strip().startswith("q="):
+            try:
+                qualidade = float(parametros.strip()[2:])
+            except ValueError:
+                qualidade = 0.0
+        aceitas[nome.strip()] = qualidade
+
+    opcoes = (["br"] if brotli else []) + ["gzip"]
+    for codificacao in opcoes:
+        if aceitas.get(codificacao, aceitas.get("*", 0.0)) > 0:
+            return codificacao
+    return None
+
+
+def etag_da_codificacao(etag: str, codificacao: Optional[str]) -> str:
+    """Cada codificação é uma representação diferente e precisa de um ETag forte próprio."""
+    return etag if not codificacao else f'{etag[:-1]}-{codificacao}"'
+
+
+def etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+    """Verifica se algum ETag de If-None-Match é o mesmo recurso (em qualquer codificação)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    base = etag[1:-1]
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato.startswith("W/"):
+            candidato = candidato[2:]
+        candidato = candidato.strip('"')
+        if candidato == base or candidato.startswith(base + "-"):
+            return True
+    return False
+
+
+def comprimir(corpo: bytes, codificacao: str) -> bytes:
+    if codificacao == "br":
+        return brotli.compress(corpo, quality=QUALIDADE_BROTLI)
+    return gzip.compress(corpo, compresslevel=NIVEL_GZIP)
+
+
+class CacheRespostas:
+    """Corpos já serializados (e comprimidos) por ETag, descartando os menos usados."""
+
+    def __init__(self, maximo: int = CACHE_RESPOSTAS_MAX):
+        self.maximo = maximo
+        self.trava = threading.Lock()
+        self.corpos: "OrderedDict[str, Dict[Optional[str], bytes]]" = OrderedDict()
+
+    def obter(self, etag: str, codificacao: Optional[str]) -> Optional[bytes]:
+        with self.trava:
+            variantes = self.corpos.get(etag)
+            if variantes is None:
+                return None
+            self.corpos.move_to_end(etag)
+            return variantes.get(codificacao)
+
+    def guardar(self, etag: str, codificacao: Optional[str], corpo: bytes):
+        with self.trava:
+            self.corpos.setdefault(etag, {})[codificacao] = corpo
+            self.corpos.move_to_end(etag)
+            while len(self.corpos) > self.maximo:
+                self.corpos.popitem(last=False)
+
+    def limpar(self):
+        with self.trava:
+            self.corpos.clear()
+
+
+# Cache usado pelos endpoints da API
+CACHE_RESPOSTAS = CacheRespostas()
+
+
+def cabecalhos_cache(etag: str, max_age: int = CACHE_MAX_AGE) -> Dict[str, str]:
+    controle = f"public, max-age={max_age}" if max_age > 0 else "public, no-cache"
+    return {"ETag": etag, "Cache-Control": controle, "Vary": "Accept-Encoding"}
+
+
+def responder_json(request: Request, etag: str, gerar: Callable[[], Any],
+                   max_age: int = CACHE_MAX_AGE) -> Response:
+    """Responde 304 se o cliente já tem esta versão; senão, o JSON comprimido conforme o cliente aceita.
+
+    `gerar` só é chamado quando o corpo não está no cache. Em GET e HEAD o
+    If-None-Match é respeitado; nos demais métodos o ETag é apenas informado.
+    """
+    codificacao = escolher_codificacao(request.headers.get("accept-encoding", ""))
+    etag_representacao = etag_da_codificacao(etag, codificacao)
+
+    if request.method in ("GET", "HEAD") and etag_confere(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cabecalhos_cache(etag_representacao, max_age))
+
+    corpo = CACHE_RESPOSTAS.obter(etag, codificacao)
+    if corpo is None:
+        corpo = CACHE_RESPOSTAS.obter(etag, None)
+        if corpo is None:
+            corpo = codificar_json(gerar())
+            CACHE_RESPOSTAS.guardar(etag, None, corpo)
+        if codificacao and len(corpo) >= TAMANHO_MINIMO_COMPRESSAO:
+            corpo = comprimir(corpo, codificacao)
+            CACHE_RESPOSTAS.guardar(etag, codificacao, corpo)
+        else:
+            codificacao = None
+
+    if codificacao is None:
+        etag_representacao = etag
+    headers = cabecalhos_cache(etag_representacao, max_age)
+    if codificacao:
+        headers["Content-Encoding"] = codificacao
+    return Response(content=corpo, media_type="application/json", headers=headers)
@@ -0,0 +1,435 @@
+"""Redimensionamento de imagens sob demanda para o endpoint /imagem.
+
+As imagens originais (locais em data/ ou no site da imobiliária) são convertidas
+para a largura e o formato pedidos por um pool de processos com o Pillow. As
+versões geradas ficam em um cache em disco limitado por tamanho, identificadas pelo
+hash do conteúdo da imagem original, e são descartadas as usadas há mais tempo.
+Imagens de data/images com derivadas geradas em lote por src/gerar_derivadas.py
+são servidas direto do manifesto. Os caminhos locais antigos (images/, data/images/,
+imagens_simples/) são resolvidos pelo armazém de imagens (src/armazem_imagens.py).
+O catálogo gerado por src/catalogo_imagens.py informa as dimensões de cada imagem
+local e quais não podem ser decodificadas, sem abrir os arquivos. Das fotos remotas
+com variantes de tamanho (src/variantes_imagens.py) é baixada a menor que atende à
+largura pedida, e não sempre a grande.
+"""
+
+import io
+import os
+import sys
+import json
+import hashlib
+import time
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from armazem_imagens import ArmazemImagens
+from catalogo_imagens import CatalogoImagens
+from variantes_imagens import url_variante, variante_para_largura
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+ARMAZEM = ArmazemImagens(DATA_DIR / "armazem")
+CATALOGO = CatalogoImagens(DATA_DIR / "catalogo_imagens.sqlite")
+
+# Configurações
+CACHE_IMAGENS_DIR = Path(os.getenv("CACHE_IMAGENS_DIR", str(DATA_DIR / "cache_imagens")))
+CACHE_IMAGENS_MAX_MB = int(os.getenv("CACHE_IMAGENS_MAX_MB", "512"))
+IMAGEM_WORKERS = int(os.getenv("IMAGEM_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+IMAGEM_TIMEOUT = 15  # segundos para baixar uma imagem remota
+HOSTS_PERMITIDOS = os.getenv("IMAGEM_HOSTS", "www.novatorres.com.br,ig2.casteldigital.com.br").split(",")
+IMAGEM_HASHES_MAX = int(os.getenv("IMAGEM_HASHES_MAX", "20000"))  # hashes de originais mantidos em memória
+IMAGEM_HASHES_TTL = int(os.getenv("IMAGEM_HASHES_TTL", "3600"))  # segundos até baixar de novo uma imagem remota
+
+# Derivadas pré-geradas por src/gerar_derivadas.py
+DERIVADAS_DIR = DATA_DIR / "derivadas"
+
+# Larguras geradas: o pedido é arredondado para cima, para não criar uma versão por pixel
+LARGURAS = [160, 320, 480, 640, 800, 1024, 1280, 1600, 2048]
+FORMATOS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+QUALIDADE = 80
+
+# Prefixos das URLs locais antigas (rotas em app.py), com a coleção do armazém e o diretório
+DIRETORIOS_LOCAIS = {
+    "images": ("images_new", DATA_DIR / "images_new"),
+    "data/images": ("images", DATA_DIR / "images"),
+    "imagens_simples": ("imagens_simples", DATA_DIR / "imagens_simples"),
+}
+
+
+def largura_padronizada(largura: Optional[int]) -> Optional[int]:
+    """Menor largura de LARGURAS que atende ao pedido (None = largura original)."""
+    if not largura:
+        return None
+    return next((opcao for opcao in LARGURAS if opcao >= largura), LARGURAS[-1])
+
+
+def url_remota(caminho: str) -> str:
+    """URL completa de uma imagem do site (aceita URL absoluta ou caminho relativo ao site)."""
+    # Alguns proxies juntam as barras duplas de "https://" no caminho
+    for esquema in ("https:/", "http:/"):
+        if caminho.startswith(esquema) and not caminho.startswith(esquema + "/"):
+            caminho = esquema + "/" + caminho[len(esquema):]
+    if caminho.startswith(("http://", "https://")):
+        return caminho
+    return f"https://www.novatorres.com.br/{caminho.lstrip('/')}"
+
+
+def hash_do_blob(arquivo: Path) -> Optional[str]:
+    """Hash do conteúdo (mesmo formato da chave do cache) a partir do nome de um blob do armazém."""
+    if ARMAZEM.dir_blobs.resolve() in arquivo.parents:
+        return arquivo.name[:32]
+    return None
+
+
+def arquivo_local(caminho: str) -> Optional[Path]:
+    """Arquivo local correspondente ao caminho, ou None se não for uma imagem local.
+
+    Aceita blobs (blobs/<xx>/<hash>.<ext>) e os caminhos antigos, procurados primeiro
+    nos manifestos do armazém e depois nos diretórios ainda não migrados.
+    """
+    caminho = caminho.lstrip("/")
+    if caminho.startswith("blobs/"):
+        arquivo = (ARMAZEM.dir_blobs / caminho[len("blobs/"):]).resolve()
+        if ARMAZEM.dir_blobs.resolve() in arquivo.parents and arquivo.is_file():
+            return arquivo
+        return None
+
+    for prefixo, (colecao, diretorio) in sorted(DIRETORIOS_LOCAIS.items(), key=lambda item: -len(item[0])):
+        if caminho.startswith(prefixo + "/"):
+            relativo = caminho[len(prefixo) + 1:]
+            blob = ARMAZEM.resolver(colecao, relativo)
+            if blob is not None:
+                return blob.resolve()
+            arquivo = (diretorio / relativo).resolve()
+            # Impedir "../" para fora do diretório
+            if diretorio.resolve() in arquivo.parents and arquivo.is_file():
+                return arquivo
+    return None
+
+
+def entrada_catalogo(caminho: str, arquivo: Optional[Path] = None) -> Optional[Dict]:
+    """Entrada do catálogo de imagens para um caminho local (antigo ou blob), ou None.
+
+    `arquivo` é o arquivo já resolvido por arquivo_local(). Entradas que não conferem com
+    o arquivo em disco (tamanho ou mtime diferentes: ele mudou depois da última execução de
+    src/catalogo_imagens.py) são ignoradas, como se a imagem não estivesse catalogada.
+    """
+    arquivo = arquivo or arquivo_local(caminho)
+    if arquivo is None:
+        return None
+    caminho = caminho.lstrip("/")
+    entrada = None
+    if caminho.startswith("blobs/"):
+        entrada = CATALOGO.por_hash(Path(caminho).name[:32])
+    else:
+        for prefixo, (colecao, _) in sorted(DIRETORIOS_LOCAIS.items(), key=lambda item: -len(item[0])):
+            if caminho.startswith(prefixo + "/"):
+                entrada = CATALOGO.obter(colecao, caminho[len(prefixo) + 1:])
+                break
+    if entrada is None:
+        return None
+    try:
+        info = arquivo.stat()
+    except OSError:
+        return None
+    if entrada["bytes"] != info.st_size:
+        return None
+    # A entrada achada pelo hash pode ser de outro arquivo com o mesmo conteúdo: só o tamanho vale
+    if not caminho.startswith("blobs/") and entrada["mtime"] != info.st_mtime_ns:
+        return None
+    return entrada
+
+
+def imagens_do_imovel(codigo: str) -> List[Dict]:
+    """Imagens locais válidas do imóvel, com URL, dimensões, tamanho e formato."""
+    prefixos = {colecao: prefixo for prefixo, (colecao, _) in DIRETORIOS_LOCAIS.items()}
+    return [{"url": f"/{prefixos[entrada['colecao']]}/{entrada['caminho']}",
+             "largura": entrada["largura"], "altura": entrada["altura"],
+             "bytes": entrada["bytes"], "formato": entrada["formato"]}
+            for entrada in CATALOGO.do_imovel(codigo) if entrada["valida"] and entrada["colecao"] in prefixos]
+
+
+def largura_imagem(conteudo: bytes) -> int:
+    """Largura lida do cabeçalho da imagem (0 se não for uma imagem)."""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        return Image.open(io.BytesIO(conteudo)).width
+    except UnidentifiedImageError:
+        return 0
+
+
+class ImagemInvalida(Exception):
+    """A imagem original não pode ser decodificada (arquivo truncado ou que não é imagem)."""
+
+
+def _redimensionar(conteudo: bytes, largura: Optional[int], formato: str) -> bytes:
+    """Executado no pool de processos: redimensiona e converte a imagem."""
+    from PIL import Image, ImageOps
+
+    imagem = Image.open(io.BytesIO(conteudo))
+    imagem = ImageOps.exif_transpose(imagem)
+    if largura and imagem.width > largura:
+        altura = max(1, round(imagem.height * largura / imagem.width))
+        imagem = imagem.resize((largura, altura), Image.LANCZOS)
+
+    if formato == "jpeg" and imagem.mode not in ("RGB", "L"):
+        imagem = imagem.convert("RGB")
+    elif imagem.mode not in ("RGB", "RGBA", "L"):
+        imagem = imagem.convert("RGBA" if "A" in imagem.getbands() else "RGB")
+
+    saida = io.BytesIO()
+    if formato == "webp":
+        imagem.save(saida, "WEBP", quality=QUALIDADE, method=4)
+    else:
+        imagem.save(saida, "JPEG", quality=QUALIDADE, optimize=True, progressive=True)
+    return saida.getvalue()
+
+
+class CacheDerivadas:
+    """Cache em disco das imagens geradas, limitado por tamanho total.
+
+    O mtime de cada arquivo é atualizado a cada uso; ao passar do limite, os
+    arquivos com mtime mais antigo são removidos.
+    """
+
+    def __init__(self, diretorio: Path = CACHE_IMAGENS_DIR, maximo_mb: int = CACHE_IMAGENS_MAX_MB):
+        self.diretorio = Path(diretorio)
+        self.maximo = maximo_mb * 1024 * 1024
+        self.trava = threading.Lock()
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.tamanho = sum(arquivo.stat().st_size for arquivo in self.diretorio.glob("*/*") if arquivo.is_file())
+
+    def caminho(self, chave: str) -> Path:
+        return self.diretorio / chave[:2] / chave
+
+    def obter(self, chave: str) -> Optional[Path]:
+        arquivo = self.caminho(chave)
+        try:
+            os.utime(arquivo)
+        except FileNotFoundError:
+            return None
+        return arquivo
+
+    def guardar(self, chave: str, conteudo: bytes) -> Path:
+        arquivo = self.caminho(chave)
+        arquivo.parent.mkdir(exist_ok=True)
+        temporario = arquivo.with_name(f"{arquivo.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temporario.write_bytes(conteudo)
+        os.replace(temporario, arquivo)
+        with self.trava:
+            self.tamanho += len(conteudo)
+            if self.tamanho > self.maximo:
+                self._liberar_espaco()
+        return arquivo
+
+    def _liberar_espaco(self):
+        """Remove os arquivos usados há mais tempo até ficar abaixo de 90% do limite."""
+        arquivos = []
+        for arquivo in self.diretorio.glob("*/*"):
+            try:
+                info = arquivo.stat()
+            except FileNotFoundError:
+                continue
+            arquivos.append((info.st_mtime, info.st_size, arquivo))
+        arquivos.sort()
+
+        self.tamanho = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, arquivo in arquivos:
+            if self.tamanho <= self.maximo * 0.9:
+                break
+            try:
+                arquivo.unlink()
+                self.tamanho -= tamanho
+            except FileNotFoundError:
+                pass
+
+
+class ManifestoDerivadas:
+    """Derivadas WebP das imagens de data/images geradas em lote por src/gerar_derivadas.py.
+
+    O manifesto é relido quando o arquivo muda, e as derivadas são procuradas pelo hash
+    do conteúdo da imagem original.
+    """
+
+    def __init__(self, diretorio: Path = DERIVADAS_DIR):
+        self.diretorio = Path(diretorio)
+        self.caminho = self.diretorio / "manifesto.json"
+        self.assinatura = None
+        self.por_hash: Dict[str, Dict] = {}
+
+    def _atualizar(self):
+        try:
+            info = self.caminho.stat()
+        except FileNotFoundError:
+            self.assinatura, self.por_hash = None, {}
+            return
+        assinatura = (info.st_size, info.st_mtime_ns)
+        if assinatura == self.assinatura:
+            return
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                imagens = json.load(f).get("imagens", {})
+            self.por_hash = {entrada["hash"]: entrada for entrada in imagens.values() if entrada.get("hash")}
+            self.assinatura = assinatura
+            print(f"Manifesto de derivadas carregado: {len(self.por_hash)} imagens")
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Erro ao ler o manifesto de derivadas {self.caminho}: {e}")
+
+    def obter(self, hash_original: str, largura: Optional[int], formato: str) -> Optional[Tuple[Path, str]]:
+        """Arquivo e chave da derivada pronta da imagem com este hash, ou None."""
+        if formato != "webp":
+            return None
+        self._atualizar()
+        entrada = self.por_hash.get(hash_original)
+        if not entrada:
+            return None
+        for derivada in entrada.get("derivadas", {}).values():
+            if derivada.get("largura") == largura:
+                arquivo = self.diretorio / derivada["arquivo"]
+                if arquivo.is_file():
+                    # Mesma chave que o proxy usaria ao gerar esta versão
+                    return arquivo, f"{hash_original}-w{largura}.webp"
+        return None
+
+
+class RedimensionadorImagens:
+    """Gera (ou lê do cache) a versão de uma imagem na largura e formato pedidos."""
+
+    def __init__(self, cache: Optional[CacheDerivadas] = None, workers: int = IMAGEM_WORKERS):
+        self.cache = cache or CacheDerivadas()
+        self.manifesto = ManifestoDerivadas()
+        self.workers = workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.sessao = None
+        # Hash do conteúdo de cada imagem original já lida, para achar a versão gerada sem reler a
+        # original, com o momento da leitura; em ordem de uso, limitado a IMAGEM_HASHES_MAX
+        self.hashes: "OrderedDict[Tuple, Tuple[str, float]]" = OrderedDict()
+        self.trava_hashes = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            # "spawn" evita herdar threads e sockets do servidor no processo worker
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        return self.executor
+
+    def _identificar(self, caminho: str, largura: Optional[int]) -> Tuple:
+        """Identificador da imagem original: arquivo local (com tamanho e mtime) ou URL remota.
+
+        Para URLs remotas: ("remoto", URL da variante baixada, URL pedida).
+        """
+        arquivo = arquivo_local(caminho)
+        if arquivo is not None:
+            info = arquivo.stat()
+            return ("local", str(arquivo), info.st_size, info.st_mtime_ns)
+
+        url = url_remota(caminho)
+        if urlparse(url).hostname not in HOSTS_PERMITIDOS:
+            raise PermissionError(f"Host não permitido: {urlparse(url).hostname}")
+        return ("remoto", url_variante(url, variante_para_largura(largura)), url)
+
+    def _hash_conhecido(self, identificador: Tuple) -> Optional[str]:
+        """Hash já lido da imagem original, ou None.
+
+        Imagens locais mudam de identificador quando o arquivo muda (tamanho e mtime); as
+        remotas não, então o hash delas expira depois de IMAGEM_HASHES_TTL segundos.
+        """
+        with self.trava_hashes:
+            conhecido = self.hashes.get(identificador)
+            if conhecido is None:
+                return None
+            hash_original, lido_em = conhecido
+            if identificador[0] == "remoto" and time.monotonic() - lido_em > IMAGEM_HASHES_TTL:
+                del self.hashes[identificador]
+                return None
+            self.hashes.move_to_end(identificador)
+            return hash_original
+
+    def _guardar_hash(self, identificador: Tuple, hash_original: str):
+        with self.trava_hashes:
+            self.hashes[identificador] = (hash_original, time.monotonic())
+            self.hashes.move_to_end(identificador)
+            while len(self.hashes) > IMAGEM_HASHES_MAX:
+                self.hashes.popitem(last=False)
+
+    def _ler_original(self, identificador: Tuple, largura: Optional[int]) -> bytes:
+        if identificador[0] == "local":
+            return Path(identificador[1]).read_bytes()
+
+        if self.sessao is None:
+            import requests
+            self.sessao = requests.Session()
+        _, url, url_pedida = identificador
+        if url != url_pedida:
+            # Variante menor: usar a URL pedida se ela não existir ou for mais estreita que o pedido
+            try:
+                resposta = self.sessao.get(url, timeout=IMAGEM_TIMEOUT)
+                if resposta.ok and (largura is None or largura_imagem(resposta.content) >= largura):
+                    return resposta.content
+            except Exception as e:
+                print(f"Erro ao baixar a variante {url}: {e}")
+        resposta = self.sessao.get(url_pedida, timeout=IMAGEM_TIMEOUT)
+        resposta.raise_for_status()
+        return resposta.content
+
+    def gerar(self, caminho: str, largura: Optional[int], formato: str) -> Tuple[Path, str]:
+        """Retorna o arquivo da versão pedida e o ETag; executado fora do loop de eventos.
+
+        Lança PermissionError para hosts não permitidos e ValueError para formatos inválidos.
+        """
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato inválido: {formato}. Válidos: {', '.join(FORMATOS)}")
+        largura = largura_padronizada(largura)
+        identificador = self._identificar(caminho, largura)
+        entrada = None
+        if identificador[0] == "local":
+            entrada = entrada_catalogo(caminho, Path(identificador[1]))
+        if entrada is not None and not entrada["valida"]:
+            raise ImagemInvalida(f"Imagem inválida: {entrada['erro']}")
+        # As imagens não são ampliadas: pedidos maiores que a original dividem a mesma versão
+        largura_gerada = largura
+        if entrada is not None and largura and entrada["largura"] <= largura:
+            largura_gerada = None
+        sufixo = f"-w{largura_gerada or 0}.{formato}"
+
+        # Blobs do armazém têm o hash no nome; os demais, depois da primeira leitura
+        hash_original = self._hash_conhecido(identificador)
+        if hash_original is None and identificador[0] == "local":
+            hash_original = hash_do_blob(Path(identificador[1]))
+        if hash_original is not None:
+            pronta = self.manifesto.obter(hash_original, largura, formato) or self._do_cache(hash_original + sufixo)
+            if pronta is not None:
+                return pronta
+
+        conteudo = self._ler_original(identificador, largura)
+        hash_original = hashlib.sha256(conteudo).hexdigest()[:32]
+        self._guardar_hash(identificador, hash_original)
+        chave = hash_original + sufixo
+
+        pronta = self.manifesto.obter(hash_original, largura, formato) or self._do_cache(chave)
+        if pronta is not None:
+            return pronta
+
+        try:
+            derivada = self._executor().submit(_redimensionar, conteudo, largura_gerada, formato).result()
+        except BrokenProcessPool:
+            # Um worker morreu (ex.: falta de memória); o próximo pedido cria um pool novo
+            self.executor = None
+            raise
+        return self.cache.guardar(chave, derivada), chave
+
+    def _do_cache(self, chave: str) -> Optional[Tuple[Path, str]]:
+        arquivo = self.cache.obter(chave)
+        return (arquivo, chave) if arquivo is not None else None
+
+    def encerrar(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,485 @@
+"""Índice dos imóveis usado pelo assistente.
+
+O índice guarda os imóveis junto com colunas já normalizadas para os filtros
+(preço numérico, dormitórios, vagas de garagem, texto de localização) e o mapa
+código -> posição. Ele pode ser montado a partir do JSON dos imóveis ou carregado
+de um snapshot binário gerado por `run_rag.py process`.
+
+Formato do snapshot (data/indice_imoveis.bin):
+
+    MAGIC (8 bytes) | formato (uint32) | tamanho do cabeçalho (uint32) | cabeçalho JSON | seções
+
+O cabeçalho descreve o arquivo de origem (tamanho, mtime e sha256), a versão dos
+dados, o CRC32 das seções e a posição de cada uma. As colunas numéricas são arrays
+alinhados a 8 bytes, lidos direto do mmap sem cópia; cada imóvel é serializado
+separadamente e só é desserializado quando acessado.
+
+As listas de imagens são limpas na entrada (src/links_imagens.py), ao montar o índice
+do JSON e ao aplicar uma alteração: as consultas usam links_imagens sem filtrar.
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import mmap
+import pickle
+import struct
+import hashlib
+import threading
+import zlib
+from array import array
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable
+
+from projecoes import PROJECOES_CACHEADAS, CAMPOS_RELACIONADO, projetar
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from links_imagens import limpar_imovel
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+SNAPSHOT_PADRAO = DATA_DIR / "indice_imoveis.bin"
+
+MAGIC = b"IMOBIDX\x00"
+FORMATO_SNAPSHOT = 2  # 2: imóveis gravados com as listas de imagens já limpas
+ALINHAMENTO = 8
+
+# Arquivos de imóveis em ordem de preferência (o primeiro que existir é usado)
+ARQUIVOS_IMOVEIS = ["imoveis_com_links.json", "imoveis_com_imagens.json", "imoveis.json"]
+
+DESCONHECIDO = -1  # valor das colunas inteiras quando o dado não pôde ser interpretado
+
+# Imóveis desserializados mantidos em memória por processo; o restante é lido do mmap,
+# que é compartilhado entre os workers do servidor pelo cache de páginas do sistema
+INDICE_CACHE_IMOVEIS = int(os.getenv("INDICE_CACHE_IMOVEIS", "256"))
+
+
+def arquivo_origem(data_dir: Path = DATA_DIR) -> Path:
+    """Retorna o arquivo de imóveis que deve ser usado, na ordem de preferência."""
+    for nome in ARQUIVOS_IMOVEIS:
+        caminho = Path(data_dir) / nome
+        if caminho.exists():
+            return caminho
+    return Path(data_dir) / ARQUIVOS_IMOVEIS[-1]
+
+
+def descrever_origem(caminho: Path) -> Dict[str, Any]:
+    """Identifica o arquivo de origem por tamanho e data de modificação."""
+    info = os.stat(caminho)
+    return {"arquivo": Path(caminho).name, "tamanho": info.st_size, "mtime_ns": info.st_mtime_ns}
+
+
+def preco_numerico(preco: str) -> float:
+    """Converte "R$ 589.900,00" em 589900.0; NaN se não for possível."""
+    try:
+        return float(re.sub(r'[^\d.]', '', (preco or "0").replace(".", "").replace(",", ".")))
+    except ValueError:
+        return math.nan
+
+
+def dormitorios_numerico(caracteristicas: Dict[str, Any]) -> int:
+    """Quantidade de dormitórios (0 se não informada, DESCONHECIDO se não numérica)."""
+    digitos = re.sub(r'[^\d]', '', caracteristicas.get("Dormitórios", "0"))
+    return int(digitos) if digitos else DESCONHECIDO
+
+
+def vagas_garagem(caracteristicas: Dict[str, Any]) -> int:
+    """Quantidade de vagas de garagem (0 se não informada)."""
+    vagas = caracteristicas.get("Garagem") or caracteristicas.get("Vagas na garagem") or ""
+    digitos = re.sub(r'[^\d]', '', vagas)
+    return int(digitos) if digitos else 0
+
+
+def texto_localizacao(imovel: Dict[str, Any]) -> str:
+    """Texto em minúsculas onde a localização é procurada (endereço e título)."""
+    return f"{imovel.get('endereco', '').lower()}\n{imovel.get('titulo', '').lower()}"
+
+
+class ListaImoveisMapeada:
+    """Sequência de imóveis lida sob demanda de um snapshot mapeado em memória."""
+
+    def __init__(self, buffer, offsets: memoryview, maximo_cache: int = INDICE_CACHE_IMOVEIS):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.maximo_cache = maximo_cache
+        self.cache: Dict[int, Dict[str, Any]] = {}
+        # As respostas são montadas em várias threads ao mesmo tempo (run_in_threadpool)
+        self.trava = threading.Lock()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, posicao):
+        if isinstance(posicao, slice):
+            return [self[i] for i in range(*posicao.indices(len(self)))]
+        if posicao < 0:
+            posicao += len(self)
+        if not 0 <= posicao < len(self):
+            raise IndexError(posicao)
+        with self.trava:
+            imovel = self.cache.get(posicao)
+        if imovel is None:
+            # Desserializado fora da trava: duas threads podem ler o mesmo imóvel, sem problema
+            imovel = pickle.loads(self.buffer[self.offsets[posicao]:self.offsets[posicao + 1]])
+            with self.trava:
+                if len(self.cache) >= self.maximo_cache:
+                    # Descartar o mais antigo (os dicts mantêm a ordem de inserção)
+                    del self.cache[next(iter(self.cache))]
+                self.cache[posicao] = imovel
+        return imovel
+
+    def __iter__(self):
+        for posicao in range(len(self)):
+            yield self[posicao]
+
+
+class ListaImoveisAlterada:
+    """Sequência de imóveis com alterações por cima de outra sequência (cópia na escrita).
+
+    A sequência base não é modificada nem copiada: só os imóveis alterados ou
+    acrescentados ficam em `alterados`, indexados pela posição.
+    """
+
+    def __init__(self, base, alterados: Dict[int, Dict[str, Any]], tamanho: int):
+        self.base = base
+        self.alterados = alterados
+        self.tamanho = tamanho
+
+    def __len__(self):
+        return self.tamanho
+
+    def __getitem__(self, posicao):
+        if isinstance(posicao, slice):
+            return [self[i] for i in range(*posicao.indices(len(self)))]
+        if posicao < 0:
+            posicao += len(self)
+        if not 0 <= posicao < len(self):
+            raise IndexError(posicao)
+        imovel = self.alterados.get(posicao)
+        return imovel if imovel is not None else self.base[posicao]
+
+    def __iter__(self):
+        for posicao in range(len(self)):
+            yield self[posicao]
+
+
+class IndiceImoveis:
+    """Imóveis com colunas normalizadas para busca e acesso por código."""
+
+    def __init__(self, imoveis, versao: str, origem: Optional[Dict[str, Any]] = None,
+                 precos=None, dormitorios=None, garagem=None, localizacao=None, codigos=None,
+                 base: Optional[str] = None, removidos: frozenset = frozenset()):
+        self.imoveis = imoveis
+        self.versao = versao
+        self.base = base or versao  # versão dos arquivos de dados, antes das alterações do registro
+        self.removidos = removidos  # posições de imóveis excluídos depois da carga
+        self.origem = origem or {}
+        if precos is None:
+            precos = array('d', (preco_numerico(imovel.get("preco", "0")) for imovel in imoveis))
+            dormitorios = array('i', (dormitorios_numerico(imovel.get("caracteristicas", {})) for imovel in imoveis))
+            garagem = array('i', (vagas_garagem(imovel.get("caracteristicas", {})) for imovel in imoveis))
+            localizacao = [texto_localizacao(imovel) for imovel in imoveis]
+            codigos = [imovel.get("codigo", "") for imovel in imoveis]
+        self.precos = precos
+        self.dormitorios = dormitorios
+        self.garagem = garagem
+        self.localizacao = localizacao
+        self.codigos = codigos
+        self.por_codigo = {codigo: posicao for posicao, codigo in enumerate(codigos) if posicao not in removidos}
+        # Projeções nomeadas já montadas e fragmentos JSON já serializados, por posição;
+        # valem só para esta versão do índice
+        self.projecoes: Dict[str, Dict[int, Dict[str, Any]]] = {nome: {} for nome in PROJECOES_CACHEADAS}
+        self.fragmentos: Dict[int, bytes] = {}
+
+    def __len__(self):
+        return len(self.imoveis) - len(self.removidos)
+
+    def ativos(self) -> Iterable[Dict[str, Any]]:
+        """Imóveis do índice, sem os excluídos."""
+        for posicao in range(len(self.imoveis)):
+            if posicao not in self.removidos:
+                yield self.imoveis[posicao]
+
+    def aplicar(self, alteracao: Dict[str, Any]) -> "IndiceImoveis":
+        """Retorna um novo índice com a alteração aplicada, sem modificar este.
+
+        `alteracao` é {"op": "salvar", "imovel": {...}} (inclui ou substitui pelo código)
+        ou {"op": "remover", "codigo": "..."}. As colunas são copiadas e só a posição
+        alterada é recalculada; os imóveis não alterados continuam sendo lidos da base.
+        """
+        precos = array('d', self.precos)
+        dormitorios = array('i', self.dormitorios)
+        garagem = array('i', self.garagem)
+        localizacao = list(self.localizacao)
+        codigos = list(self.codigos)
+        removidos = set(self.removidos)
+        if isinstance(self.imoveis, ListaImoveisAlterada):
+            base, alterados = self.imoveis.base, dict(self.imoveis.alterados)
+        else:
+            base, alterados = self.imoveis, {}
+        tamanho = len(self.imoveis)
+
+        if alteracao["op"] == "salvar":
+            imovel = limpar_imovel(alteracao["imovel"])
+            posicao = self.por_codigo.get(imovel["codigo"])
+            if posicao is None:
+                posicao = tamanho
+                tamanho += 1
+                precos.append(0.0)
+                dormitorios.append(DESCONHECIDO)
+                garagem.append(0)
+                localizacao.append("")
+                codigos.append(imovel["codigo"])
+            caracteristicas = imovel.get("caracteristicas", {})
+            precos[posicao] = preco_numerico(imovel.get("preco", "0"))
+            dormitorios[posicao] = dormitorios_numerico(caracteristicas)
+            garagem[posicao] = vagas_garagem(caracteristicas)
+            localizacao[posicao] = texto_localizacao(imovel)
+            alterados[posicao] = imovel
+        elif alteracao["op"] == "remover":
+            posicao = self.por_codigo.get(alteracao["codigo"])
+            if posicao is not None:
+                removidos.add(posicao)
+                alterados.pop(posicao, None)
+        else:
+            raise ValueError(f"Operação desconhecida: {alteracao['op']}")
+
+        chave = json.dumps(alteracao, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        versao = hashlib.sha256(self.versao.encode("utf-8") + chave).hexdigest()[:16]
+        return IndiceImoveis(
+            ListaImoveisAlterada(base, alterados, tamanho),
+            versao=versao,
+            origem=self.origem,
+            precos=precos,
+            dormitorios=dormitorios,
+            garagem=garagem,
+            localizacao=localizacao,
+            codigos=codigos,
+            base=self.base,
+            removidos=frozenset(removidos)
+        )
+
+    def obter(self, codigo: str) -> Optional[Dict[str, Any]]:
+        """Retorna o imóvel com este código, ou None."""
+        posicao = self.por_codigo.get(codigo)
+        return self.imoveis[posicao] if posicao is not None else None
+
+    def projetado(self, posicao: int, campos: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Imóvel da posição com os campos pedidos (ver projecoes.py).
+
+        As projeções nomeadas são montadas uma vez por imóvel e reaproveitadas
+        enquanto esta versão do índice estiver em uso.
+        """
+        for nome, cache in self.projecoes.items():
+            if campos is PROJECOES_CACHEADAS[nome] or campos == PROJECOES_CACHEADAS[nome]:
+                projecao = cache.get(posicao)
+                if projecao is None:
+                    projecao = cache[posicao] = projetar(self.imoveis[posicao], campos)
+                return projecao
+        return projetar(self.imoveis[posicao], campos)
+
+    def fragmento(self, posicao: int) -> bytes:
+        """JSON do imóvel relacionado (CAMPOS_RELACIONADO), serializado uma vez por versão do índice."""
+        fragmento = self.fragmentos.get(posicao)
+        if fragmento is None:
+            fragmento = json.dumps(self.projetado(posicao, CAMPOS_RELACIONADO), ensure_ascii=False,
+                                   separators=(",", ":")).encode("utf-8")
+            self.fragmentos[posicao] = fragmento
+        return fragmento
+
+    def filtrar(self, filtros: Dict[str, Any], posicoes: Optional[Iterable[int]] = None,
+                limite: Optional[int] = 10, campos: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Filtra os imóveis usando as colunas normalizadas.
+
+        Preços e dormitórios que não puderam ser interpretados não eliminam o imóvel,
+        como na busca original sobre o JSON. `campos` restringe os campos devolvidos
+        (ver projecoes.py); por padrão, o registro completo.
+        """
+        preco_min = filtros.get("preco_min")
+        preco_max = filtros.get("preco_max")
+        dormitorios = filtros.get("dormitorios")
+        garagem = filtros.get("garagem")
+        localizacao = filtros["localizacao"].lower() if "localizacao" in filtros else None
+
+        resultados = []
+        for posicao in (range(len(self.imoveis)) if posicoes is None else posicoes):
+            if posicao in self.removidos:
+                continue
+            preco = self.precos[posicao]
+            if preco_min is not None and not math.isnan(preco) and preco < preco_min:
+                continue
+            if preco_max is not None and not math.isnan(preco) and preco > preco_max:
+                continue
+            if dormitorios is not None and self.dormitorios[posicao] not in (DESCONHECIDO, dormitorios):
+                continue
+            if garagem and self.garagem[posicao] <= 0:
+                continue
+            if localizacao is not None and localizacao not in self.localizacao[posicao]:
+                continue
+
+            resultados.append(self.projetado(posicao, campos))
+            if limite and len(resultados) >= limite:
+                break
+        return resultados
+
+    def posicoes(self, imoveis: Iterable[Dict[str, Any]]) -> List[int]:
+        """Posições no índice dos imóveis informados (ignora os que não estão no índice)."""
+        return [self.por_codigo[imovel["codigo"]] for imovel in imoveis if imovel.get("codigo") in self.por_codigo]
+
+    @classmethod
+    def do_json(cls, caminho: Path) -> "IndiceImoveis":
+        """Monta o índice lendo o arquivo JSON de imóveis."""
+        with open(caminho, 'rb') as f:
+            conteudo = f.read()
+        imoveis = [limpar_imovel(imovel) for imovel in json.loads(conteudo)]
+        origem = descrever_origem(caminho)
+        origem["sha256"] = hashlib.sha256(conteudo).hexdigest()
+        return cls(imoveis, versao=origem["sha256"][:16], origem=origem)
+
+    def salvar_snapshot(self, caminho: Path = SNAPSHOT_PADRAO):
+        """Grava o snapshot binário de forma atômica (arquivo temporário + rename)."""
+        registros = [pickle.dumps(imovel, protocol=pickle.HIGHEST_PROTOCOL) for imovel in self.imoveis]
+        offsets = array('Q', [0])
+        for registro in registros:
+            offsets.append(offsets[-1] + len(registro))
+
+        secoes = [
+            ("precos", array('d', self.precos).tobytes(), "d"),
+            ("dormitorios", array('i', self.dormitorios).tobytes(), "i"),
+            ("garagem", array('i', self.garagem).tobytes(), "i"),
+            ("offsets", offsets.tobytes(), "Q"),
+            ("localizacao", pickle.dumps(list(self.localizacao), protocol=pickle.HIGHEST_PROTOCOL), "pickle"),
+            ("codigos", pickle.dumps(list(self.codigos), protocol=pickle.HIGHEST_PROTOCOL), "pickle"),
+            ("imoveis", b"".join(registros), "bytes"),
+        ]
+
+        # Posições relativas ao início das seções, cada uma alinhada a 8 bytes
+        corpo = bytearray()
+        descricao_secoes = {}
+        for nome, dados, tipo in secoes:
+            corpo.extend(b"\x00" * (-len(corpo) % ALINHAMENTO))
+            descricao_secoes[nome] = {"inicio": len(corpo), "tamanho": len(dados), "tipo": tipo}
+            corpo.extend(dados)
+
+        cabecalho = json.dumps({
+            "versao": self.versao,
+            "origem": self.origem,
+            "total": len(self.imoveis),
+            "crc32": zlib.crc32(corpo),
+            "secoes": descricao_secoes
+        }).encode("utf-8")
+        # Completar o cabeçalho para que as seções comecem alinhadas
+        cabecalho += b" " * (-(len(MAGIC) + 8 + len(cabecalho)) % ALINHAMENTO)
+
+        caminho = Path(caminho)
+        temporario = caminho.with_name(caminho.name + ".tmp")
+        with open(temporario, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<II", FORMATO_SNAPSHOT, len(cabecalho)))
+            f.write(cabecalho)
+            f.write(corpo)
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def do_snapshot(cls, caminho: Path = SNAPSHOT_PADRAO, origem: Optional[Path] = None) -> Optional["IndiceImoveis"]:
+        """Carrega o snapshot; retorna None se não existir, for inválido ou estiver desatualizado.
+
+        O snapshot é considerado desatualizado quando o arquivo de origem mudou
+        (tamanho ou data de modificação diferentes dos registrados no cabeçalho).
+        """
+        caminho = Path(caminho)
+        if not caminho.exists() or caminho.stat().st_size < len(MAGIC) + 8:
+            return None
+
+        with open(caminho, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if buffer[:len(MAGIC)] != MAGIC:
+            print(f"Snapshot {caminho} inválido (assinatura desconhecida)")
+            return None
+        formato, tamanho_cabecalho = struct.unpack_from("<II", buffer, len(MAGIC))
+        if formato != FORMATO_SNAPSHOT:
+            print(f"Snapshot {caminho} em formato {formato}, esperado {FORMATO_SNAPSHOT}")
+            return None
+
+        inicio_corpo = len(MAGIC) + 8 + tamanho_cabecalho
+        cabecalho = json.loads(buffer[len(MAGIC) + 8:inicio_corpo])
+
+        if origem is not None and Path(origem).exists():
+            atual = descrever_origem(origem)
+            registrada = cabecalho.get("origem", {})
+            if any(atual[chave] != registrada.get(chave) for chave in ("arquivo", "tamanho", "mtime_ns")):
+                print(f"Snapshot {caminho} desatualizado em relação a {origem}")
+                return None
+
+        dados = memoryview(buffer)[inicio_corpo:]
+        if zlib.crc32(dados) != cabecalho["crc32"]:
+            print(f"Snapshot {caminho} corrompido (CRC32 não confere)")
+            return None
+
+        def secao(nome):
+            info = cabecalho["secoes"][nome]
+            conteudo = dados[info["inicio"]:info["inicio"] + info["tamanho"]]
+            if info["tipo"] == "pickle":
+                return pickle.loads(conteudo)
+            if info["tipo"] == "bytes":
+                return conteudo
+            return conteudo.cast(info["tipo"])
+
+        imoveis = ListaImoveisMapeada(secao("imoveis"), secao("offsets"))
+        return cls(
+            imoveis,
+            versao=cabecalho["versao"],
+            origem=cabecalho.get("origem"),
+            precos=secao("precos"),
+            dormitorios=secao("dormitorios"),
+            garagem=secao("garagem"),
+            localizacao=secao("localizacao"),
+            codigos=secao("codigos")
+        )
+
+
+def carregar_indice(data_dir: Path = DATA_DIR, snapshot: Path = SNAPSHOT_PADRAO) -> IndiceImoveis:
+    """Carrega o índice do snapshot, ou do JSON se o snapshot não existir ou estiver desatualizado."""
+    origem = arquivo_origem(data_dir)
+    indice = IndiceImoveis.do_snapshot(snapshot, origem)
+    if indice is not None:
+        print(f"Usando snapshot do índice: {snapshot} (versão {indice.versao})")
+        return indice
+
+    print(f"Carregando imóveis de {origem}...")
+    return IndiceImoveis.do_json(origem)
+
+
+def gerar_snapshot(data_dir: Path = DATA_DIR, snapshot: Path = SNAPSHOT_PADRAO) -> IndiceImoveis:
+    """Monta o índice a partir do JSON e grava o snapshot binário."""
+    origem = arquivo_origem(data_dir)
+    indice = IndiceImoveis.do_json(origem)
+    indice.salvar_snapshot(snapshot)
+    print(f"Snapshot do índice salvo em {snapshot} ({len(indice)} imóveis, versão {indice.versao})")
+    return indice
+
+
+def garantir_snapshot(data_dir: Path = DATA_DIR, snapshot: Path = SNAPSHOT_PADRAO) -> Path:
+    """Gera o snapshot se ele não existir ou estiver desatualizado, e retorna o caminho.
+
+    Usado antes de iniciar vários workers, para que todos mapeiem o mesmo arquivo
+    em vez de cada um montar sua própria cópia do índice a partir do JSON.
+    """
+    if IndiceImoveis.do_snapshot(snapshot, arquivo_origem(data_dir)) is None:
+        gerar_snapshot(data_dir, snapshot)
+    return snapshot
+
+
+def assinatura_dados(data_dir: Path = DATA_DIR, snapshot: Path = SNAPSHOT_PADRAO,
+                     extras: Iterable[Path] = ()) -> tuple:
+    """Tamanho e mtime dos arquivos de imóveis, do snapshot e de `extras`, para detectar alterações sem lê-los."""
+    assinatura = []
+    for caminho in [data_dir / nome for nome in ARQUIVOS_IMOVEIS] + [snapshot] + list(extras):
+        try:
+            info = caminho.stat()
+            assinatura.append((caminho.name, info.st_size, info.st_mtime_ns))
+        except OSError:
+            assinatura.append((caminho.name, None, None))
+    return tuple(assinatura)
@@ -0,0 +1,184 @@
+"""Medição de latência, tokens e custo das respostas do assistente.
+
+Cada resposta carrega uma `Medicao` com o tempo de cada etapa (busca, montagem do
+prompt, chamada ao modelo), o caminho seguido (código, busca ou fallback), os
+tokens do prompt e da resposta e os acertos de cache. As medições são somadas em
+memória em `METRICAS`, exposto pela API em /metricas.
+"""
+
+import os
+import time
+import threading
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+# Preço em dólares por 1.000 tokens (prompt, resposta), pelo prefixo do nome do modelo
+PRECOS_MODELOS = {
+    "openai:gpt-3.5-turbo": (0.0005, 0.0015),
+    "openai:gpt-4o-mini": (0.00015, 0.0006),
+    "openai:gpt-4o": (0.005, 0.015),
+    "openai:gpt-4": (0.03, 0.06),
+    "local:": (0.0, 0.0),
+}
+PRECO_PROMPT_1K = os.getenv("PRECO_PROMPT_1K")  # sobrescreve a tabela acima, se definido
+PRECO_RESPOSTA_1K = os.getenv("PRECO_RESPOSTA_1K")
+AMOSTRAS_POR_ETAPA = 1000  # medições recentes mantidas para calcular percentis
+
+CAMINHO_CODIGO = "codigo"
+CAMINHO_BUSCA = "busca"
+CAMINHO_FALLBACK = "fallback"
+CAMINHO_DEGRADADO = "degradado"  # resposta estruturada por sobrecarga do modelo
+CAMINHO_ERRO = "erro"
+
+_codificador = None
+
+
+def contar_tokens(texto: str) -> int:
+    """Conta tokens com o tiktoken, se instalado; caso contrário, estima pelo tamanho do texto."""
+    global _codificador
+    if not texto:
+        return 0
+    if _codificador is None:
+        try:
+            import tiktoken
+            _codificador = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _codificador = False
+    if _codificador:
+        return len(_codificador.encode(texto))
+    return len(texto) // 4 + 1
+
+
+def calcular_custo(modelo: Optional[str], tokens_prompt: int, tokens_resposta: int) -> float:
+    """Custo estimado em dólares de uma chamada ao modelo."""
+    if not modelo:
+        return 0.0
+    if PRECO_PROMPT_1K is not None and PRECO_RESPOSTA_1K is not None:
+        preco_prompt, preco_resposta = float(PRECO_PROMPT_1K), float(PRECO_RESPOSTA_1K)
+    else:
+        precos = [valor for prefixo, valor in PRECOS_MODELOS.items() if modelo.startswith(prefixo)]
+        if not precos:
+            return 0.0
+        preco_prompt, preco_resposta = precos[0]
+    return (tokens_prompt * preco_prompt + tokens_resposta * preco_resposta) / 1000
+
+
+class Medicao:
+    """Métricas de uma única resposta."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.caminho: Optional[str] = None
+        self.fallback = False  # resposta montada sem o modelo de linguagem
+        self.degradada = False  # o modelo foi pulado porque a fila estava longa demais
+        self.etapas: Dict[str, float] = {}
+        self.cache: Dict[str, bool] = {}
+        self.modelo: Optional[str] = None
+        self.tokens_prompt = 0
+        self.tokens_resposta = 0
+        self.total_ms: Optional[float] = None
+
+    def registrar_etapa(self, nome: str, inicio: float):
+        """Soma à etapa o tempo decorrido desde `inicio` (valor de time.perf_counter())."""
+        self.etapas[nome] = self.etapas.get(nome, 0.0) + (time.perf_counter() - inicio) * 1000
+
+    @contextmanager
+    def etapa(self, nome: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_etapa(nome, inicio)
+
+    def registrar_cache(self, nome: str, acerto: bool):
+        self.cache[nome] = acerto
+
+    def registrar_tokens(self, modelo: str, prompt: str, resposta: str):
+        self.modelo = modelo
+        self.tokens_prompt = contar_tokens(prompt)
+        self.tokens_resposta = contar_tokens(resposta)
+
+    def finalizar(self):
+        self.total_ms = (time.perf_counter() - self.inicio) * 1000
+
+    def para_dict(self) -> Dict[str, Any]:
+        return {
+            "caminho": self.caminho,
+            "fallback": self.fallback,
+            "degradada": self.degradada,
+            "total_ms": round(self.total_ms or 0.0, 2),
+            "etapas_ms": {nome: round(ms, 2) for nome, ms in self.etapas.items()},
+            "cache": self.cache,
+            "modelo": self.modelo,
+            "tokens_prompt": self.tokens_prompt,
+            "tokens_resposta": self.tokens_resposta,
+            "custo_usd": round(calcular_custo(self.modelo, self.tokens_prompt, self.tokens_resposta), 6)
+        }
+
+
+class AgregadorMetricas:
+    """Soma as medições de todas as respostas desde o início do servidor."""
+
+    def __init__(self, amostras: int = AMOSTRAS_POR_ETAPA):
+        self.amostras = amostras
+        self.trava = threading.Lock()
+        self.limpar()
+
+    def limpar(self):
+        with self.trava:
+            self.total_respostas = 0
+            self.caminhos = defaultdict(int)
+            self.etapas = defaultdict(lambda: deque(maxlen=self.amostras))
+            self.etapas_contagem = defaultdict(int)
+            self.etapas_soma = defaultdict(float)
+            self.cache = defaultdict(lambda: {"acertos": 0, "falhas": 0})
+            self.tokens_prompt = 0
+            self.tokens_resposta = 0
+            self.custo_usd = 0.0
+
+    def registrar(self, medicao: Medicao):
+        if medicao.total_ms is None:
+            medicao.finalizar()
+        with self.trava:
+            self.total_respostas += 1
+            self.caminhos[medicao.caminho or "desconhecido"] += 1
+            if medicao.fallback:
+                self.caminhos[CAMINHO_FALLBACK] += 1
+            if medicao.degradada:
+                self.caminhos[CAMINHO_DEGRADADO] += 1
+            for nome, ms in list(medicao.etapas.items()) + [("total", medicao.total_ms)]:
+                self.etapas[nome].append(ms)
+                self.etapas_contagem[nome] += 1
+                self.etapas_soma[nome] += ms
+            for nome, acerto in medicao.cache.items():
+                self.cache[nome]["acertos" if acerto else "falhas"] += 1
+            self.tokens_prompt += medicao.tokens_prompt
+            self.tokens_resposta += medicao.tokens_resposta
+            self.custo_usd += calcular_custo(medicao.modelo, medicao.tokens_prompt, medicao.tokens_resposta)
+
+    def resumo(self) -> Dict[str, Any]:
+        with self.trava:
+            etapas = {}
+            for nome, valores in self.etapas.items():
+                ordenados = sorted(valores)
+                etapas[nome] = {
+                    "contagem": self.etapas_contagem[nome],
+                    "media_ms": round(self.etapas_soma[nome] / self.etapas_contagem[nome], 2),
+                    "p50_ms": round(ordenados[len(ordenados) // 2], 2),
+                    "p95_ms": round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))], 2),
+                    "max_ms": round(ordenados[-1], 2)
+                }
+            return {
+                "total_respostas": self.total_respostas,
+                "caminhos": dict(self.caminhos),
+                "etapas": etapas,
+                "cache": {nome: dict(valores) for nome, valores in self.cache.items()},
+                "tokens_prompt": self.tokens_prompt,
+                "tokens_resposta": self.tokens_resposta,
+                "custo_usd": round(self.custo_usd, 6)
+            }
+
+
+# Agregador usado pelo assistente e exposto pela API
+METRICAS = AgregadorMetricas()
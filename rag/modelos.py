@@ -0,0 +1,163 @@
+"""Backends de modelo de linguagem usados pelo assistente.
+
+Todos os backends expõem a mesma interface usada em AssistenteImobiliaria:
+`predict(prompt) -> str` e `await apredict(prompt) -> str`.
+
+- openai: ChatOpenAI (precisa de OPENAI_API_KEY)
+- local: modelo GGUF quantizado rodando na CPU via llama.cpp (llama-cpp-python),
+  carregado uma única vez em cada processo de um pool de workers
+- auto: OpenAI com fallback para o modelo local quando o provedor falhar
+"""
+
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente
+load_dotenv(Path(__file__).parent / '.env')
+
+# Configurações
+LLM_BACKEND = os.getenv("LLM_BACKEND", "auto")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo-0125")
+LLM_TEMPERATURE = 0.2
+LOCAL_MODEL_PATH = os.getenv("LOCAL_MODEL_PATH", "")
+LOCAL_MODEL_WORKERS = int(os.getenv("LOCAL_MODEL_WORKERS", "1"))
+LOCAL_MODEL_THREADS = int(os.getenv("LOCAL_MODEL_THREADS", "0"))  # 0 = dividir os núcleos entre os workers
+LOCAL_MODEL_CTX = int(os.getenv("LOCAL_MODEL_CTX", "4096"))
+LOCAL_MODEL_MAX_TOKENS = int(os.getenv("LOCAL_MODEL_MAX_TOKENS", "768"))
+
+# Modelo carregado em cada processo do pool local (persistente entre as chamadas)
+_modelo_local = None
+
+
+def _carregar_modelo_local(caminho: str, n_threads: int, n_ctx: int):
+    """Inicializador dos workers: carrega o modelo GGUF uma vez por processo."""
+    global _modelo_local
+    from llama_cpp import Llama
+
+    _modelo_local = Llama(model_path=caminho, n_ctx=n_ctx, n_threads=n_threads, verbose=False)
+
+
+def _gerar_local(prompt: str, max_tokens: int) -> str:
+    """Executa uma geração no modelo já carregado no processo worker."""
+    resultado = _modelo_local.create_chat_completion(
+        messages=[{"role": "user", "content": prompt}],
+        temperature=LLM_TEMPERATURE,
+        max_tokens=max_tokens
+    )
+    return resultado["choices"][0]["message"]["content"]
+
+
+class ModeloOpenAI:
+    """Modelo da OpenAI via langchain."""
+
+    def __init__(self, modelo: str = LLM_MODEL):
+        from langchain_openai import ChatOpenAI
+
+        self.nome = f"openai:{modelo}"
+        self.llm = ChatOpenAI(model=modelo, temperature=LLM_TEMPERATURE)
+
+    def predict(self, prompt: str) -> str:
+        return self.llm.predict(prompt)
+
+    async def apredict(self, prompt: str) -> str:
+        return await self.llm.apredict(prompt)
+
+
+class ModeloLocal:
+    """Modelo GGUF quantizado rodando na CPU em um pool de processos.
+
+    Cada worker mantém o modelo carregado na memória, então só a primeira chamada
+    de cada processo paga o custo de carregamento.
+    """
+
+    def __init__(self, caminho: str = LOCAL_MODEL_PATH, workers: int = LOCAL_MODEL_WORKERS,
+                 n_threads: int = LOCAL_MODEL_THREADS, n_ctx: int = LOCAL_MODEL_CTX,
+                 max_tokens: int = LOCAL_MODEL_MAX_TOKENS):
+        if not caminho or not os.path.exists(caminho):
+            raise FileNotFoundError(f"Modelo local não encontrado: {caminho or '(LOCAL_MODEL_PATH vazio)'}")
+
+        # Verificar a dependência aqui para falhar cedo, e não dentro do worker
+        import llama_cpp  # noqa: F401
+
+        if n_threads <= 0:
+            n_threads = max(1, (os.cpu_count() or 1) // workers)
+
+        self.nome = f"local:{os.path.basename(caminho)}"
+        self.max_tokens = max_tokens
+        # "spawn" evita herdar threads e sockets do servidor no processo worker
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_carregar_modelo_local,
+            initargs=(caminho, n_threads, n_ctx)
+        )
+
+    def predict(self, prompt: str) -> str:
+        return self.executor.submit(_gerar_local, prompt, self.max_tokens).result()
+
+    async def apredict(self, prompt: str) -> str:
+        # Cancelar a espera remove a geração da fila se ela ainda não começou
+        futuro = self.executor.submit(_gerar_local, prompt, self.max_tokens)
+        return await asyncio.wrap_future(futuro)
+
+
+class ModeloComFallback:
+    """Usa o modelo principal e recorre ao reserva quando o principal falha."""
+
+    def __init__(self, principal, reserva):
+        self.principal = principal
+        self.reserva = reserva
+        self.nome = f"{principal.nome} (reserva: {reserva.nome})"
+
+    def predict(self, prompt: str) -> str:
+        try:
+            return self.principal.predict(prompt)
+        except Exception as e:
+            print(f"Erro no modelo {self.principal.nome}: {e}. Usando {self.reserva.nome}.")
+            return self.reserva.predict(prompt)
+
+    async def apredict(self, prompt: str) -> str:
+        try:
+            return await self.principal.apredict(prompt)
+        except Exception as e:
+            print(f"Erro no modelo {self.principal.nome}: {e}. Usando {self.reserva.nome}.")
+            return await self.reserva.apredict(prompt)
+
+
+def openai_configurado() -> bool:
+    """Verifica se há uma chave da OpenAI válida configurada."""
+    chave = os.getenv("OPENAI_API_KEY")
+    return bool(chave) and chave != "sua_chave_aqui"
+
+
+def modelo_local_configurado() -> bool:
+    """Verifica se há um modelo local configurado em LOCAL_MODEL_PATH."""
+    return bool(LOCAL_MODEL_PATH) and os.path.exists(LOCAL_MODEL_PATH)
+
+
+def criar_modelo(backend: str = LLM_BACKEND) -> Optional[object]:
+    """Cria o modelo de linguagem conforme LLM_BACKEND, ou None se nenhum estiver disponível."""
+    principal = None
+    reserva = None
+
+    if backend in ("openai", "auto") and openai_configurado():
+        try:
+            principal = ModeloOpenAI()
+        except Exception as e:
+            print(f"Erro ao inicializar modelo OpenAI: {e}")
+
+    if backend == "local" or (backend == "auto" and modelo_local_configurado()):
+        try:
+            reserva = ModeloLocal()
+        except Exception as e:
+            print(f"Erro ao inicializar modelo local: {e}")
+
+    if principal and reserva:
+        return ModeloComFallback(principal, reserva)
+    return principal or reserva
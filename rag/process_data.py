@@ -204,6 +204,13 @@ def main():
     """Função principal."""
     print("Processando dados para o sistema RAG...")
     
+    # Gerar o snapshot binário do índice, carregado pelo assistente na inicialização
+    from indice import gerar_snapshot
+    try:
+        gerar_snapshot()
+    except Exception as e:
+        print(f"Erro ao gerar o snapshot do índice: {e}")
+    
     # Preparar os documentos
     documentos = preparar_documentos()
     
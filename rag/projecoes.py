@@ -0,0 +1,100 @@
+"""Projeções dos imóveis usadas nas respostas da API.
+
+Listagens precisam só de alguns campos de cada imóvel; o registro completo tem a
+descrição, o endereço longo e dezenas de links de imagens. As projeções nomeadas
+(card, detail, full) e o parâmetro `fields=` escolhem os campos devolvidos.
+Além das chaves do registro, há campos derivados das características e das imagens.
+As fotos do CDN do site têm três variantes de tamanho (src/variantes_imagens.py): a
+miniatura dos cards usa a média, e os campos *_srcset trazem as três para o cliente.
+"""
+
+import sys
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from variantes_imagens import srcset, url_variante
+
+PROJECAO_PADRAO = "full"
+
+
+def imagens_validas(imovel: Dict[str, Any]) -> List[str]:
+    """Links de imagens do imóvel (limpos ao montar o índice, ver src/links_imagens.py)."""
+    return imovel.get("links_imagens") or []
+
+
+def _imagem_capa(imovel: Dict[str, Any]) -> Optional[str]:
+    imagens = imagens_validas(imovel)
+    return imagens[0] if imagens else imovel.get("imagem_principal")
+
+
+def _miniatura(imovel: Dict[str, Any]) -> Optional[str]:
+    """Capa do imóvel na variante média: os cards não precisam da foto grande."""
+    capa = _imagem_capa(imovel)
+    return url_variante(capa, "im") if capa else None
+
+
+def _miniatura_srcset(imovel: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    capa = _imagem_capa(imovel)
+    return srcset(capa) if capa else None
+
+
+# Campos calculados a partir do registro
+CAMPOS_DERIVADOS = {
+    "tipo": lambda imovel: imovel.get("caracteristicas", {}).get("Tipo", ""),
+    "dormitorios": lambda imovel: imovel.get("caracteristicas", {}).get("Dormitórios", ""),
+    "banheiros": lambda imovel: imovel.get("caracteristicas", {}).get("Banheiros", ""),
+    "garagem": lambda imovel: (imovel.get("caracteristicas", {}).get("Garagem")
+                               or imovel.get("caracteristicas", {}).get("Vagas na garagem", "")),
+    "area": lambda imovel: imovel.get("caracteristicas", {}).get("Área total", ""),
+    "miniatura": _miniatura,
+    "miniatura_srcset": _miniatura_srcset,
+    "fotos": imagens_validas,
+    "fotos_srcset": lambda imovel: [srcset(link) for link in imagens_validas(imovel)],
+    "features": lambda imovel: [f"{k}: {v}" for k, v in imovel.get("caracteristicas", {}).items()],
+}
+
+# Chaves do registro de imóvel (ver data/imoveis_com_links.json)
+CAMPOS_REGISTRO = ["codigo", "titulo", "preco", "endereco", "caracteristicas", "descricao", "link",
+                   "imagens", "imagens_locais", "links_imagens", "variantes_imagens", "imagem_principal"]
+
+CAMPOS_VALIDOS = set(CAMPOS_REGISTRO) | set(CAMPOS_DERIVADOS)
+
+# None = registro completo, sem cópia
+PROJECOES = {
+    "card": ["codigo", "preco", "tipo", "dormitorios", "miniatura", "miniatura_srcset"],
+    "detail": ["codigo", "titulo", "preco", "endereco", "link", "tipo", "dormitorios", "banheiros",
+               "garagem", "area", "caracteristicas", "descricao", "fotos", "fotos_srcset"],
+    "full": None,
+}
+
+# Imóveis relacionados nas respostas de /perguntar (mesmos campos de ImovelRelacionado em app.py)
+CAMPOS_RELACIONADO = ["codigo", "titulo", "preco", "link", "dormitorios", "banheiros", "garagem",
+                      "tipo", "area", "features"]
+
+# Projeções montadas uma vez por imóvel e guardadas no índice
+PROJECOES_CACHEADAS = {**{nome: campos for nome, campos in PROJECOES.items() if campos},
+                       "relacionado": CAMPOS_RELACIONADO}
+
+
+def campos_da_requisicao(projecao: Optional[str], fields: Optional[str]) -> Optional[List[str]]:
+    """Lista de campos pedida (None = registro completo). Lança ValueError se for inválida."""
+    if fields:
+        campos = [campo.strip() for campo in fields.split(",") if campo.strip()]
+        invalidos = [campo for campo in campos if campo not in CAMPOS_VALIDOS]
+        if invalidos:
+            raise ValueError(f"Campos desconhecidos: {', '.join(invalidos)}. Válidos: {', '.join(sorted(CAMPOS_VALIDOS))}")
+        return list(dict.fromkeys(campos))
+
+    projecao = projecao or PROJECAO_PADRAO
+    if projecao not in PROJECOES:
+        raise ValueError(f"Projeção desconhecida: {projecao}. Válidas: {', '.join(PROJECOES)}")
+    return PROJECOES[projecao]
+
+
+def projetar(imovel: Dict[str, Any], campos: Optional[List[str]]) -> Dict[str, Any]:
+    """Imóvel apenas com os campos pedidos (o próprio registro se `campos` for None)."""
+    if campos is None:
+        return imovel
+    return {campo: CAMPOS_DERIVADOS[campo](imovel) if campo in CAMPOS_DERIVADOS else imovel.get(campo)
+            for campo in campos}
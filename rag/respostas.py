@@ -0,0 +1,112 @@
+"""Geração assíncrona de respostas do assistente.
+
+Permite que o endpoint /perguntar devolva os imóveis e imagens logo após a busca,
+enquanto o texto da resposta é gerado em segundo plano por um conjunto fixo de
+workers. O cliente consulta o resultado depois em /respostas/{answer_id}.
+"""
+
+import os
+import time
+import uuid
+import asyncio
+from typing import Dict, Any, Optional
+
+# Configurações
+RESPOSTA_WORKERS = int(os.getenv("RESPOSTA_WORKERS", "4"))
+RESPOSTA_TTL = int(os.getenv("RESPOSTA_TTL", "600"))  # segundos que uma resposta fica disponível
+LIMITE_FILA_RESPOSTAS = int(os.getenv("LIMITE_FILA_RESPOSTAS", "32"))  # pendentes antes de usar a resposta estruturada
+
+STATUS_PENDENTE = "pendente"
+STATUS_CONCLUIDA = "concluida"
+STATUS_ERRO = "erro"
+
+
+class TarefaResposta:
+    """Estado de uma resposta sendo gerada em segundo plano."""
+
+    def __init__(self, contexto: Dict[str, Any]):
+        self.answer_id = uuid.uuid4().hex
+        self.contexto = contexto
+        self.status = STATUS_PENDENTE
+        self.resposta: Optional[str] = None
+        self.criada_em = time.monotonic()
+        self.concluida = asyncio.Event()
+
+    def para_dict(self) -> Dict[str, Any]:
+        return {
+            "answer_id": self.answer_id,
+            "status": self.status,
+            "resposta": self.resposta
+        }
+
+
+class GerenciadorRespostas:
+    """Fila de respostas pendentes atendida por um conjunto fixo de workers."""
+
+    def __init__(self, assistente, num_workers: int = RESPOSTA_WORKERS, ttl: int = RESPOSTA_TTL):
+        self.assistente = assistente
+        self.num_workers = num_workers
+        self.ttl = ttl
+        self.tarefas: Dict[str, TarefaResposta] = {}
+        self.fila: Optional[asyncio.Queue] = None
+        self.workers = []
+
+    def _iniciar_workers(self):
+        """Cria a fila e os workers no loop de eventos atual (na primeira utilização)."""
+        if self.fila is not None:
+            return
+        self.fila = asyncio.Queue()
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+
+    async def _worker(self):
+        while True:
+            tarefa = await self.fila.get()
+            try:
+                tarefa.resposta = await self.assistente.agerar_resposta(tarefa.contexto)
+                tarefa.status = STATUS_CONCLUIDA
+            except Exception as e:
+                print(f"Erro ao gerar resposta {tarefa.answer_id}: {e}")
+                tarefa.resposta = "Desculpe, ocorreu um erro ao processar sua pergunta. Por favor, tente novamente mais tarde."
+                tarefa.status = STATUS_ERRO
+            finally:
+                tarefa.contexto = None
+                tarefa.concluida.set()
+                self.fila.task_done()
+
+    def _remover_expiradas(self):
+        limite = time.monotonic() - self.ttl
+        expiradas = [answer_id for answer_id, tarefa in self.tarefas.items()
+                     if tarefa.concluida.is_set() and tarefa.criada_em < limite]
+        for answer_id in expiradas:
+            del self.tarefas[answer_id]
+
+    def submeter(self, contexto: Dict[str, Any]) -> str:
+        """Enfileira a geração do texto para o contexto e retorna o answer_id.
+
+        Com a fila acima de LIMITE_FILA_RESPOSTAS, a resposta é marcada para usar o
+        texto estruturado em vez de esperar o modelo (ver agerar_resposta).
+        """
+        self._iniciar_workers()
+        self._remover_expiradas()
+
+        if self.fila.qsize() >= LIMITE_FILA_RESPOSTAS:
+            contexto["degradar"] = True
+
+        tarefa = TarefaResposta(contexto)
+        self.tarefas[tarefa.answer_id] = tarefa
+        self.fila.put_nowait(tarefa)
+        return tarefa.answer_id
+
+    async def obter(self, answer_id: str, aguardar: float = 0) -> Optional[Dict[str, Any]]:
+        """Retorna o estado da resposta, esperando até `aguardar` segundos se ainda estiver pendente."""
+        tarefa = self.tarefas.get(answer_id)
+        if tarefa is None:
+            return None
+
+        if aguardar > 0 and not tarefa.concluida.is_set():
+            try:
+                await asyncio.wait_for(tarefa.concluida.wait(), timeout=aguardar)
+            except asyncio.TimeoutError:
+                pass
+
+        return tarefa.para_dict()
@@ -22,6 +22,17 @@ def check_openai_key():
         return False
     return True
 
+def check_local_model():
+    """Verifica se um modelo local (LOCAL_MODEL_PATH) está configurado."""
+    from dotenv import load_dotenv
+    load_dotenv(PROJECT_ROOT / '.env')
+    
+    caminho = os.getenv("LOCAL_MODEL_PATH")
+    if os.getenv("LLM_BACKEND", "auto") in ("local", "auto") and caminho and os.path.exists(caminho):
+        print(f"Modelo local disponível: {caminho}")
+        return True
+    return False
+
 def process_data():
     """Processa os dados e cria o banco de dados vetorial."""
     print("\n=== Processando dados e criando banco de dados vetorial ===\n")
@@ -35,12 +46,23 @@ def process_data():
     process_main()
 
 def run_api():
-    """Executa o servidor FastAPI."""
+    """Executa o servidor FastAPI em modo de desenvolvimento (com recarregamento automático)."""
     print("\n=== Iniciando servidor da API ===\n")
     
     # Importar e executar o app
     from app import main as app_main
-    app_main()
+    app_main(reload=True)
+
+def run_serve(workers):
+    """Executa o servidor FastAPI em modo de produção, com vários workers e sem recarregamento."""
+    print(f"\n=== Iniciando servidor da API ({workers} workers) ===\n")
+    
+    # Gerar o snapshot antes de iniciar os workers, para que todos mapeiem o mesmo arquivo
+    from indice import garantir_snapshot
+    garantir_snapshot()
+    
+    from app import main as app_main
+    app_main(workers=workers)
 
 def run_cli():
     """Executa interface de linha de comando para testes."""
@@ -64,8 +86,8 @@ def run_cli():
             if not pergunta.strip():
                 continue
             
-            resultado = assistente.responder(pergunta)
-            print("\nResposta:", resultado['resposta'])
+            # Mostrar os imóveis encontrados antes de gerar o texto da resposta
+            resultado = assistente.preparar_resposta(pergunta)
             
             if resultado['imoveis_relacionados']:
                 print("\nImóveis relacionados:")
@@ -76,6 +98,8 @@ def run_cli():
                 print("\nImagens disponíveis:")
                 for i, img in enumerate(resultado['imagens_relacionadas'][:3]):
                     print(f"- Imagem {i+1}: {img}")
+            
+            print("\nResposta:", assistente.gerar_resposta(resultado))
     
     except Exception as e:
         print(f"Erro ao inicializar o assistente: {e}")
@@ -94,6 +118,11 @@ def main():
     # Subparser para executar o servidor
     server_parser = subparsers.add_parser("server", help="Iniciar o servidor da API")
     
+    # Subparser para executar o servidor em produção
+    serve_parser = subparsers.add_parser("serve", help="Iniciar o servidor da API em produção (vários workers)")
+    serve_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                              help="Número de processos do servidor (padrão: número de núcleos)")
+    
     # Subparser para a interface de linha de comando
     cli_parser = subparsers.add_parser("cli", help="Iniciar interface de linha de comando")
     
@@ -105,6 +134,7 @@ def main():
     
     # Verificar se a chave da OpenAI está configurada
     has_key = check_openai_key()
+    has_model = has_key or check_local_model()
     
     if args.comando == "process":
         if not has_key:
@@ -115,14 +145,20 @@ def main():
         process_data()
     
     elif args.comando == "server":
-        if not has_key:
-            print("A API requer uma chave da OpenAI para funcionar.")
+        if not has_model:
+            print("A API requer uma chave da OpenAI ou um modelo local (LOCAL_MODEL_PATH) para funcionar.")
             return
         run_api()
     
+    elif args.comando == "serve":
+        if not has_model:
+            print("A API requer uma chave da OpenAI ou um modelo local (LOCAL_MODEL_PATH) para funcionar.")
+            return
+        run_serve(max(1, args.workers))
+    
     elif args.comando == "cli":
-        if not has_key:
-            print("A interface de linha de comando requer uma chave da OpenAI para funcionar.")
+        if not has_model:
+            print("A interface de linha de comando requer uma chave da OpenAI ou um modelo local (LOCAL_MODEL_PATH) para funcionar.")
             return
         run_cli()
     
@@ -131,13 +167,14 @@ def main():
         print("=======================================\n")
         print("Este sistema permite usar IA para responder perguntas sobre imóveis da Nova Torres Imobiliária.\n")
         print("Passos para utilização:")
-        print("1. Configure sua chave da OpenAI no arquivo 'rag/.env'")
+        print("1. Configure sua chave da OpenAI no arquivo 'rag/.env' (ou LOCAL_MODEL_PATH para um modelo local)")
         print("2. Execute 'python rag/run_rag.py process' para processar os dados e criar o banco de dados vetorial")
         print("3. Execute 'python rag/run_rag.py server' para iniciar o servidor web")
         print("   ou 'python rag/run_rag.py cli' para usar a interface de linha de comando\n")
         print("Comandos disponíveis:")
         print("- process: Processa os dados e cria o banco de dados vetorial")
-        print("- server: Inicia o servidor web para a interface gráfica")
+        print("- server: Inicia o servidor web para a interface gráfica (desenvolvimento)")
+        print("- serve --workers N: Inicia o servidor web em produção com N processos")
         print("- cli: Inicia a interface de linha de comando para testes rápidos")
         print("- help: Exibe esta ajuda\n")
     
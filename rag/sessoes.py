@@ -0,0 +1,102 @@
+"""Sessões de conversa com o assistente.
+
+Cada sessão guarda os filtros estruturados e os imóveis candidatos da última busca,
+para que perguntas de continuação ("e tem com garagem?") apenas refinem os candidatos
+já encontrados em vez de buscar do zero. O histórico da conversa é compactado para
+caber em um orçamento de tokens antes de ir para o prompt.
+"""
+
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+# Configurações
+SESSAO_TTL = int(os.getenv("SESSAO_TTL", "1800"))  # segundos de inatividade até a sessão expirar
+SESSAO_MAX = int(os.getenv("SESSAO_MAX", "1000"))  # sessões mantidas em memória
+HISTORICO_MAX_TOKENS = int(os.getenv("HISTORICO_MAX_TOKENS", "600"))
+RESPOSTA_MAX_CARACTERES = 300  # trecho de cada resposta anterior mantido no histórico
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa grosseira de tokens (cerca de 4 caracteres por token em português)."""
+    return len(texto) // 4 + 1
+
+
+class Sessao:
+    """Estado de uma conversa: filtros, candidatos e histórico de turnos."""
+
+    def __init__(self, sessao_id: Optional[str] = None):
+        self.sessao_id = sessao_id or uuid.uuid4().hex
+        self.filtros: Dict[str, Any] = {}
+        self.candidatos: List[Dict[str, Any]] = []
+        self.versao_indice: Optional[str] = None  # versão do índice de onde vieram os candidatos
+        self.historico: List[Dict[str, str]] = []
+        self.resumo = ""  # perguntas antigas que saíram do histórico
+        self.atualizada_em = time.monotonic()
+
+    def registrar_turno(self, pergunta: str, resposta: str):
+        """Adiciona um turno ao histórico e compacta se passar do orçamento."""
+        self.historico.append({
+            "pergunta": pergunta,
+            "resposta": resposta[:RESPOSTA_MAX_CARACTERES]
+        })
+        self.compactar()
+
+    def compactar(self, limite_tokens: int = HISTORICO_MAX_TOKENS):
+        """Move os turnos mais antigos para o resumo até o histórico caber em limite_tokens."""
+        while len(self.historico) > 1 and estimar_tokens(self.historico_texto()) > limite_tokens:
+            antigo = self.historico.pop(0)
+            self.resumo = f"{self.resumo}; {antigo['pergunta']}" if self.resumo else antigo["pergunta"]
+
+        # O resumo também respeita o orçamento: manter apenas o final
+        limite_resumo = limite_tokens * 4 // 3
+        if len(self.resumo) > limite_resumo:
+            self.resumo = "..." + self.resumo[-limite_resumo:]
+
+    def historico_texto(self) -> str:
+        """Histórico formatado para inclusão no prompt."""
+        linhas = []
+        if self.resumo:
+            linhas.append(f"Perguntas anteriores: {self.resumo}")
+        for turno in self.historico:
+            linhas.append(f"Cliente: {turno['pergunta']}")
+            linhas.append(f"Corretor: {turno['resposta']}")
+        return "\n".join(linhas)
+
+
+class GerenciadorSessoes:
+    """Guarda as sessões em memória, descartando as inativas e as menos usadas."""
+
+    def __init__(self, ttl: int = SESSAO_TTL, maximo: int = SESSAO_MAX):
+        self.ttl = ttl
+        self.maximo = maximo
+        self.sessoes: "OrderedDict[str, Sessao]" = OrderedDict()
+
+    def obter(self, sessao_id: Optional[str]) -> Sessao:
+        """Retorna a sessão com este id, criando uma nova se não existir ou tiver expirado."""
+        self._remover_expiradas()
+
+        sessao = self.sessoes.get(sessao_id) if sessao_id else None
+        if sessao is None:
+            sessao = Sessao(sessao_id)
+            self.sessoes[sessao.sessao_id] = sessao
+            while len(self.sessoes) > self.maximo:
+                self.sessoes.popitem(last=False)
+
+        sessao.atualizada_em = time.monotonic()
+        self.sessoes.move_to_end(sessao.sessao_id)
+        return sessao
+
+    def encerrar(self, sessao_id: str) -> bool:
+        return self.sessoes.pop(sessao_id, None) is not None
+
+    def _remover_expiradas(self):
+        limite = time.monotonic() - self.ttl
+        # As sessões estão em ordem de uso, então as expiradas ficam no início
+        while self.sessoes:
+            sessao = next(iter(self.sessoes.values()))
+            if sessao.atualizada_em >= limite:
+                break
+            self.sessoes.popitem(last=False)
@@ -20,6 +20,9 @@ def main():
     parser.add_argument('--v2', action='store_true', help='Usar a versão 2 do scraper (mais robusta)')
     parser.add_argument('--simples', action='store_true', help='Usar versão simples (sem Selenium/navegador)')
     parser.add_argument('--imagens', action='store_true', help='Executar apenas a extração de imagens')
+    parser.add_argument('--derivadas', action='store_true', help='Executar apenas a geração das derivadas WebP das imagens')
+    parser.add_argument('--duplicatas', action='store_true', help='Executar apenas a detecção de imagens quase duplicadas')
+    parser.add_argument('--otimizar', action='store_true', help='Executar apenas a otimização sem perdas das imagens JPEG (requer jpegtran)')
     
     args = parser.parse_args()
     
@@ -34,6 +37,8 @@ def main():
         return
     
     tempo_inicio = time.time()
+    # Só as etapas que baixam ou alteram imagens atualizam o catálogo no fim
+    imagens_alteradas = False
     
     # Execução específica para extração de imagens
     if args.imagens:
@@ -44,6 +49,38 @@ def main():
         if not executar_comando("python3 src/extrair_imagens.py"):
             print("Falha na extração de imagens. Abortando.")
             return
+        imagens_alteradas = True
+    
+    # Geração das versões card, galeria e zoom das imagens baixadas
+    elif args.derivadas:
+        print("\n" + "=" * 60)
+        print("ETAPA ESPECIAL: GERAÇÃO DAS DERIVADAS DAS IMAGENS")
+        print("=" * 60)
+        
+        if not executar_comando("python3 src/gerar_derivadas.py"):
+            print("Falha na geração das derivadas. Abortando.")
+            return
+    
+    # Hashes perceptuais e grupos de imagens quase duplicadas
+    elif args.duplicatas:
+        print("\n" + "=" * 60)
+        print("ETAPA ESPECIAL: DETECÇÃO DE IMAGENS QUASE DUPLICADAS")
+        print("=" * 60)
+        
+        if not executar_comando("python3 src/hash_perceptual.py"):
+            print("Falha na detecção de duplicatas. Abortando.")
+            return
+    
+    # JPEG progressivo sem metadados (os originais ficam guardados)
+    elif args.otimizar:
+        print("\n" + "=" * 60)
+        print("ETAPA ESPECIAL: OTIMIZAÇÃO DAS IMAGENS")
+        print("=" * 60)
+        
+        if not executar_comando("python3 src/otimizar_imagens.py"):
+            print("Falha na otimização das imagens. Abortando.")
+            return
+        imagens_alteradas = True
     
     # Execução dos scripts conforme os argumentos (se não for apenas extração de imagens)
     elif args.scraper or (not args.scraper and not args.preparar and not args.imagens):
@@ -62,8 +99,9 @@ def main():
         if not executar_comando(f"python3 {scraper_script}"):
             print("Falha na raspagem de dados. Abortando.")
             return
+        imagens_alteradas = True
     
-    if args.preparar or (not args.scraper and not args.preparar and not args.imagens):
+    if args.preparar or (not args.scraper and not args.preparar and not args.imagens and not args.derivadas and not args.duplicatas and not args.otimizar):
         print("\n" + "=" * 60)
         print("ETAPA 2: PREPARAÇÃO DOS DADOS PARA IA")
         print("=" * 60)
@@ -100,14 +138,19 @@ def main():
     if os.path.exists("data/contexto_geral.md"):
         print(f"- data/contexto_geral.md ({os.path.getsize('data/contexto_geral.md') / 1024:.1f} KB)")
     
-    # Contar imagens baixadas
-    total_imagens = 0
-    for raiz, dirs, arquivos in os.walk("data/images"):
-        for arquivo in arquivos:
-            if arquivo.endswith((".jpg", ".png", ".gif", ".webp")):
-                total_imagens += 1
-    
-    print(f"- Total de imagens baixadas: {total_imagens}")
+    # Atualizar o catálogo só se esta execução baixou ou alterou imagens (só as novas ou
+    # alteradas são examinadas); o resumo é lido do catálogo, sem percorrer os arquivos
+    if imagens_alteradas:
+        executar_comando("python3 src/catalogo_imagens.py")
+    from src.catalogo_imagens import CATALOGO, conectar, resumo
+    if CATALOGO.exists():
+        conexao = conectar()
+        dados = resumo(conexao)
+        conexao.close()
+        print(f"- Total de imagens baixadas: {dados['imagens'] - dados['invalidas']} "
+              f"({dados['bytes'] / 1024 / 1024:.1f} MB), {dados['invalidas']} inválidas ou truncadas")
+    else:
+        print("- Imagens ainda não catalogadas (execute python3 src/catalogo_imagens.py)")
     
     print("\nPróximos passos:")
     print("1. Verifique os dados extraídos em data/imoveis.json e data/imoveis.csv")
@@ -0,0 +1,257 @@
+import os
+import json
+import shutil
+import threading
+import hashlib
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Configurações
+DATA_DIR = Path("data")
+ARMAZEM_DIR = DATA_DIR / "armazem"
+TAMANHO_BLOCO = 1024 * 1024
+
+# Diretórios antigos de imagens e a coleção correspondente nos manifestos.
+# images e images_new guardam <codigo>/<nome>; imagens_simples guarda <codigo>.jpg
+COLECOES = {
+    "images": DATA_DIR / "images",
+    "images_new": DATA_DIR / "images_new",
+    "imagens_simples": DATA_DIR / "imagens_simples",
+}
+
+# Assinaturas dos formatos de imagem, para a extensão do blob
+ASSINATURAS = [
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF8", ".gif"),
+]
+
+def extensao_do_conteudo(inicio):
+    """Extensão do arquivo a partir dos primeiros bytes do conteúdo."""
+    for assinatura, extensao in ASSINATURAS:
+        if inicio.startswith(assinatura):
+            return extensao
+    if inicio[:4] == b"RIFF" and inicio[8:12] == b"WEBP":
+        return ".webp"
+    return ".bin"
+
+def separar_caminho(colecao, caminho):
+    """Retorna (codigo, nome) de um caminho de imagem relativo ao diretório da coleção."""
+    caminho = caminho.replace("\\", "/").strip("/")
+    if colecao == "imagens_simples":
+        return Path(caminho).stem, caminho
+    codigo, _, nome = caminho.partition("/")
+    return codigo, nome
+
+class ArmazemImagens:
+    """Armazenamento de imagens endereçado pelo conteúdo.
+
+    Cada conteúdo é gravado uma única vez em blobs/<2 primeiros caracteres do sha256>/<sha256><ext>,
+    e o manifesto de cada imóvel (imoveis/<codigo>.json) liga os nomes usados pelos
+    scripts de download, por coleção, aos blobs. Um blob nunca muda depois de gravado.
+    """
+
+    def __init__(self, raiz=ARMAZEM_DIR):
+        self.raiz = Path(raiz)
+        self.dir_blobs = self.raiz / "blobs"
+        self.dir_manifestos = self.raiz / "imoveis"
+        self._manifestos = {}
+
+    # Blobs
+
+    def caminho_blob(self, blob):
+        return self.dir_blobs / blob[:2] / blob
+
+    def url_blob(self, blob):
+        """Caminho relativo usado nos dados e servido em /blobs pela API."""
+        return f"blobs/{blob[:2]}/{blob}"
+
+    def guardar(self, conteudo):
+        """Grava o conteúdo (se ainda não existir) e retorna o nome do blob."""
+        blob = hashlib.sha256(conteudo).hexdigest() + extensao_do_conteudo(conteudo[:16])
+        destino = self.caminho_blob(blob)
+        if not destino.exists():
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            temporario = destino.with_name(f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(temporario, 'wb') as f:
+                f.write(conteudo)
+            os.replace(temporario, destino)
+        return blob
+
+    def guardar_arquivo(self, caminho, mover=False):
+        """Grava o conteúdo de um arquivo; com `mover`, o original é movido ou apagado."""
+        caminho = Path(caminho)
+        sha256 = hashlib.sha256()
+        with open(caminho, 'rb') as f:
+            inicio = f.read(16)
+            sha256.update(inicio)
+            for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b""):
+                sha256.update(bloco)
+        blob = sha256.hexdigest() + extensao_do_conteudo(inicio)
+
+        destino = self.caminho_blob(blob)
+        if destino.exists():
+            if mover:
+                caminho.unlink()
+            return blob
+
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        temporario = destino.with_name(f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp")
+        if mover:
+            os.replace(caminho, temporario)
+        else:
+            shutil.copyfile(caminho, temporario)
+        os.replace(temporario, destino)
+        return blob
+
+    # Manifestos
+
+    def caminho_manifesto(self, codigo):
+        return self.dir_manifestos / f"{str(codigo).replace('/', '-')}.json"
+
+    def manifesto(self, codigo):
+        """Manifesto do imóvel ({"codigo", "colecoes": {colecao: {nome: blob}}}), relido se mudar no disco."""
+        caminho = self.caminho_manifesto(codigo)
+        try:
+            assinatura = caminho.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {"codigo": codigo, "colecoes": {}}
+
+        em_cache = self._manifestos.get(codigo)
+        if em_cache and em_cache[0] == assinatura:
+            return em_cache[1]
+        with open(caminho, 'r', encoding='utf-8') as f:
+            manifesto = json.load(f)
+        self._manifestos[codigo] = (assinatura, manifesto)
+        return manifesto
+
+    def salvar_manifesto(self, manifesto):
+        caminho = self.caminho_manifesto(manifesto["codigo"])
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        temporario = caminho.with_suffix(".tmp")
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, ensure_ascii=False, indent=2)
+        os.replace(temporario, caminho)
+        self._manifestos.pop(manifesto["codigo"], None)
+
+    def registrar(self, codigo, colecao, nome, blob):
+        """Associa o nome da imagem na coleção do imóvel ao blob."""
+        manifesto = self.manifesto(codigo)
+        manifesto.setdefault("colecoes", {}).setdefault(colecao, {})[nome] = blob
+        self.salvar_manifesto(manifesto)
+
+    def imagens(self, codigo, colecao):
+        """{nome: blob} das imagens do imóvel na coleção."""
+        return self.manifesto(codigo).get("colecoes", {}).get(colecao, {})
+
+    def resolver(self, colecao, caminho):
+        """Arquivo do blob para um caminho antigo (ex.: "-2202/6.jpg" em images), ou None."""
+        codigo, nome = separar_caminho(colecao, caminho)
+        if not codigo or not nome:
+            return None
+        blob = self.imagens(codigo, colecao).get(nome)
+        if blob is None:
+            return None
+        arquivo = self.caminho_blob(blob)
+        return arquivo if arquivo.exists() else None
+
+    def codigos(self):
+        if not self.dir_manifestos.exists():
+            return []
+        return [caminho.stem for caminho in self.dir_manifestos.glob("*.json")]
+
+    def fontes(self, colecao, diretorio=None):
+        """{caminho antigo: arquivo} da coleção: os blobs registrados e os arquivos ainda não migrados.
+
+        O caminho antigo é relativo ao diretório da coleção: "<codigo>/<nome>", ou só o nome
+        em imagens_simples.
+        """
+        fontes = {}
+        diretorio = Path(diretorio) if diretorio else COLECOES[colecao]
+        if diretorio.exists():
+            for entrada in os.scandir(diretorio):
+                if entrada.is_dir():
+                    for arquivo in os.scandir(entrada.path):
+                        if arquivo.is_file():
+                            fontes[f"{entrada.name}/{arquivo.name}"] = Path(arquivo.path)
+                elif colecao == "imagens_simples" and entrada.is_file():
+                    fontes[entrada.name] = Path(entrada.path)
+        for codigo in self.codigos():
+            for nome, blob in self.imagens(codigo, colecao).items():
+                fontes[nome if colecao == "imagens_simples" else f"{codigo}/{nome}"] = self.caminho_blob(blob)
+        return fontes
+
+def listar_arquivos_antigos():
+    """Retorna [(colecao, codigo, nome, caminho)] dos diretórios antigos de imagens."""
+    arquivos = []
+    for colecao, diretorio in COLECOES.items():
+        if not diretorio.exists():
+            continue
+        for raiz, _, nomes in os.walk(diretorio):
+            for nome in nomes:
+                caminho = Path(raiz) / nome
+                codigo, nome_imagem = separar_caminho(colecao, str(caminho.relative_to(diretorio)))
+                if codigo and nome_imagem:
+                    arquivos.append((colecao, codigo, nome_imagem, caminho))
+    return arquivos
+
+def migrar(armazem, remover_originais=False, workers=8):
+    """Copia (ou move) as imagens dos diretórios antigos para o armazém e monta os manifestos."""
+    # Importado aqui: o servidor usa só ArmazemImagens e não depende do tqdm
+    from tqdm import tqdm
+
+    arquivos = listar_arquivos_antigos()
+    total_bytes = sum(caminho.stat().st_size for _, _, _, caminho in arquivos)
+    print(f"Encontradas {len(arquivos)} imagens ({total_bytes / 1024 / 1024:.1f} MB) em {', '.join(COLECOES)}")
+
+    # Hash e cópia em paralelo: o custo é de leitura do disco, não de CPU
+    def guardar(item):
+        colecao, codigo, nome, caminho = item
+        return colecao, codigo, nome, armazem.guardar_arquivo(caminho, mover=remover_originais)
+
+    manifestos = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for colecao, codigo, nome, blob in tqdm(executor.map(guardar, arquivos), total=len(arquivos), desc="Migrando"):
+            if codigo not in manifestos:
+                manifestos[codigo] = armazem.manifesto(codigo)
+            manifestos[codigo].setdefault("colecoes", {}).setdefault(colecao, {})[nome] = blob
+
+    for manifesto in manifestos.values():
+        armazem.salvar_manifesto(manifesto)
+
+    if remover_originais:
+        for diretorio in COLECOES.values():
+            if diretorio.exists():
+                for raiz, _, _ in sorted(os.walk(diretorio), key=lambda item: -len(item[0])):
+                    if Path(raiz) != diretorio and not os.listdir(raiz):
+                        os.rmdir(raiz)
+
+    blobs = {blob for manifesto in manifestos.values() for colecao in manifesto["colecoes"].values() for blob in colecao.values()}
+    bytes_blobs = sum(armazem.caminho_blob(blob).stat().st_size for blob in blobs)
+    return len(arquivos), total_bytes, len(blobs), bytes_blobs, len(manifestos)
+
+def main():
+    """Função principal."""
+    parser = argparse.ArgumentParser(description='Migra as imagens de data/images, data/images_new e data/imagens_simples para o armazém endereçado pelo conteúdo')
+    parser.add_argument('--remover-originais', action='store_true', help='Mover os arquivos para o armazém e apagar os diretórios antigos')
+    parser.add_argument('--workers', type=int, default=8, help='Threads de leitura (padrão: 8)')
+    args = parser.parse_args()
+
+    print("\n===== MIGRAÇÃO PARA O ARMAZÉM DE IMAGENS =====\n")
+    tempo_inicio = time.time()
+    armazem = ArmazemImagens()
+    arquivos, total_bytes, blobs, bytes_blobs, imoveis = migrar(armazem, args.remover_originais, args.workers)
+
+    print(f"\nImagens: {arquivos} arquivos ({total_bytes / 1024 / 1024:.1f} MB)")
+    print(f"Armazém: {blobs} blobs únicos ({bytes_blobs / 1024 / 1024:.1f} MB) em {armazem.dir_blobs}")
+    print(f"Manifestos de {imoveis} imóveis em {armazem.dir_manifestos}")
+    if total_bytes:
+        print(f"Economia: {(total_bytes - bytes_blobs) / 1024 / 1024:.1f} MB ({100 * (1 - bytes_blobs / total_bytes):.0f}%)")
+    if not args.remover_originais:
+        print("Os diretórios antigos foram mantidos; use --remover-originais para liberar o espaço.")
+    print(f"Concluído em {time.time() - tempo_inicio:.1f} segundos")
+
+if __name__ == "__main__":
+    main()
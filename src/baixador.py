@@ -0,0 +1,352 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Configurações
+# Downloads simultâneos no total e por host: o limite por host evita sobrecarregar o site
+# da imobiliária enquanto as imagens de vários imóveis são baixadas ao mesmo tempo
+WORKERS = int(os.getenv("BAIXADOR_WORKERS", "16"))
+LIMITE_POR_HOST = int(os.getenv("BAIXADOR_LIMITE_POR_HOST", "8"))
+TIMEOUT = (10, 30)  # (conexão, leitura) em segundos
+TENTATIVAS = 3
+TAMANHO_BLOCO = 256 * 1024
+BUFFER_ARQUIVO = 1024 * 1024
+ARQUIVO_METADADOS = Path("data") / "metadados_urls.json"
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+EXTENSOES_POR_TIPO = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+def extensao_do_tipo(content_type, padrao=".jpg"):
+    """Extensão do arquivo a partir do Content-Type da resposta."""
+    tipo = (content_type or "").split(";")[0].strip().lower()
+    return EXTENSOES_POR_TIPO.get(tipo, padrao)
+
+def validador_da_resposta(resposta):
+    """ETag forte ou Last-Modified da resposta, usado no If-Range ao retomar um download."""
+    etag = resposta.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return resposta.headers.get("Last-Modified")
+
+def tamanho_esperado(resposta):
+    """Tamanho total do arquivo informado pelo servidor, ou None."""
+    intervalo = resposta.headers.get("Content-Range", "")
+    if "/" in intervalo and not intervalo.endswith("/*"):
+        return int(intervalo.rsplit("/", 1)[1])
+    if resposta.status_code == 200 and "Content-Length" in resposta.headers \
+            and "Content-Encoding" not in resposta.headers:
+        return int(resposta.headers["Content-Length"])
+    return None
+
+def hash_arquivo(caminho):
+    sha256 = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b""):
+            sha256.update(bloco)
+    return sha256.hexdigest()
+
+def cabecalhos_condicionais(anterior):
+    """If-None-Match/If-Modified-Since a partir dos validadores da última resposta."""
+    headers = {}
+    if anterior.get("etag"):
+        headers["If-None-Match"] = anterior["etag"]
+    if anterior.get("last_modified"):
+        headers["If-Modified-Since"] = anterior["last_modified"]
+    return headers
+
+def campos_metadados(resultado):
+    return {
+        "etag": resultado["etag"],
+        "last_modified": resultado["last_modified"],
+        "bytes": resultado["bytes"],
+        "tipo": resultado["tipo"],
+        "hash": resultado["hash"],
+        "verificado_em": time.time(),
+    }
+
+def copia_local(anterior, destino, extensao_pelo_tipo=False):
+    """Arquivo baixado da última vez para o destino, se ainda está intacto no disco, ou None."""
+    if not anterior or not (anterior.get("etag") or anterior.get("last_modified")):
+        return None
+    for caminho, mtime in anterior.get("arquivos", {}).items():
+        arquivo = Path(caminho)
+        if arquivo != destino and not (extensao_pelo_tipo and arquivo.with_suffix("") == destino):
+            continue
+        # Tamanho e data iguais aos gravados: o arquivo não foi sobrescrito por outra imagem
+        try:
+            info = arquivo.stat()
+        except FileNotFoundError:
+            continue
+        if info.st_size == anterior["bytes"] and info.st_mtime_ns == mtime:
+            return arquivo
+    return None
+
+class MetadadosUrls:
+    """Validadores HTTP e conteúdo de cada URL baixada, guardados entre execuções.
+
+    {url: {"etag", "last_modified", "bytes", "tipo", "hash", "verificado_em", "arquivos": {caminho: mtime}, "blob"}}
+    Os downloads seguintes da mesma URL mandam If-None-Match/If-Modified-Since.
+    """
+
+    def __init__(self, arquivo=ARQUIVO_METADADOS, salvar_a_cada=500):
+        self.arquivo = Path(arquivo)
+        self.salvar_a_cada = salvar_a_cada
+        self._trava = threading.Lock()
+        self._pendentes = 0
+        self.urls = {}
+        if self.arquivo.exists():
+            try:
+                with open(self.arquivo, 'r', encoding='utf-8') as f:
+                    self.urls = json.load(f)
+            except json.JSONDecodeError:
+                print(f"Arquivo {self.arquivo} inválido, baixando as imagens novamente")
+
+    def obter(self, url):
+        with self._trava:
+            entrada = self.urls.get(url)
+            return dict(entrada) if entrada else None
+
+    def atualizar(self, url, **campos):
+        with self._trava:
+            self.urls.setdefault(url, {}).update(campos)
+            self._pendentes += 1
+            salvar = self._pendentes >= self.salvar_a_cada
+        if salvar:
+            self.salvar()
+
+    def salvar(self):
+        """Grava o arquivo (substituição atômica) se houve alterações."""
+        with self._trava:
+            if not self._pendentes:
+                return
+            self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+            temporario = self.arquivo.with_suffix(".tmp")
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(self.urls, f, ensure_ascii=False)
+            os.replace(temporario, self.arquivo)
+            self._pendentes = 0
+
+class DownloadIncompleto(requests.exceptions.ChunkedEncodingError):
+    """A conexão terminou antes do fim do arquivo; o download é retomado de onde parou."""
+
+class Baixador:
+    """Downloads de imagens compartilhados pelos scripts de raspagem.
+
+    Uma sessão com conexões reaproveitadas, um pool de threads com limite de downloads
+    simultâneos por host, blocos de 256 KB e gravação em <destino>.part com substituição
+    atômica no fim: um download interrompido nunca deixa um arquivo corrompido no destino
+    e é retomado com Range na próxima tentativa (ou na próxima execução).
+    """
+
+    def __init__(self, headers=None, workers=WORKERS, limite_por_host=LIMITE_POR_HOST, timeout=TIMEOUT, metadados=None):
+        self.timeout = timeout
+        self.metadados = metadados if metadados is not None else MetadadosUrls()
+        self.contagem = {"baixadas": 0, "inalteradas": 0, "bytes": 0}
+        self.limite_por_host = limite_por_host
+        self.sessao = requests.Session()
+        self.sessao.headers.update(headers or HEADERS)
+        # Erros de conexão e respostas 429/5xx são repetidos pela própria sessão
+        retry = Retry(total=TENTATIVAS, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET", "HEAD"), raise_on_status=False)
+        adaptador = HTTPAdapter(pool_connections=8, pool_maxsize=max(workers, limite_por_host), max_retries=retry)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.mount("https://", adaptador)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="baixador")
+        self._trava = threading.Lock()
+        self._hosts = {}  # host: semáforo
+        self._destinos = {}  # arquivo .part: trava
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.encerrar()
+
+    def _semaforo(self, url):
+        host = urlsplit(url).netloc
+        with self._trava:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.limite_por_host)
+            return self._hosts[host]
+
+    def _trava_destino(self, parcial):
+        with self._trava:
+            return self._destinos.setdefault(str(parcial), threading.Lock())
+
+    def _contar(self, resultado):
+        with self._trava:
+            if resultado["inalterado"]:
+                self.contagem["inalteradas"] += 1
+            else:
+                self.contagem["baixadas"] += 1
+                self.contagem["bytes"] += resultado["bytes"]
+
+    def baixar(self, url, destino, extensao_pelo_tipo=False):
+        """Baixa a URL para `destino` e retorna {"url", "arquivo", "bytes", "tipo", "hash", "retomado", "inalterado"}.
+
+        Com `extensao_pelo_tipo`, a extensão do Content-Type é acrescentada ao nome do destino.
+        Se o destino ainda é o arquivo baixado da última vez, o pedido é condicional e um 304
+        não transfere nada. Respostas de erro levantam requests.HTTPError.
+        """
+        destino = Path(destino)
+        anterior = self.metadados.obter(url)
+        local = copia_local(anterior, destino, extensao_pelo_tipo)
+        resultado = self._baixar(url, destino, extensao_pelo_tipo, anterior if local else None)
+
+        if resultado["inalterado"]:
+            resultado["arquivo"] = local
+            self.metadados.atualizar(url, verificado_em=time.time())
+        else:
+            # A entrada pode ter sido gravada por baixar_para_armazem (só com "blob", sem "arquivos")
+            mesmo_conteudo = anterior and anterior.get("hash") == resultado["hash"]
+            arquivos = dict(anterior.get("arquivos", {})) if mesmo_conteudo else {}
+            arquivos[str(resultado["arquivo"])] = resultado["arquivo"].stat().st_mtime_ns
+            # Conteúdo novo: o blob da versão anterior não pode mais ser confirmado com um 304
+            blob = anterior.get("blob") if mesmo_conteudo else None
+            self.metadados.atualizar(url, **campos_metadados(resultado), arquivos=arquivos, blob=blob)
+        self._contar(resultado)
+        return resultado
+
+    def _baixar(self, url, destino, extensao_pelo_tipo, anterior):
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        parcial = destino.with_name(destino.name + ".part")
+        condicionais = cabecalhos_condicionais(anterior) if anterior else {}
+
+        with self._semaforo(url), self._trava_destino(parcial):
+            for tentativa in range(TENTATIVAS):
+                try:
+                    resultado = self._baixar_parcial(url, parcial, condicionais)
+                    break
+                except DownloadIncompleto:
+                    # Erros de conexão e 429/5xx antes do corpo já foram repetidos pelo Retry da sessão;
+                    # aqui só se retoma um corpo interrompido, de onde parou (o .part fica no disco)
+                    if tentativa == TENTATIVAS - 1:
+                        raise
+
+            if resultado["inalterado"]:
+                return {**resultado, "url": url, "bytes": anterior["bytes"], "tipo": anterior["tipo"], "hash": anterior["hash"]}
+
+            final = destino.with_name(destino.name + extensao_do_tipo(resultado["tipo"])) if extensao_pelo_tipo else destino
+            os.replace(parcial, final)
+            self._arquivo_validador(parcial).unlink(missing_ok=True)
+        return {**resultado, "url": url, "arquivo": final, "hash": hash_arquivo(final)}
+
+    def _arquivo_validador(self, parcial):
+        return parcial.with_name(parcial.name + ".validador")
+
+    def _baixar_parcial(self, url, parcial, condicionais):
+        arquivo_validador = self._arquivo_validador(parcial)
+        inicio = parcial.stat().st_size if parcial.exists() else 0
+        validador = arquivo_validador.read_text(encoding="utf-8") if inicio and arquivo_validador.exists() else None
+
+        # Retomar só com um validador: If-Range faz o servidor mandar o arquivo inteiro se ele mudou.
+        # Um .part pendente tem prioridade sobre o pedido condicional
+        headers = {"Range": f"bytes={inicio}-", "If-Range": validador} if validador else condicionais
+        with self.sessao.get(url, headers=headers, stream=True, timeout=self.timeout) as resposta:
+            if resposta.status_code == 304 and not validador:
+                return {"inalterado": True, "retomado": False}
+            retomado = bool(validador) and resposta.status_code == 206 \
+                and resposta.headers.get("Content-Range", "").startswith(f"bytes {inicio}-")
+            if validador and (resposta.status_code == 416 or (resposta.status_code == 206 and not retomado)):
+                # O .part não corresponde mais ao arquivo do servidor: recomeçar
+                parcial.unlink(missing_ok=True)
+                arquivo_validador.unlink(missing_ok=True)
+                return self._baixar_parcial(url, parcial, condicionais)
+            resposta.raise_for_status()
+
+            if not retomado:
+                novo_validador = validador_da_resposta(resposta)
+                if novo_validador:
+                    arquivo_validador.write_text(novo_validador, encoding="utf-8")
+                else:
+                    arquivo_validador.unlink(missing_ok=True)
+
+            with open(parcial, 'ab' if retomado else 'wb', buffering=BUFFER_ARQUIVO) as f:
+                try:
+                    for bloco in resposta.iter_content(TAMANHO_BLOCO):
+                        f.write(bloco)
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                    raise DownloadIncompleto(f"{url}: conexão interrompida durante o download ({e})") from e
+            esperado = tamanho_esperado(resposta)
+            tipo = resposta.headers.get("Content-Type", "")
+            etag = resposta.headers.get("ETag")
+            last_modified = resposta.headers.get("Last-Modified")
+
+        tamanho = parcial.stat().st_size
+        if esperado is not None and tamanho < esperado:
+            raise DownloadIncompleto(f"{url}: recebidos {tamanho} de {esperado} bytes")
+        return {"bytes": tamanho, "tipo": tipo, "etag": etag, "last_modified": last_modified,
+                "retomado": retomado, "inalterado": False}
+
+    def baixar_para_armazem(self, url, armazem):
+        """Baixa a URL direto para o armazém de imagens e retorna o resultado com o "blob"."""
+        anterior = self.metadados.obter(url)
+        blob = anterior.get("blob") if anterior else None
+        # Blobs nunca mudam: se o da última vez existe, basta confirmar com o servidor
+        local = blob and armazem.caminho_blob(blob).exists()
+
+        # O .part fica no mesmo disco do armazém, e a gravação do blob é só um rename
+        parcial = armazem.raiz / "parciais" / hashlib.sha1(url.encode("utf-8")).hexdigest()
+        resultado = self._baixar(url, parcial, False, anterior if local else None)
+
+        if resultado["inalterado"]:
+            resultado["arquivo"] = armazem.caminho_blob(blob)
+            self.metadados.atualizar(url, verificado_em=time.time())
+        else:
+            blob = armazem.guardar_arquivo(resultado["arquivo"], mover=True)
+            resultado["arquivo"] = armazem.caminho_blob(blob)
+            # Arquivos gravados por baixar() com outro conteúdo não valem mais para esta URL
+            arquivos = anterior.get("arquivos", {}) if anterior and anterior.get("hash") == resultado["hash"] else {}
+            self.metadados.atualizar(url, **campos_metadados(resultado), blob=blob, arquivos=arquivos)
+        self._contar(resultado)
+        return {**resultado, "blob": blob}
+
+    def verificar(self, url):
+        """Confere se a URL existe sem baixar o corpo: {"status", "tipo"}.
+
+        Usa HEAD; servidores que não aceitam HEAD (405/501) recebem um GET cujo corpo não é lido.
+        """
+        with self._semaforo(url):
+            resposta = self.sessao.head(url, timeout=self.timeout, allow_redirects=True)
+            if resposta.status_code in (405, 501):
+                resposta = self.sessao.get(url, timeout=self.timeout, stream=True)
+            resposta.close()
+        return {"status": resposta.status_code, "tipo": resposta.headers.get("Content-Type", "")}
+
+    def agendar_verificacao(self, url):
+        """Agenda verificar() no pool e retorna o Future."""
+        return self._executor.submit(self.verificar, url)
+
+    def agendar(self, url, destino, extensao_pelo_tipo=False):
+        """Agenda baixar() no pool e retorna o Future."""
+        return self._executor.submit(self.baixar, url, destino, extensao_pelo_tipo)
+
+    def agendar_para_armazem(self, url, armazem):
+        """Agenda baixar_para_armazem() no pool e retorna o Future."""
+        return self._executor.submit(self.baixar_para_armazem, url, armazem)
+
+    def resumo(self):
+        """Texto com as imagens baixadas e as confirmadas sem alteração (304)."""
+        return (f"{self.contagem['baixadas']} imagens baixadas ({self.contagem['bytes'] / 1024 / 1024:.1f} MB), "
+                f"{self.contagem['inalteradas']} sem alteração no servidor")
+
+    def encerrar(self):
+        self._executor.shutdown(wait=True)
+        self.sessao.close()
+        self.metadados.salvar()
@@ -0,0 +1,208 @@
+import io
+import os
+import sqlite3
+import argparse
+import threading
+import time
+from multiprocessing import Pool
+from pathlib import Path
+
+# Configurações
+DATA_DIR = Path("data")
+CATALOGO = DATA_DIR / "catalogo_imagens.sqlite"
+EXTENSOES = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+
+# Coleções catalogadas: as mesmas do armazém de imagens (src/armazem_imagens.py)
+COLECOES = ["images", "images_new", "imagens_simples"]
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS imagens (
+    colecao TEXT NOT NULL,
+    caminho TEXT NOT NULL,
+    codigo TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    hash TEXT,
+    formato TEXT,
+    largura INTEGER,
+    altura INTEGER,
+    valida INTEGER NOT NULL,
+    erro TEXT,
+    PRIMARY KEY (colecao, caminho)
+);
+CREATE INDEX IF NOT EXISTS imagens_codigo ON imagens (codigo);
+CREATE INDEX IF NOT EXISTS imagens_hash ON imagens (hash);
+"""
+
+COLUNAS = ["colecao", "caminho", "codigo", "bytes", "mtime", "hash", "formato", "largura", "altura", "valida", "erro"]
+
+def examinar_imagem(tarefa):
+    """Lê e decodifica uma imagem (executado nos processos do pool).
+
+    A decodificação completa detecta JPEGs truncados por downloads interrompidos e
+    arquivos que não são imagens (ex.: páginas HTML gravadas como .jpg).
+    """
+    import hashlib
+    from PIL import Image, UnidentifiedImageError
+
+    colecao, caminho, codigo, arquivo, tamanho, mtime = tarefa
+    entrada = {"colecao": colecao, "caminho": caminho, "codigo": codigo, "bytes": tamanho, "mtime": mtime,
+               "hash": None, "formato": None, "largura": None, "altura": None, "valida": 0, "erro": None}
+    try:
+        conteudo = Path(arquivo).read_bytes()
+        # Mesmo hash usado pelo proxy de imagens e pelas derivadas
+        entrada["hash"] = hashlib.sha256(conteudo).hexdigest()[:32]
+        imagem = Image.open(io.BytesIO(conteudo))
+        entrada["formato"] = imagem.format.lower()
+        entrada["largura"], entrada["altura"] = imagem.size
+        # Decodificar reduzido continua lendo o arquivo inteiro, e é bem mais rápido
+        imagem.draft("RGB", (max(1, imagem.width // 8), max(1, imagem.height // 8)))
+        imagem.load()
+        entrada["valida"] = 1
+    except UnidentifiedImageError:
+        entrada["erro"] = "formato não reconhecido"
+    except Exception as e:
+        entrada["erro"] = str(e) or type(e).__name__
+    return entrada
+
+def conectar(caminho=CATALOGO):
+    """Abre (criando se preciso) o catálogo para escrita."""
+    Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+    conexao = sqlite3.connect(caminho)
+    # WAL: o servidor continua lendo enquanto o catálogo é atualizado
+    conexao.execute("PRAGMA journal_mode=WAL")
+    conexao.executescript(ESQUEMA)
+    return conexao
+
+def listar_fontes(armazem):
+    """Retorna {(colecao, caminho): (codigo, arquivo)} das imagens de todas as coleções."""
+    from armazem_imagens import separar_caminho
+
+    fontes = {}
+    for colecao in COLECOES:
+        for caminho, arquivo in armazem.fontes(colecao).items():
+            if caminho.lower().endswith(EXTENSOES):
+                codigo, _ = separar_caminho(colecao, caminho)
+                fontes[(colecao, caminho)] = (codigo, arquivo)
+    return fontes
+
+def atualizar_catalogo(conexao, armazem, workers=None):
+    """Examina as imagens novas ou alteradas (tamanho ou mtime) e remove as que sumiram.
+
+    Retorna (total, examinadas, removidas).
+    """
+    # Importado aqui: o servidor usa só CatalogoImagens e não depende do tqdm
+    from tqdm import tqdm
+
+    catalogadas = {(colecao, caminho): (tamanho, mtime) for colecao, caminho, tamanho, mtime
+                   in conexao.execute("SELECT colecao, caminho, bytes, mtime FROM imagens")}
+    fontes = listar_fontes(armazem)
+
+    tarefas = []
+    for (colecao, caminho), (codigo, arquivo) in fontes.items():
+        info = arquivo.stat()
+        if catalogadas.get((colecao, caminho)) != (info.st_size, info.st_mtime_ns):
+            tarefas.append((colecao, caminho, codigo, str(arquivo), info.st_size, info.st_mtime_ns))
+
+    removidas = [chave for chave in catalogadas if chave not in fontes]
+    with conexao:
+        conexao.executemany("DELETE FROM imagens WHERE colecao = ? AND caminho = ?", removidas)
+
+    if tarefas:
+        inserir = f"INSERT OR REPLACE INTO imagens ({', '.join(COLUNAS)}) VALUES ({', '.join('?' for _ in COLUNAS)})"
+        lote = []
+        with Pool(processes=workers) as pool:
+            for entrada in tqdm(pool.imap_unordered(examinar_imagem, tarefas, chunksize=32), total=len(tarefas), desc="Imagens"):
+                lote.append([entrada[coluna] for coluna in COLUNAS])
+                # Gravar em lotes: uma interrupção não perde o que já foi examinado
+                if len(lote) >= 1000:
+                    with conexao:
+                        conexao.executemany(inserir, lote)
+                    lote = []
+        with conexao:
+            conexao.executemany(inserir, lote)
+
+    return len(fontes), len(tarefas), len(removidas)
+
+def resumo(conexao):
+    """{"imagens", "invalidas", "bytes", "por_colecao": {colecao: imagens}}"""
+    imagens, invalidas, total_bytes = conexao.execute(
+        "SELECT COUNT(*), COALESCE(SUM(valida = 0), 0), COALESCE(SUM(bytes), 0) FROM imagens").fetchone()
+    por_colecao = dict(conexao.execute("SELECT colecao, COUNT(*) FROM imagens GROUP BY colecao"))
+    return {"imagens": imagens, "invalidas": invalidas, "bytes": total_bytes, "por_colecao": por_colecao}
+
+class CatalogoImagens:
+    """Consulta somente leitura do catálogo, compartilhada entre as threads do servidor.
+
+    Se o catálogo ainda não existe, as consultas retornam vazio e a abertura é tentada de
+    novo depois de um minuto.
+    """
+
+    NOVA_TENTATIVA = 60
+
+    def __init__(self, caminho=CATALOGO):
+        self.caminho = Path(caminho)
+        self.trava = threading.Lock()
+        self.conexao = None
+        self.proxima_tentativa = 0
+
+    def _conexao(self):
+        if self.conexao is None and time.monotonic() >= self.proxima_tentativa:
+            self.proxima_tentativa = time.monotonic() + self.NOVA_TENTATIVA
+            if self.caminho.exists():
+                self.conexao = sqlite3.connect(f"file:{self.caminho}?mode=ro", uri=True, check_same_thread=False)
+                self.conexao.row_factory = sqlite3.Row
+        return self.conexao
+
+    def _consultar(self, sql, parametros):
+        with self.trava:
+            conexao = self._conexao()
+            if conexao is None:
+                return []
+            try:
+                return [dict(linha) for linha in conexao.execute(sql, parametros)]
+            except sqlite3.Error as e:
+                print(f"Erro ao consultar o catálogo de imagens {self.caminho}: {e}")
+                return []
+
+    def obter(self, colecao, caminho):
+        """Entrada da imagem (caminho relativo ao diretório da coleção), ou None se não catalogada."""
+        linhas = self._consultar("SELECT * FROM imagens WHERE colecao = ? AND caminho = ?", (colecao, caminho))
+        return linhas[0] if linhas else None
+
+    def por_hash(self, hash_conteudo):
+        linhas = self._consultar("SELECT * FROM imagens WHERE hash = ? LIMIT 1", (hash_conteudo,))
+        return linhas[0] if linhas else None
+
+    def do_imovel(self, codigo):
+        """Entradas das imagens do imóvel em todas as coleções."""
+        return self._consultar("SELECT * FROM imagens WHERE codigo = ? ORDER BY colecao, caminho", (codigo,))
+
+def main():
+    """Função principal."""
+    parser = argparse.ArgumentParser(description='Cataloga dimensões, formato, hash e integridade das imagens em SQLite')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processos usados (padrão: todos os núcleos)')
+    parser.add_argument('--invalidas', action='store_true', help='Listar as imagens que não puderam ser decodificadas')
+    args = parser.parse_args()
+
+    # Importado aqui para o módulo poder ser usado pelo servidor (rag/imagens.py)
+    from armazem_imagens import ArmazemImagens
+
+    tempo_inicio = time.time()
+    conexao = conectar()
+    total, examinadas, removidas = atualizar_catalogo(conexao, ArmazemImagens(), args.workers)
+    dados = resumo(conexao)
+
+    print(f"\n{total} imagens encontradas: {examinadas} examinadas, {total - examinadas} sem alteração, {removidas} removidas do catálogo")
+    print(f"Catálogo: {dados['imagens']} imagens ({dados['bytes'] / 1024 / 1024:.1f} MB), "
+          f"{dados['invalidas']} inválidas ou truncadas")
+    for colecao, quantidade in sorted(dados["por_colecao"].items()):
+        print(f"- {colecao}: {quantidade}")
+    if args.invalidas:
+        for colecao, caminho, erro in conexao.execute("SELECT colecao, caminho, erro FROM imagens WHERE valida = 0 ORDER BY colecao, caminho"):
+            print(f"  {colecao}/{caminho}: {erro}")
+    conexao.close()
+    print(f"Catálogo salvo em {CATALOGO} em {time.time() - tempo_inicio:.1f} segundos")
+
+if __name__ == "__main__":
+    main()
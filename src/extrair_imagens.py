@@ -2,10 +2,11 @@ import os
 import json
 import time
 import re
-import requests
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 from urllib.parse import urljoin
+from baixador import Baixador
+from variantes_imagens import url_grande, variantes
 
 # Configurações
 BASE_URL = "https://www.novatorres.com.br"
@@ -28,6 +29,9 @@ HEADERS = {
     'Cache-Control': 'max-age=0',
 }
 
+# Downloads em paralelo (com limite por host) enquanto as páginas dos próximos imóveis são lidas
+BAIXADOR = Baixador(HEADERS)
+
 def obter_pagina(url):
     """Obtém o conteúdo de uma página e retorna o objeto BeautifulSoup."""
     try:
@@ -36,7 +40,7 @@ def obter_pagina(url):
         # Fazer a requisição com retry
         for tentativa in range(3):
             try:
-                response = requests.get(url, headers=HEADERS, timeout=20)
+                response = BAIXADOR.sessao.get(url, headers=HEADERS, timeout=20)
                 response.raise_for_status()  # Levanta exceção para códigos de erro HTTP
                 break
             except Exception as e:
@@ -68,9 +72,8 @@ def extrair_imagens_royal_slider(soup):
             if img_url.startswith('//'):
                 img_url = 'https:' + img_url
             
-            # Substituir '/it/' por '/il/' para obter imagens em tamanho maior
-            # it = thumbnail, im = média, il = grande
-            img_url_grande = img_url.replace('/it/', '/il/')
+            # Baixar a variante grande: it = thumbnail, im = média, il = grande
+            img_url_grande = url_grande(img_url)
             
             if img_url_grande not in imagens:
                 imagens.append(img_url_grande)
@@ -91,8 +94,8 @@ def extrair_imagens_royal_slider(soup):
                 
                 if img_url_grande not in imagens:
                     imagens.append(img_url_grande)
-            elif img_url not in imagens:
-                imagens.append(img_url)
+            elif url_grande(img_url) not in imagens:
+                imagens.append(url_grande(img_url))
     
     # Método 3: Buscar em spans com background-image
     bg_spans = soup.select("span.bg")
@@ -104,8 +107,8 @@ def extrair_imagens_royal_slider(soup):
             if img_url.startswith('//'):
                 img_url = 'https:' + img_url
                 
-            # Substituir '/it/' por '/il/' para obter imagens em tamanho maior
-            img_url_grande = img_url.replace('/it/', '/il/')
+            # Baixar a variante grande
+            img_url_grande = url_grande(img_url)
             
             if img_url_grande not in imagens:
                 imagens.append(img_url_grande)
@@ -155,53 +158,47 @@ def extrair_imagens_imovel(link):
         print(f"Erro ao extrair imagens do imóvel {link}: {e}")
         return []
 
-def baixar_imagens(codigo, imagens):
-    """Baixa as imagens do imóvel e retorna os caminhos locais."""
+def agendar_imagens(codigo, imagens):
+    """Agenda o download das imagens do imóvel e retorna [(número, futuro)]."""
     diretorio_imovel = os.path.join(IMAGES_DIR, codigo)
-    os.makedirs(diretorio_imovel, exist_ok=True)
+    print(f"Baixando {len(imagens)} imagens para o imóvel {codigo}...")
     
+    # A extensão do arquivo vem do Content-Type da resposta
+    return [(i + 1, BAIXADOR.agendar(img_url, os.path.join(diretorio_imovel, str(i + 1)), extensao_pelo_tipo=True))
+            for i, img_url in enumerate(imagens) if img_url.startswith('http')]
+
+def aguardar_imagens(agendadas):
+    """Espera os downloads agendados e retorna os caminhos locais."""
     caminhos_locais = []
     
-    print(f"Baixando {len(imagens)} imagens para o imóvel {codigo}...")
-    
-    for i, img_url in enumerate(imagens):
+    for numero, futuro in agendadas:
         try:
-            if not img_url.startswith('http'):
-                continue
-            
-            response = requests.get(img_url, headers=HEADERS, stream=True, timeout=15)
-            
-            if response.status_code == 200:
-                # Determinar extensão
-                content_type = response.headers.get('Content-Type', '')
-                ext = '.jpg'  # Padrão
-                
-                if 'image/png' in content_type:
-                    ext = '.png'
-                elif 'image/gif' in content_type:
-                    ext = '.gif'
-                elif 'image/webp' in content_type:
-                    ext = '.webp'
-                
-                # Salvar a imagem
-                nome_arquivo = f"{i+1}{ext}"
-                caminho_arquivo = os.path.join(diretorio_imovel, nome_arquivo)
-                
-                with open(caminho_arquivo, 'wb') as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-                
-                caminho_relativo = os.path.relpath(caminho_arquivo, OUTPUT_DIR)
-                caminhos_locais.append(caminho_relativo)
-                print(f"  ✓ Imagem {i+1} salva em {caminho_relativo}")
-            else:
-                print(f"  ✗ Erro ao baixar imagem {i+1}: Status code {response.status_code}")
-        
+            resultado = futuro.result()
+            caminho_relativo = os.path.relpath(resultado["arquivo"], OUTPUT_DIR)
+            caminhos_locais.append(caminho_relativo)
+            print(f"  ✓ Imagem {numero} salva em {caminho_relativo}")
         except Exception as e:
-            print(f"  ✗ Erro ao baixar imagem {i+1}: {e}")
+            print(f"  ✗ Erro ao baixar imagem {numero}: {e}")
     
     return caminhos_locais
 
+def baixar_imagens(codigo, imagens):
+    """Baixa as imagens do imóvel e retorna os caminhos locais."""
+    return aguardar_imagens(agendar_imagens(codigo, imagens))
+
+def concluir_imovel(imoveis, indice, imovel, agendadas):
+    """Espera as imagens do imóvel, atualiza os caminhos locais e salva o progresso."""
+    print(f"\n[Imagens do imóvel {indice+1}/{len(imoveis)}] {imovel['codigo']}")
+    caminhos_locais = aguardar_imagens(agendadas)
+    imovel['imagens_locais'] = caminhos_locais
+    
+    with open(UPDATED_DATA_FILE, 'w', encoding='utf-8') as f:
+        # Manter apenas os imóveis processados no arquivo de teste
+        json.dump(imoveis[:indice+1], f, ensure_ascii=False, indent=4)
+    print(f"Progresso salvo em {UPDATED_DATA_FILE}")
+    
+    return len(caminhos_locais)
+
 def main():
     """Função principal para extrair apenas as imagens."""
     print("\n" + "="*60)
@@ -219,6 +216,7 @@ def main():
     
     tempo_inicio = time.time()
     total_imagens = 0
+    pendente = None  # (índice, imóvel, downloads agendados)
     
     # Limitar a apenas 10 imóveis para teste
     imoveis_teste = imoveis
@@ -235,26 +233,23 @@ def main():
         imagens = extrair_imagens_imovel(link)
         print(f"Encontradas {len(imagens)} imagens")
         
-        # Baixar imagens
-        caminhos_locais = baixar_imagens(imovel['codigo'], imagens)
-        
-        # Atualizar o objeto do imóvel
+        # Agendar os downloads; as imagens do imóvel anterior terminam enquanto esta página era lida
         imovel['imagens'] = imagens
-        imovel['imagens_locais'] = caminhos_locais
-        total_imagens += len(caminhos_locais)
-        
-        # Salvar progresso a cada imóvel para teste
-        with open(UPDATED_DATA_FILE, 'w', encoding='utf-8') as f:
-            # Manter apenas os imóveis processados no arquivo de teste
-            imoveis_processados = imoveis_teste[:i+1]
-            json.dump(imoveis_processados, f, ensure_ascii=False, indent=4)
-        print(f"Progresso salvo em {UPDATED_DATA_FILE}")
+        imovel['variantes_imagens'] = [variantes(img) for img in imagens]
+        agendadas = agendar_imagens(imovel['codigo'], imagens)
+        if pendente:
+            total_imagens += concluir_imovel(imoveis_teste, *pendente)
+        pendente = (i, imovel, agendadas)
         
         # Esperar para não sobrecarregar o servidor
         if i < len(imoveis_teste) - 1:
             print("Aguardando 3 segundos antes do próximo imóvel...")
             time.sleep(3)
     
+    if pendente:
+        total_imagens += concluir_imovel(imoveis_teste, *pendente)
+    BAIXADOR.encerrar()
+    
     # Tempo total
     tempo_total = time.time() - tempo_inicio
     minutos = int(tempo_total // 60)
@@ -264,6 +259,7 @@ def main():
     print(f"EXTRAÇÃO DE IMAGENS CONCLUÍDA EM {minutos} minutos e {segundos} segundos!")
     print(f"Total de imóveis processados: {len(imoveis_teste)}")
     print(f"Total de imagens extraídas: {total_imagens}")
+    print(BAIXADOR.resumo())
     print("="*60)
 
 if __name__ == "__main__":
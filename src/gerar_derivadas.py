@@ -0,0 +1,199 @@
+import io
+import os
+import json
+import hashlib
+import argparse
+import time
+from multiprocessing import Pool
+from pathlib import Path
+from tqdm import tqdm
+from armazem_imagens import ArmazemImagens
+
+# Configurações
+DATA_DIR = Path("data")
+IMAGES_DIR = DATA_DIR / "images"
+DERIVADAS_DIR = DATA_DIR / "derivadas"
+MANIFESTO = DERIVADAS_DIR / "manifesto.json"
+EXTENSOES = (".jpg", ".jpeg", ".png", ".webp")
+QUALIDADE = 80
+
+# Larguras de cada uso da imagem; são larguras do proxy /imagem (rag/imagens.py),
+# que serve estes arquivos em vez de gerá-los na hora
+PERFIS = {
+    "card": 320,
+    "galeria": 1024,
+    "zoom": 1600,
+}
+
+def hash_arquivo(conteudo):
+    """Hash do conteúdo da imagem (o mesmo usado pelo proxy de imagens)."""
+    return hashlib.sha256(conteudo).hexdigest()[:32]
+
+def caminho_derivada(relativo, perfil):
+    """Arquivo da derivada: data/derivadas/<codigo>/<nome>-<perfil>.webp"""
+    origem = Path(relativo)
+    return DERIVADAS_DIR / origem.parent / f"{origem.stem}-{perfil}.webp"
+
+def derivadas_existem(entrada):
+    return all((DERIVADAS_DIR / derivada["arquivo"]).exists() for derivada in entrada.get("derivadas", {}).values()) \
+        and set(entrada.get("derivadas", {})) == set(PERFIS)
+
+def gerar_derivadas(tarefa):
+    """Gera as derivadas de uma imagem (executado nos processos do pool).
+
+    Retorna (caminho relativo, entrada do manifesto ou None, situação).
+    """
+    from PIL import Image, ImageOps
+
+    relativo, caminho, tamanho, mtime, anterior = tarefa
+    try:
+        conteudo = Path(caminho).read_bytes()
+        hash_origem = hash_arquivo(conteudo)
+
+        # Conteúdo igual ao já processado (ex.: arquivo baixado de novo): só atualizar a data
+        if anterior and anterior.get("hash") == hash_origem and derivadas_existem(anterior):
+            return relativo, {**anterior, "tamanho": tamanho, "mtime": mtime}, "inalterada"
+
+        imagem = Image.open(io.BytesIO(conteudo))
+        # Decodificar o JPEG já reduzido quando a maior derivada é bem menor que o original
+        imagem.draft("RGB", (max(PERFIS.values()), max(PERFIS.values())))
+        imagem = ImageOps.exif_transpose(imagem)
+        if imagem.mode not in ("RGB", "RGBA"):
+            imagem = imagem.convert("RGBA" if "A" in imagem.getbands() else "RGB")
+
+        derivadas = {}
+        anterior_gerada = None
+        for perfil, largura in sorted(PERFIS.items(), key=lambda item: -item[1]):
+            # Imagem menor que o perfil: não é ampliada, e os perfis iguais dividem o arquivo
+            if imagem.width <= largura and anterior_gerada is not None:
+                derivadas[perfil] = {**anterior_gerada, "largura": largura}
+                continue
+            if imagem.width > largura:
+                altura = max(1, round(imagem.height * largura / imagem.width))
+                versao = imagem.resize((largura, altura), Image.LANCZOS)
+            else:
+                versao = imagem
+
+            destino = caminho_derivada(relativo, perfil)
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            temporario = destino.with_name(destino.name + ".tmp")
+            versao.save(temporario, "WEBP", quality=QUALIDADE, method=4)
+            os.replace(temporario, destino)
+            derivadas[perfil] = {
+                "arquivo": str(destino.relative_to(DERIVADAS_DIR)),
+                "largura": largura,
+                "dimensoes": [versao.width, versao.height],
+                "bytes": destino.stat().st_size
+            }
+            anterior_gerada = derivadas[perfil]
+
+        entrada = {
+            "hash": hash_origem,
+            "tamanho": tamanho,
+            "mtime": mtime,
+            "dimensoes": [imagem.width, imagem.height],
+            "derivadas": derivadas
+        }
+        return relativo, entrada, "gerada"
+    except Exception as e:
+        # Registrado no manifesto para não tentar de novo enquanto o arquivo não mudar
+        return relativo, {"tamanho": tamanho, "mtime": mtime, "erro": str(e), "derivadas": {}}, "erro"
+
+def carregar_manifesto():
+    if not MANIFESTO.exists():
+        return {}
+    try:
+        with open(MANIFESTO, 'r', encoding='utf-8') as f:
+            manifesto = json.load(f)
+    except json.JSONDecodeError:
+        print(f"Manifesto {MANIFESTO} inválido, gerando novamente")
+        return {}
+    # Perfis diferentes dos atuais invalidam as derivadas
+    if manifesto.get("perfis") != PERFIS:
+        return {}
+    return manifesto.get("imagens", {})
+
+def salvar_manifesto(imagens):
+    """Grava o manifesto lido pelo servidor (substituição atômica)."""
+    DERIVADAS_DIR.mkdir(parents=True, exist_ok=True)
+    temporario = MANIFESTO.with_suffix(".tmp")
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump({"perfis": PERFIS, "gerado_em": time.time(), "imagens": imagens}, f, ensure_ascii=False)
+    os.replace(temporario, MANIFESTO)
+
+def listar_imagens(armazem):
+    """Retorna {"<codigo>/<nome>": (arquivo, tamanho, mtime)} das imagens de data/images (no armazém ou não)."""
+    imagens = {}
+    for relativo, arquivo in armazem.fontes("images", IMAGES_DIR).items():
+        if relativo.lower().endswith(EXTENSOES):
+            info = arquivo.stat()
+            imagens[relativo] = (arquivo, info.st_size, info.st_mtime_ns)
+    return imagens
+
+def remover_derivadas(entrada):
+    for derivada in entrada.get("derivadas", {}).values():
+        try:
+            (DERIVADAS_DIR / derivada["arquivo"]).unlink()
+        except FileNotFoundError:
+            pass
+
+def main():
+    """Função principal."""
+    parser = argparse.ArgumentParser(description='Gera as derivadas WebP (card, galeria, zoom) das imagens dos imóveis')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processos usados (padrão: todos os núcleos)')
+    parser.add_argument('--forcar', action='store_true', help='Gerar novamente todas as derivadas')
+    args = parser.parse_args()
+
+    armazem = ArmazemImagens()
+    if not IMAGES_DIR.exists() and not armazem.codigos():
+        print(f"Diretório {IMAGES_DIR} e armazém {armazem.raiz} não encontrados!")
+        return
+
+    tempo_inicio = time.time()
+    manifesto = {} if args.forcar else carregar_manifesto()
+    imagens = listar_imagens(armazem)
+    print(f"Encontradas {len(imagens)} imagens de {IMAGES_DIR}")
+
+    # Imagens removidas de data/images: descartar as derivadas
+    for relativo in set(manifesto) - set(imagens):
+        remover_derivadas(manifesto.pop(relativo))
+
+    # Tamanho e data iguais aos do manifesto: nem abrir o arquivo
+    tarefas = []
+    for relativo, (arquivo, tamanho, mtime) in imagens.items():
+        anterior = manifesto.get(relativo)
+        if anterior and anterior["tamanho"] == tamanho and anterior["mtime"] == mtime \
+                and ("erro" in anterior or derivadas_existem(anterior)):
+            continue
+        tarefas.append((relativo, str(arquivo), tamanho, mtime, anterior))
+
+    print(f"{len(imagens) - len(tarefas)} imagens sem alteração, {len(tarefas)} para processar com {args.workers} processos")
+
+    contagem = {"gerada": 0, "inalterada": 0, "erro": 0}
+    if tarefas:
+        with Pool(processes=args.workers) as pool:
+            resultados = pool.imap_unordered(gerar_derivadas, tarefas, chunksize=8)
+            for relativo, entrada, situacao in tqdm(resultados, total=len(tarefas), desc="Derivadas"):
+                if situacao == "erro":
+                    print(f"Erro ao processar {relativo}: {entrada['erro']}")
+                # Arquivos da versão anterior que a nova não usa mais
+                anterior = manifesto.get(relativo)
+                if anterior:
+                    atuais = {derivada["arquivo"] for derivada in entrada["derivadas"].values()}
+                    remover_derivadas({"derivadas": {perfil: derivada for perfil, derivada in anterior.get("derivadas", {}).items()
+                                                     if derivada["arquivo"] not in atuais}})
+                manifesto[relativo] = entrada
+                contagem[situacao] += 1
+
+    salvar_manifesto(manifesto)
+
+    bytes_origem = sum(tamanho for _, tamanho, _ in imagens.values())
+    arquivos_derivadas = {derivada["arquivo"]: derivada["bytes"] for entrada in manifesto.values()
+                          for derivada in entrada["derivadas"].values()}
+    bytes_derivadas = sum(arquivos_derivadas.values())
+    print(f"\nDerivadas geradas: {contagem['gerada']}, conteúdo inalterado: {contagem['inalterada']}, erros: {contagem['erro']}")
+    print(f"Imagens originais: {bytes_origem / 1024 / 1024:.1f} MB, derivadas: {bytes_derivadas / 1024 / 1024:.1f} MB")
+    print(f"Manifesto salvo em {MANIFESTO} ({len(manifesto)} imagens, {len(arquivos_derivadas)} arquivos) em {time.time() - tempo_inicio:.1f} segundos")
+
+if __name__ == "__main__":
+    main()
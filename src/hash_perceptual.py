@@ -0,0 +1,230 @@
+import io
+import os
+import json
+import argparse
+import time
+from multiprocessing import Pool
+from pathlib import Path
+
+# Configurações
+DATA_DIR = Path("data")
+IMAGES_DIR = DATA_DIR / "images"
+ARQUIVO_HASHES = DATA_DIR / "hashes_perceptuais.json"
+EXTENSOES = (".jpg", ".jpeg", ".png", ".webp")
+
+# Distâncias de Hamming (em 64 bits) para considerar duas imagens a mesma foto.
+# Redimensionar ou recomprimir muda poucos bits; fotos diferentes ficam perto de 32
+LIMITE_PHASH = 8
+LIMITE_DHASH = 10
+
+def distancia(a, b):
+    """Distância de Hamming entre dois hashes de 64 bits."""
+    # bin().count() e não int.bit_count(), que só existe a partir do Python 3.10
+    return bin(a ^ b).count("1")
+
+def calcular_dhash(imagem):
+    """dHash: compara cada pixel com o vizinho da direita em uma miniatura 9x8 em tons de cinza."""
+    from PIL import Image
+
+    pixels = list(imagem.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    valor = 0
+    for linha in range(8):
+        for coluna in range(8):
+            valor = (valor << 1) | (pixels[linha * 9 + coluna] < pixels[linha * 9 + coluna + 1])
+    return valor
+
+def calcular_phash(imagem):
+    """pHash: sinais das frequências baixas da DCT de uma miniatura 32x32 em relação à mediana."""
+    import numpy as np
+    from PIL import Image
+
+    pixels = np.asarray(imagem.convert("L").resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    n = np.arange(32)
+    dct = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / 64)
+    frequencias = (dct @ pixels @ dct.T)[:8, :8].flatten()
+    # O componente contínuo (brilho médio) fica fora da mediana
+    mediana = np.median(frequencias[1:])
+    valor = 0
+    for bit in frequencias > mediana:
+        valor = (valor << 1) | int(bit)
+    return valor
+
+def calcular_hashes(tarefa):
+    """Calcula o dHash e o pHash de uma imagem (executado nos processos do pool)."""
+    import hashlib
+    from PIL import Image, ImageOps
+
+    chave, caminho, tamanho, mtime = tarefa
+    try:
+        conteudo = Path(caminho).read_bytes()
+        imagem = Image.open(io.BytesIO(conteudo))
+        # Decodificar o JPEG já reduzido: os hashes usam no máximo 32x32 pixels
+        imagem.draft("RGB", (64, 64))
+        imagem = ImageOps.exif_transpose(imagem)
+        return chave, {
+            "tamanho": tamanho,
+            "mtime": mtime,
+            "hash": hashlib.sha256(conteudo).hexdigest()[:32],
+            "dhash": f"{calcular_dhash(imagem):016x}",
+            "phash": f"{calcular_phash(imagem):016x}"
+        }
+    except Exception as e:
+        return chave, {"tamanho": tamanho, "mtime": mtime, "erro": str(e)}
+
+class IndiceMultiplo:
+    """Índice de hashes de 64 bits por blocos (multi-index hashing) para buscas por distância de Hamming.
+
+    O hash é dividido em BLOCOS partes de 16 bits, cada uma com a sua tabela. Se dois hashes
+    estão a até r bits, algum bloco difere em no máximo r // BLOCOS bits; a busca consulta
+    só as variações de cada bloco até esse raio, e o custo não cresce com o número de imagens.
+    """
+
+    BLOCOS = 4
+    BITS_BLOCO = 16
+
+    def __init__(self):
+        self.tabelas = [{} for _ in range(self.BLOCOS)]
+        self.itens = {}  # hash: [itens]
+        self._mascaras = {}
+
+    def _blocos(self, valor):
+        mascara = (1 << self.BITS_BLOCO) - 1
+        return [(valor >> (self.BITS_BLOCO * i)) & mascara for i in range(self.BLOCOS)]
+
+    def _variacoes(self, raio):
+        """Máscaras de 16 bits com até `raio` bits ligados."""
+        if raio not in self._mascaras:
+            self._mascaras[raio] = [mascara for mascara in range(1 << self.BITS_BLOCO) if bin(mascara).count("1") <= raio]
+        return self._mascaras[raio]
+
+    def __len__(self):
+        return len(self.itens)
+
+    def inserir(self, valor, item):
+        if valor not in self.itens:
+            self.itens[valor] = []
+            for tabela, bloco in zip(self.tabelas, self._blocos(valor)):
+                tabela.setdefault(bloco, []).append(valor)
+        self.itens[valor].append(item)
+
+    def buscar(self, valor, raio):
+        """Retorna [(distancia, hash, item)] dos hashes a até `raio` bits de `valor`."""
+        candidatos = set()
+        variacoes = self._variacoes(raio // self.BLOCOS)
+        for tabela, bloco in zip(self.tabelas, self._blocos(valor)):
+            for mascara in variacoes:
+                candidatos.update(tabela.get(bloco ^ mascara, ()))
+
+        encontrados = []
+        for candidato in candidatos:
+            d = distancia(valor, candidato)
+            if d <= raio:
+                encontrados.extend((d, candidato, item) for item in self.itens[candidato])
+        return encontrados
+
+def agrupar_duplicatas(imagens, limite_phash=LIMITE_PHASH, limite_dhash=LIMITE_DHASH):
+    """Agrupa as imagens quase idênticas (pHash e dHash próximos) com o índice por blocos e união de conjuntos."""
+    indice = IndiceMultiplo()
+    hashes = {}
+    for chave, entrada in imagens.items():
+        if "erro" not in entrada:
+            hashes[chave] = (int(entrada["phash"], 16), int(entrada["dhash"], 16))
+            indice.inserir(hashes[chave][0], chave)
+
+    pais = {chave: chave for chave in hashes}
+
+    def raiz(chave):
+        while pais[chave] != chave:
+            pais[chave] = pais[pais[chave]]
+            chave = pais[chave]
+        return chave
+
+    # Uma busca por pHash distinto; imagens com o mesmo pHash saem todas no mesmo resultado
+    for phash, chaves in indice.itens.items():
+        for _, _, outra in indice.buscar(phash, limite_phash):
+            for chave in chaves:
+                if outra != chave and distancia(hashes[chave][1], hashes[outra][1]) <= limite_dhash:
+                    pais[raiz(outra)] = raiz(chave)
+
+    grupos = {}
+    for chave in hashes:
+        grupos.setdefault(raiz(chave), []).append(chave)
+    return sorted((sorted(grupo) for grupo in grupos.values() if len(grupo) > 1), key=lambda grupo: grupo[0])
+
+def carregar_hashes(arquivo=ARQUIVO_HASHES):
+    if not Path(arquivo).exists():
+        return {}
+    try:
+        with open(arquivo, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f"Arquivo {arquivo} inválido, calculando novamente")
+        return {}
+
+def duplicatas_do_imovel(dados, codigo):
+    """{nome: nome da imagem mantida} das imagens do imóvel que repetem uma anterior da mesma galeria."""
+    prefixo = f"{codigo}/"
+    duplicatas = {}
+    for grupo in dados.get("grupos", []):
+        nomes = [chave[len(prefixo):] for chave in grupo if chave.startswith(prefixo)]
+        for nome in nomes[1:]:
+            duplicatas[nome] = nomes[0]
+    return duplicatas
+
+def main():
+    """Função principal."""
+    parser = argparse.ArgumentParser(description='Calcula hashes perceptuais (dHash e pHash) das imagens e agrupa as quase idênticas')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processos usados (padrão: todos os núcleos)')
+    parser.add_argument('--limite-phash', type=int, default=LIMITE_PHASH, help=f'Distância máxima do pHash (padrão: {LIMITE_PHASH})')
+    parser.add_argument('--limite-dhash', type=int, default=LIMITE_DHASH, help=f'Distância máxima do dHash (padrão: {LIMITE_DHASH})')
+    args = parser.parse_args()
+
+    # Importados aqui para o módulo poder ser usado pelos scripts da raiz (from src.hash_perceptual import ...)
+    # sem depender do tqdm
+    from tqdm import tqdm
+    from armazem_imagens import ArmazemImagens
+
+    tempo_inicio = time.time()
+    armazem = ArmazemImagens()
+    anteriores = carregar_hashes().get("imagens", {})
+
+    # Mesmas fontes das derivadas: data/images, migrada ou não para o armazém
+    tarefas = []
+    imagens = {}
+    for chave, arquivo in armazem.fontes("images", IMAGES_DIR).items():
+        if not chave.lower().endswith(EXTENSOES):
+            continue
+        info = arquivo.stat()
+        anterior = anteriores.get(chave)
+        if anterior and anterior["tamanho"] == info.st_size and anterior["mtime"] == info.st_mtime_ns:
+            imagens[chave] = anterior
+        else:
+            tarefas.append((chave, str(arquivo), info.st_size, info.st_mtime_ns))
+    print(f"{len(imagens)} imagens sem alteração, {len(tarefas)} para calcular com {args.workers} processos")
+
+    if tarefas:
+        with Pool(processes=args.workers) as pool:
+            for chave, entrada in tqdm(pool.imap_unordered(calcular_hashes, tarefas, chunksize=32), total=len(tarefas), desc="Hashes"):
+                imagens[chave] = entrada
+
+    tempo_grupos = time.time()
+    grupos = agrupar_duplicatas(imagens, args.limite_phash, args.limite_dhash)
+    # Em cada grupo, a primeira imagem (ordem de código/nome) é mantida e as demais são duplicatas dela;
+    # para as galerias, duplicatas_do_imovel considera só as imagens do mesmo imóvel
+    duplicadas = {chave: grupo[0] for grupo in grupos for chave in grupo[1:]}
+    entre_imoveis = sum(1 for grupo in grupos if len({chave.split("/")[0] for chave in grupo}) > 1)
+
+    temporario = ARQUIVO_HASHES.with_suffix(".tmp")
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump({"limites": {"phash": args.limite_phash, "dhash": args.limite_dhash},
+                   "imagens": imagens, "grupos": grupos, "duplicadas": duplicadas}, f, ensure_ascii=False)
+    os.replace(temporario, ARQUIVO_HASHES)
+
+    erros = sum(1 for entrada in imagens.values() if "erro" in entrada)
+    print(f"\nImagens: {len(imagens)} ({erros} não são imagens válidas)")
+    print(f"Grupos de quase duplicatas: {len(grupos)} ({entre_imoveis} com imagens de mais de um imóvel), "
+          f"{len(duplicadas)} imagens repetidas, agrupadas em {time.time() - tempo_grupos:.1f} segundos")
+    print(f"Resultado salvo em {ARQUIVO_HASHES} em {time.time() - tempo_inicio:.1f} segundos")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import os
+import json
+import argparse
+import time
+from concurrent.futures import as_completed
+from pathlib import Path
+from urllib.parse import urlsplit
+
+try:
+    from variantes_imagens import variantes
+except ImportError:  # importado pelos scripts da raiz como src.links_imagens
+    from src.variantes_imagens import variantes
+
+# Configurações
+DATA_DIR = Path("data")
+# Arquivos de imóveis com links de imagens (os mesmos lidos por rag/indice.py)
+ARQUIVOS_IMOVEIS = ["imoveis_com_links.json", "imoveis_com_imagens.json"]
+ARQUIVO_VERIFICACOES = DATA_DIR / "links_imagens_verificados.json"
+URL_SITE = "https://www.novatorres.com.br/"
+
+# Hosts de imagens genéricas que não são fotos do imóvel
+HOSTS_DESCARTADOS = ("placehold.co",)
+# Respostas que indicam que a imagem não existe mais
+STATUS_MORTOS = (404, 410)
+# Links verificados há menos tempo que isso não são conferidos de novo
+VALIDADE_VERIFICACAO = 7 * 24 * 3600
+
+def normalizar_link(link):
+    """Link absoluto da imagem, ou None se ele não aponta para uma imagem.
+
+    Descarta links vazios, terminados em "/" (inclusive a página inicial do site) e de
+    HOSTS_DESCARTADOS; caminhos relativos são resolvidos a partir do site.
+    """
+    if not link or not isinstance(link, str):
+        return None
+    link = link.strip()
+    if link.startswith("//"):
+        link = "https:" + link
+    elif not link.startswith(("http://", "https://")):
+        link = URL_SITE + link.lstrip("/")
+    if link.endswith("/") or urlsplit(link).hostname in HOSTS_DESCARTADOS:
+        return None
+    return link
+
+def limpar_links(links, mortos=()):
+    """Links normalizados, sem repetições, sem os inválidos e sem os `mortos`."""
+    limpos = []
+    for link in links or []:
+        link = normalizar_link(link)
+        if link and link not in mortos and link not in limpos:
+            limpos.append(link)
+    return limpos
+
+def limpar_imovel(imovel, mortos=()):
+    """Cópia do imóvel com links_imagens limpos, variantes_imagens correspondentes e
+    imagem_principal válida (a primeira imagem quando a original foi descartada)."""
+    limpo = dict(imovel)
+    links = limpar_links(imovel.get("links_imagens"), mortos)
+    limpo["links_imagens"] = links
+    limpo["variantes_imagens"] = [variantes(link) for link in links]
+
+    principal = imovel.get("imagem_principal")
+    if principal and principal.startswith(("http://", "https://", "//")):
+        # Só os links do site passam pela limpeza; caminhos locais (blobs/...) são mantidos
+        principal = normalizar_link(principal)
+        if principal in mortos:
+            principal = None
+    if principal:
+        limpo["imagem_principal"] = principal
+    elif links:
+        limpo["imagem_principal"] = links[0]
+    else:
+        limpo.pop("imagem_principal", None)
+    return limpo
+
+def carregar_verificacoes(arquivo=ARQUIVO_VERIFICACOES):
+    """{link: {"status", "tipo", "morto", "verificado_em"}}"""
+    if not Path(arquivo).exists():
+        return {}
+    try:
+        with open(arquivo, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f"Arquivo {arquivo} inválido, verificando todos os links de novo")
+        return {}
+
+def salvar_json(dados, arquivo, indent=None):
+    temporario = Path(arquivo).with_suffix(".tmp")
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False, indent=indent)
+    os.replace(temporario, arquivo)
+
+def esta_morto(resultado):
+    """404/410, ou uma página HTML no lugar da imagem (o site responde 200 com a página de erro)."""
+    return resultado["status"] in STATUS_MORTOS or (
+        resultado["status"] == 200 and resultado["tipo"].startswith("text/html"))
+
+def verificar_links(links, verificacoes, baixador):
+    """Confere com HEAD, em paralelo, os links sem verificação recente e atualiza `verificacoes`.
+
+    Erros de conexão e respostas 5xx não marcam o link como morto nem são guardados:
+    ele é conferido de novo na próxima execução. Retorna o número de links conferidos.
+    """
+    from tqdm import tqdm
+
+    agora = time.time()
+    pendentes = [link for link in links
+                 if agora - verificacoes.get(link, {}).get("verificado_em", 0) > VALIDADE_VERIFICACAO]
+    futuros = {baixador.agendar_verificacao(link): link for link in pendentes}
+    for futuro in tqdm(as_completed(futuros), total=len(futuros), desc="Verificando links"):
+        link = futuros[futuro]
+        try:
+            resultado = futuro.result()
+        except Exception as e:
+            print(f"  Erro ao verificar {link}: {e}")
+            continue
+        if resultado["status"] >= 500:
+            continue
+        verificacoes[link] = {**resultado, "morto": esta_morto(resultado), "verificado_em": agora}
+    return len(pendentes)
+
+def main():
+    """Função principal."""
+    parser = argparse.ArgumentParser(description='Limpa as listas de links de imagens dos imóveis e remove os links mortos')
+    parser.add_argument('--sem-verificacao', action='store_true', help='Só limpar as listas, sem conferir os links com HEAD')
+    parser.add_argument('--reverificar', action='store_true', help='Conferir de novo todos os links, mesmo os verificados recentemente')
+    parser.add_argument('--workers', type=int, default=32, help='Verificações simultâneas (padrão: 32)')
+    args = parser.parse_args()
+
+    tempo_inicio = time.time()
+    arquivos = [DATA_DIR / nome for nome in ARQUIVOS_IMOVEIS if (DATA_DIR / nome).exists()]
+    if not arquivos:
+        print(f"Nenhum arquivo de imóveis com links encontrado em {DATA_DIR}")
+        return
+
+    dados = {}
+    for arquivo in arquivos:
+        with open(arquivo, 'r', encoding='utf-8') as f:
+            dados[arquivo] = json.load(f)
+
+    links = {link for imoveis in dados.values() for imovel in imoveis
+             for link in limpar_links(imovel.get("links_imagens"))}
+    print(f"{sum(len(imoveis) for imoveis in dados.values())} imóveis em {len(arquivos)} arquivo(s), {len(links)} links distintos")
+
+    verificacoes = {} if args.reverificar else carregar_verificacoes()
+    if not args.sem_verificacao:
+        from baixador import Baixador
+
+        baixador = Baixador(workers=args.workers)
+        try:
+            conferidos = verificar_links(sorted(links), verificacoes, baixador)
+        finally:
+            baixador.encerrar()
+        salvar_json(verificacoes, ARQUIVO_VERIFICACOES)
+        print(f"{conferidos} links conferidos, {len(links) - conferidos} com verificação recente")
+    mortos = {link for link, verificacao in verificacoes.items() if verificacao["morto"]}
+    print(f"{len(links & mortos)} links mortos")
+
+    for arquivo, imoveis in dados.items():
+        antes = sum(len(imovel.get("links_imagens") or []) for imovel in imoveis)
+        limpos = [limpar_imovel(imovel, mortos) for imovel in imoveis]
+        depois = sum(len(imovel["links_imagens"]) for imovel in limpos)
+        sem_imagens = sum(1 for imovel in limpos if not imovel["links_imagens"])
+        if limpos != imoveis:
+            salvar_json(limpos, arquivo, indent=4)
+        print(f"{arquivo}: {antes} links -> {depois}, {sem_imagens} imóveis sem imagens")
+
+    print(f"Concluído em {time.time() - tempo_inicio:.1f} segundos")
+
+if __name__ == "__main__":
+    main()
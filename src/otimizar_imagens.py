@@ -0,0 +1,305 @@
+import io
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import subprocess
+import time
+from multiprocessing import Pool
+from pathlib import Path
+from tqdm import tqdm
+from armazem_imagens import ArmazemImagens, separar_caminho, COLECOES
+
+# Configurações
+DATA_DIR = Path("data")
+ORIGINAIS_DIR = DATA_DIR / "originais"
+ESTADO = DATA_DIR / "otimizacao.json"
+
+# Transcodificação sem perdas (libjpeg-turbo 2.1+ ou mozjpeg): os coeficientes DCT são
+# copiados, só a codificação de Huffman e a ordem de gravação mudam
+JPEGTRAN = os.getenv("JPEGTRAN", "jpegtran")
+# Qualidades testadas na busca pelo SSIM alvo (da maior para a menor)
+QUALIDADES = [95, 92, 90, 88, 85, 82, 80, 78, 75, 72, 70, 65, 60]
+# Transformações do jpegtran para cada orientação do EXIF
+TRANSFORMACOES = {
+    2: ["-flip", "horizontal"],
+    3: ["-rotate", "180"],
+    4: ["-flip", "vertical"],
+    5: ["-transpose"],
+    6: ["-rotate", "90"],
+    7: ["-transverse"],
+    8: ["-rotate", "270"],
+}
+# Economia mínima para substituir a imagem: trocar o arquivo invalida derivadas, hashes e caches
+GANHO_MINIMO = 0.02
+
+def hash_conteudo(conteudo):
+    return hashlib.sha256(conteudo).hexdigest()
+
+def ssim(a, b):
+    """SSIM médio da luminância em blocos 8x8 (aproximação do SSIM com janelas deslizantes)."""
+    import numpy as np
+
+    x = np.asarray(a.convert("L"), dtype=np.float64)
+    y = np.asarray(b.convert("L"), dtype=np.float64)
+    altura, largura = (x.shape[0] // 8) * 8, (x.shape[1] // 8) * 8
+    if not altura or not largura:
+        return 1.0 if np.array_equal(x, y) else 0.0
+    x = x[:altura, :largura].reshape(altura // 8, 8, largura // 8, 8).swapaxes(1, 2).reshape(-1, 64)
+    y = y[:altura, :largura].reshape(altura // 8, 8, largura // 8, 8).swapaxes(1, 2).reshape(-1, 64)
+
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    media_x, media_y = x.mean(axis=1), y.mean(axis=1)
+    var_x, var_y = x.var(axis=1), y.var(axis=1)
+    cov = ((x - media_x[:, None]) * (y - media_y[:, None])).mean(axis=1)
+    indices = ((2 * media_x * media_y + c1) * (2 * cov + c2)) / ((media_x ** 2 + media_y ** 2 + c1) * (var_x + var_y + c2))
+    return float(indices.mean())
+
+def transcodificar(jpegtran, conteudo, orientacao):
+    """JPEG progressivo com tabelas de Huffman otimizadas, sem EXIF, XMP nem comentários, sem
+    perdas (jpegtran). O perfil de cor (ICC) é mantido: sem ele as cores mudariam na tela.
+
+    A orientação do EXIF é aplicada com -perfect; retorna None se a imagem não pode ser girada
+    sem perdas (dimensões que não são múltiplas do bloco de 8 ou 16 pixels).
+    """
+    argumentos = [jpegtran, "-copy", "icc", "-optimize", "-progressive"]
+    if orientacao in TRANSFORMACOES:
+        argumentos += ["-perfect"] + TRANSFORMACOES[orientacao]
+    processo = subprocess.run(argumentos, input=conteudo, capture_output=True)
+    if processo.returncode != 0:
+        if orientacao in TRANSFORMACOES:
+            return None
+        raise RuntimeError(processo.stderr.decode("utf-8", "replace").strip() or f"jpegtran terminou com código {processo.returncode}")
+    return processo.stdout
+
+def codificar(imagem, qualidade, icc_profile):
+    """Recompressão com perdas (Pillow): JPEG progressivo com tabelas de Huffman otimizadas,
+    sem EXIF, XMP nem comentários, mantendo o perfil de cor (ICC).
+    """
+    saida = io.BytesIO()
+    opcoes = {"quality": qualidade, "optimize": True, "progressive": True, "comment": b""}
+    if icc_profile:
+        opcoes["icc_profile"] = icc_profile
+    imagem.save(saida, "JPEG", **opcoes)
+    return saida.getvalue()
+
+def otimizar_imagem(tarefa):
+    """Otimiza uma imagem (executado nos processos do pool).
+
+    Sem qualidade nem SSIM alvo, a imagem é transcodificada sem perdas pelo jpegtran; com
+    eles, é decodificada e recomprimida pelo Pillow. Retorna (arquivo, resultado); o conteúdo
+    otimizado só é retornado se for ao menos GANHO_MINIMO menor que o original (ou se a
+    imagem precisou ser girada).
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    arquivo, qualidade, ssim_alvo, jpegtran = tarefa
+    try:
+        conteudo = Path(arquivo).read_bytes()
+        resultado = {"hash_original": hash_conteudo(conteudo), "bytes_original": len(conteudo)}
+        try:
+            imagem = Image.open(io.BytesIO(conteudo))
+        except UnidentifiedImageError:
+            # Arquivos que não são imagens (ex.: páginas HTML salvas como .jpg)
+            return arquivo, {**resultado, "situacao": "ignorada"}
+        if imagem.format != "JPEG":
+            return arquivo, {**resultado, "situacao": "ignorada"}
+        # Sem o EXIF a orientação se perde: a imagem é girada antes de gravar
+        orientacao = imagem.getexif().get(0x0112, 1)
+
+        if not qualidade and not ssim_alvo:
+            novo = transcodificar(jpegtran, conteudo, orientacao)
+            if novo is None:
+                return arquivo, {**resultado, "situacao": "nao_girada"}
+            resultado["qualidade"] = "original"
+            return arquivo, finalizar(resultado, conteudo, novo, orientacao)
+
+        imagem.load()
+        icc_profile = imagem.info.get("icc_profile")
+        if orientacao != 1:
+            imagem = ImageOps.exif_transpose(imagem)
+
+        if ssim_alvo:
+            # Menor qualidade que ainda atinge o SSIM alvo (busca binária nas qualidades)
+            referencia = imagem.convert("RGB") if imagem.mode not in ("RGB", "L") else imagem
+            inicio, fim = 0, len(QUALIDADES) - 1
+            escolhida = None
+            while inicio <= fim:
+                meio = (inicio + fim) // 2
+                candidato = codificar(imagem, QUALIDADES[meio], icc_profile)
+                indice = ssim(referencia, Image.open(io.BytesIO(candidato)))
+                if indice >= ssim_alvo:
+                    escolhida = (candidato, QUALIDADES[meio], indice)
+                    inicio = meio + 1
+                else:
+                    fim = meio - 1
+            if escolhida is None:
+                novo, qualidade_usada, indice = codificar(imagem, QUALIDADES[0], icc_profile), QUALIDADES[0], None
+            else:
+                novo, qualidade_usada, indice = escolhida
+            resultado.update({"qualidade": qualidade_usada, "ssim": indice})
+        else:
+            novo = codificar(imagem, qualidade, icc_profile)
+            resultado["qualidade"] = qualidade
+        return arquivo, finalizar(resultado, conteudo, novo, orientacao)
+    except Exception as e:
+        return arquivo, {"situacao": "erro", "erro": str(e) or type(e).__name__}
+
+def finalizar(resultado, conteudo, novo, orientacao):
+    """Resultado "otimizada" com o conteúdo novo, ou "mantida" se o ganho for pequeno demais."""
+    if len(novo) > len(conteudo) * (1 - GANHO_MINIMO) and orientacao == 1:
+        return {**resultado, "situacao": "mantida"}
+    return {**resultado, "situacao": "otimizada", "conteudo": novo, "hash": hash_conteudo(novo), "bytes": len(novo)}
+
+def carregar_estado():
+    """{"parametros", "originais": {hash original: resultado}, "otimizadas": [hashes gerados],
+    "arquivos": {arquivo de diretório antigo já processado: [tamanho, mtime]}}"""
+    if not ESTADO.exists():
+        return {}
+    try:
+        with open(ESTADO, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f"Arquivo {ESTADO} inválido, começando de novo")
+        return {}
+
+def salvar_estado(estado):
+    temporario = ESTADO.with_suffix(".tmp")
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, ensure_ascii=False)
+    os.replace(temporario, ESTADO)
+
+def listar_arquivos(armazem):
+    """{arquivo: [(colecao, caminho)]}: cada conteúdo aparece uma vez, com todos os nomes que o usam."""
+    arquivos = {}
+    for colecao in COLECOES:
+        for caminho, arquivo in armazem.fontes(colecao).items():
+            if caminho.lower().endswith((".jpg", ".jpeg")):
+                arquivos.setdefault(arquivo, []).append((colecao, caminho))
+    return arquivos
+
+def guardar_original(arquivo, colecao, caminho):
+    """Move o original de um diretório antigo para data/originais/<colecao>/<caminho>."""
+    destino = ORIGINAIS_DIR / colecao / caminho
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(arquivo), str(destino))
+
+def aplicar(armazem, arquivo, nomes, conteudo):
+    """Substitui a imagem pela versão otimizada em todos os nomes que a usam.
+
+    No armazém, os manifestos passam a apontar para um blob novo e o blob original continua
+    lá (blobs nunca mudam e podem estar em URLs já publicadas). Nos diretórios antigos o
+    original é movido para data/originais e a versão otimizada é gravada no lugar.
+    """
+    if armazem.dir_blobs.resolve() in Path(arquivo).resolve().parents:
+        blob = armazem.guardar(conteudo)
+        for colecao, caminho in nomes:
+            codigo, nome = separar_caminho(colecao, caminho)
+            armazem.registrar(codigo, colecao, nome, blob)
+        return
+
+    colecao, caminho = nomes[0]
+    temporario = Path(arquivo).with_name(Path(arquivo).name + ".tmp")
+    temporario.write_bytes(conteudo)
+    guardar_original(arquivo, colecao, caminho)
+    os.replace(temporario, arquivo)
+
+def main():
+    """Função principal."""
+    parser = argparse.ArgumentParser(description='Otimiza as imagens JPEG: remove metadados e grava JPEG progressivo sem perdas (jpegtran) ou, opcionalmente, recomprime')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processos usados (padrão: todos os núcleos)')
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument('--qualidade', type=int, help='Recomprimir com esta qualidade JPEG (padrão: transcodificar sem perdas com o jpegtran)')
+    grupo.add_argument('--ssim', type=float, help='Recomprimir com a menor qualidade que mantém este SSIM (ex.: 0.98)')
+    parser.add_argument('--simular', action='store_true', help='Só calcular a economia, sem alterar os arquivos')
+    args = parser.parse_args()
+
+    # Sem qualidade nem SSIM alvo a otimização é sem perdas e depende do jpegtran
+    jpegtran = None
+    if args.qualidade is None and args.ssim is None:
+        jpegtran = shutil.which(JPEGTRAN)
+        if jpegtran is None:
+            print(f"{JPEGTRAN} não encontrado: instale o libjpeg-turbo-progs (ou o mozjpeg) ou defina JPEGTRAN; "
+                  "para recomprimir com perdas use --qualidade ou --ssim")
+            return
+
+    tempo_inicio = time.time()
+    armazem = ArmazemImagens()
+    estado = carregar_estado()
+    parametros = {"qualidade": args.qualidade, "ssim": args.ssim}
+    # Parâmetros diferentes: as imagens já otimizadas são processadas de novo
+    if estado.get("parametros") != parametros:
+        estado = {"parametros": parametros, "originais": {}, "otimizadas": [], "arquivos": {}}
+    otimizadas = set(estado["otimizadas"])
+
+    def assinatura(arquivo):
+        info = arquivo.stat()
+        return [info.st_size, info.st_mtime_ns]
+
+    arquivos = listar_arquivos(armazem)
+    tarefas = []
+    puladas = 0
+    for arquivo, nomes in arquivos.items():
+        # Blobs têm o hash no nome; arquivos já gerados por este script não são lidos de novo
+        if armazem.dir_blobs in arquivo.parents:
+            processado = arquivo.stem in otimizadas or arquivo.stem in estado["originais"]
+        else:
+            processado = estado["arquivos"].get(str(arquivo)) == assinatura(arquivo)
+        if processado:
+            puladas += 1
+            continue
+        tarefas.append((str(arquivo), args.qualidade, args.ssim, jpegtran))
+    print(f"{len(arquivos)} imagens JPEG, {puladas} já processadas, {len(tarefas)} para processar com {args.workers} processos")
+
+    contagem = {"otimizada": 0, "mantida": 0, "nao_girada": 0, "ignorada": 0, "erro": 0, "ja_otimizada": 0}
+    bytes_antes = bytes_depois = 0
+    if tarefas:
+        with Pool(processes=args.workers) as pool:
+            for arquivo, resultado in tqdm(pool.imap_unordered(otimizar_imagem, tarefas, chunksize=16), total=len(tarefas), desc="Otimizando"):
+                situacao = resultado["situacao"]
+                arquivo = Path(arquivo)
+                if situacao == "erro":
+                    contagem["erro"] += 1
+                    continue
+                # Conteúdo já gerado por uma execução anterior (ex.: arquivo de diretório antigo)
+                if resultado["hash_original"] in otimizadas:
+                    contagem["ja_otimizada"] += 1
+                    situacao = "ja_otimizada"
+                else:
+                    contagem[situacao] += 1
+                if situacao != "otimizada":
+                    if situacao != "ja_otimizada":
+                        estado["originais"][resultado["hash_original"]] = {"situacao": situacao}
+                    if not args.simular and armazem.dir_blobs not in arquivo.parents:
+                        estado["arquivos"][str(arquivo)] = assinatura(arquivo)
+                    continue
+
+                bytes_antes += resultado["bytes_original"]
+                bytes_depois += resultado["bytes"]
+                if not args.simular:
+                    aplicar(armazem, arquivo, arquivos[arquivo], resultado.pop("conteudo"))
+                    if armazem.dir_blobs not in arquivo.parents:
+                        estado["arquivos"][str(arquivo)] = assinatura(arquivo)
+                    estado["originais"][resultado["hash_original"]] = {
+                        "situacao": situacao, "hash": resultado["hash"], "bytes_original": resultado["bytes_original"],
+                        "bytes": resultado["bytes"], "qualidade": resultado["qualidade"], "ssim": resultado.get("ssim")}
+                    otimizadas.add(resultado["hash"])
+
+    if not args.simular:
+        estado["otimizadas"] = sorted(otimizadas)
+        salvar_estado(estado)
+
+    print(f"\nOtimizadas: {contagem['otimizada']}, mantidas (ganho menor que {GANHO_MINIMO:.0%}): {contagem['mantida']}, "
+          f"sem rotação sem perdas possível: {contagem['nao_girada']}, não JPEG: {contagem['ignorada']}, erros: {contagem['erro']}, já otimizadas antes: {contagem['ja_otimizada']}")
+    if bytes_antes:
+        print(f"Imagens otimizadas: {bytes_antes / 1024 / 1024:.1f} MB -> {bytes_depois / 1024 / 1024:.1f} MB "
+              f"({100 * (1 - bytes_depois / bytes_antes):.1f}% menor)")
+    if args.simular:
+        print("Simulação: nenhum arquivo foi alterado.")
+    else:
+        print(f"Originais dos diretórios antigos em {ORIGINAIS_DIR}; os do armazém continuam nos blobs originais")
+    print(f"Concluído em {time.time() - tempo_inicio:.1f} segundos")
+
+if __name__ == "__main__":
+    main()
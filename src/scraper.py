@@ -1,7 +1,6 @@
 import os
 import json
 import time
-import requests
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.firefox.service import Service
@@ -13,6 +12,7 @@ from selenium.webdriver.support import expected_conditions as EC
 from tqdm import tqdm
 import pandas as pd
 from urllib.parse import urljoin
+from baixador import Baixador, HEADERS
 
 # Configurações
 BASE_URL = "https://www.novatorres.com.br"
@@ -24,6 +24,10 @@ DATA_FILE = os.path.join(OUTPUT_DIR, "imoveis.json")
 # Garantir que os diretórios existam
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
+# Downloads das imagens com sessão compartilhada, em paralelo e retomáveis, com o
+# User-Agent de navegador (e não o padrão do requests)
+BAIXADOR = Baixador(HEADERS)
+
 def configurar_selenium():
     """Configura e retorna uma instância do Selenium WebDriver usando Firefox."""
     try:
@@ -157,20 +161,14 @@ def baixar_imagens(imovel):
     
     caminhos_locais = []
     
-    for i, img_url in enumerate(imovel["imagens"]):
+    # Downloads em paralelo
+    agendadas = [(img_url, BAIXADOR.agendar(img_url, os.path.join(diretorio_imovel, f"{i+1}.jpg")))
+                 for i, img_url in enumerate(imovel["imagens"])]
+    
+    for img_url, futuro in agendadas:
         try:
-            response = requests.get(img_url, stream=True)
-            if response.status_code == 200:
-                nome_arquivo = f"{i+1}.jpg"
-                caminho_arquivo = os.path.join(diretorio_imovel, nome_arquivo)
-                
-                with open(caminho_arquivo, 'wb') as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-                
-                caminhos_locais.append(os.path.relpath(caminho_arquivo, OUTPUT_DIR))
-            else:
-                print(f"Erro ao baixar imagem {img_url}: Status code {response.status_code}")
+            resultado = futuro.result()
+            caminhos_locais.append(os.path.relpath(resultado["arquivo"], OUTPUT_DIR))
         except Exception as e:
             print(f"Erro ao baixar imagem {img_url}: {e}")
     
@@ -240,6 +238,8 @@ def main():
     finally:
         if driver:
             driver.quit()
+        BAIXADOR.encerrar()
+        print(BAIXADOR.resumo())
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
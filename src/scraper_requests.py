@@ -2,11 +2,11 @@ import os
 import json
 import time
 import re
-import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 from urllib.parse import urljoin
 from tqdm import tqdm
+from baixador import Baixador
 
 # Configurações
 BASE_URL = "https://www.novatorres.com.br"
@@ -30,6 +30,9 @@ HEADERS = {
     'Cache-Control': 'max-age=0',
 }
 
+# Downloads das imagens com sessão compartilhada, em paralelo e retomáveis
+BAIXADOR = Baixador(HEADERS)
+
 def obter_pagina(url):
     """Obtém o conteúdo de uma página e retorna o objeto BeautifulSoup."""
     try:
@@ -38,7 +41,7 @@ def obter_pagina(url):
         # Fazer a requisição com retry
         for tentativa in range(3):
             try:
-                response = requests.get(url, headers=HEADERS, timeout=20)
+                response = BAIXADOR.sessao.get(url, headers=HEADERS, timeout=20)
                 response.raise_for_status()  # Levanta exceção para códigos de erro HTTP
                 break
             except Exception as e:
@@ -299,43 +302,18 @@ def baixar_imagens(imovel):
     
     print(f"Baixando {len(imovel['imagens'])} imagens para o imóvel {codigo}...")
     
-    for i, img_url in enumerate(imovel["imagens"]):
+    # Downloads em paralelo; a extensão do arquivo vem do Content-Type da resposta
+    agendadas = [(i + 1, BAIXADOR.agendar(img_url, os.path.join(diretorio_imovel, str(i + 1)), extensao_pelo_tipo=True))
+                 for i, img_url in enumerate(imovel["imagens"]) if img_url.startswith('http')]
+    
+    for numero, futuro in agendadas:
         try:
-            # Evitar URLs malformadas
-            if not img_url.startswith('http'):
-                continue
-                
-            # Fazer o download com timeout
-            response = requests.get(img_url, headers=HEADERS, stream=True, timeout=10)
-            
-            if response.status_code == 200:
-                # Determinar o tipo de arquivo da imagem
-                content_type = response.headers.get('Content-Type', '')
-                ext = '.jpg'  # Extensão padrão
-                
-                if 'image/png' in content_type:
-                    ext = '.png'
-                elif 'image/gif' in content_type:
-                    ext = '.gif'
-                elif 'image/webp' in content_type:
-                    ext = '.webp'
-                
-                # Salvar a imagem
-                nome_arquivo = f"{i+1}{ext}"
-                caminho_arquivo = os.path.join(diretorio_imovel, nome_arquivo)
-                
-                with open(caminho_arquivo, 'wb') as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-                
-                caminho_relativo = os.path.relpath(caminho_arquivo, OUTPUT_DIR)
-                caminhos_locais.append(caminho_relativo)
-                print(f"  ✓ Imagem {i+1} salva em {caminho_relativo}")
-            else:
-                print(f"  ✗ Erro ao baixar imagem {i+1}: Status code {response.status_code}")
-        
+            resultado = futuro.result()
+            caminho_relativo = os.path.relpath(resultado["arquivo"], OUTPUT_DIR)
+            caminhos_locais.append(caminho_relativo)
+            print(f"  ✓ Imagem {numero} salva em {caminho_relativo}")
         except Exception as e:
-            print(f"  ✗ Erro ao baixar imagem {i+1}: {e}")
+            print(f"  ✗ Erro ao baixar imagem {numero}: {e}")
     
     # Atualizar o objeto com os caminhos locais
     imovel["imagens_locais"] = caminhos_locais
@@ -460,6 +438,10 @@ def main():
         
     except Exception as e:
         print(f"\nErro durante a execução do scraper: {e}")
+    
+    finally:
+        BAIXADOR.encerrar()
+        print(BAIXADOR.resumo())
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,7 +1,6 @@
 import os
 import json
 import time
-import requests
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.firefox.service import Service
@@ -14,6 +13,7 @@ from tqdm import tqdm
 import pandas as pd
 from urllib.parse import urljoin
 import re
+from baixador import Baixador
 
 # Configurações
 BASE_URL = "https://www.novatorres.com.br"
@@ -26,6 +26,14 @@ DATA_FILE = os.path.join(OUTPUT_DIR, "imoveis.json")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
+# Headers das requisições das imagens (as páginas são lidas pelo navegador do Selenium)
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Downloads das imagens com sessão compartilhada, em paralelo e retomáveis
+BAIXADOR = Baixador(HEADERS)
+
 def configurar_selenium():
     """Configura e retorna uma instância do Selenium WebDriver com Firefox."""
     try:
@@ -219,49 +227,21 @@ def baixar_imagens(imovel):
     os.makedirs(diretorio_imovel, exist_ok=True)
     
     caminhos_locais = []
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
     
     print(f"Baixando {len(imovel['imagens'])} imagens para o imóvel {codigo}...")
     
-    for i, img_url in enumerate(imovel["imagens"]):
+    # Downloads em paralelo; a extensão do arquivo vem do Content-Type da resposta
+    agendadas = [(i + 1, BAIXADOR.agendar(img_url, os.path.join(diretorio_imovel, str(i + 1)), extensao_pelo_tipo=True))
+                 for i, img_url in enumerate(imovel["imagens"]) if img_url.startswith('http')]
+    
+    for numero, futuro in agendadas:
         try:
-            # Evitar URLs malformadas
-            if not img_url.startswith('http'):
-                continue
-                
-            # Fazer o download com timeout
-            response = requests.get(img_url, headers=headers, stream=True, timeout=10)
-            
-            if response.status_code == 200:
-                # Determinar o tipo de arquivo da imagem
-                content_type = response.headers.get('Content-Type', '')
-                ext = '.jpg'  # Extensão padrão
-                
-                if 'image/png' in content_type:
-                    ext = '.png'
-                elif 'image/gif' in content_type:
-                    ext = '.gif'
-                elif 'image/webp' in content_type:
-                    ext = '.webp'
-                
-                # Salvar a imagem
-                nome_arquivo = f"{i+1}{ext}"
-                caminho_arquivo = os.path.join(diretorio_imovel, nome_arquivo)
-                
-                with open(caminho_arquivo, 'wb') as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-                
-                caminho_relativo = os.path.relpath(caminho_arquivo, OUTPUT_DIR)
-                caminhos_locais.append(caminho_relativo)
-                print(f"  ✓ Imagem {i+1} salva em {caminho_relativo}")
-            else:
-                print(f"  ✗ Erro ao baixar imagem {i+1}: Status code {response.status_code}")
-        
+            resultado = futuro.result()
+            caminho_relativo = os.path.relpath(resultado["arquivo"], OUTPUT_DIR)
+            caminhos_locais.append(caminho_relativo)
+            print(f"  ✓ Imagem {numero} salva em {caminho_relativo}")
         except Exception as e:
-            print(f"  ✗ Erro ao baixar imagem {i+1}: {e}")
+            print(f"  ✗ Erro ao baixar imagem {numero}: {e}")
     
     # Atualizar o objeto com os caminhos locais
     imovel["imagens_locais"] = caminhos_locais
@@ -352,6 +332,8 @@ def main():
         if driver:
             print("\nFinalizando o WebDriver...")
             driver.quit()
+        BAIXADOR.encerrar()
+        print(BAIXADOR.resumo())
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,42 @@
+import re
+
+# Variantes de tamanho das fotos no CDN do site (.../ig/<variante>/imoveis/...):
+# it = miniatura, im = média, il = grande. Larguras aproximadas, usadas para escolher a
+# menor variante que atende a um pedido e para montar o srcset
+VARIANTES = {"it": 96, "im": 400, "il": 900}
+VARIANTE_GRANDE = "il"
+
+PADRAO_VARIANTE = re.compile(r"/(it|im|il)/")
+
+def variantes(url):
+    """{"it": url, "im": url, "il": url} de uma foto do CDN, ou {} se a URL não tiver variantes."""
+    if not url or not PADRAO_VARIANTE.search(url):
+        return {}
+    return {variante: PADRAO_VARIANTE.sub(f"/{variante}/", url, count=1) for variante in VARIANTES}
+
+def url_variante(url, variante):
+    """URL da foto na variante pedida (a própria URL se ela não tiver variantes)."""
+    return variantes(url).get(variante, url)
+
+def url_grande(url):
+    """URL da variante grande, a guardada em links_imagens."""
+    return url_variante(url, VARIANTE_GRANDE)
+
+def variante_para_largura(largura):
+    """Menor variante com largura maior ou igual à pedida (a grande se largura for None)."""
+    if not largura:
+        return VARIANTE_GRANDE
+    return next((variante for variante, largura_variante in sorted(VARIANTES.items(), key=lambda item: item[1])
+                 if largura_variante >= largura), VARIANTE_GRANDE)
+
+def srcset(url):
+    """{"src", "srcset", "variantes"} de uma foto, pronto para <img src srcset>.
+
+    Fotos sem variantes têm srcset None: só a URL original existe.
+    """
+    opcoes = variantes(url)
+    if not opcoes:
+        return {"src": url, "srcset": None, "variantes": {}}
+    return {"src": opcoes[VARIANTE_GRANDE],
+            "srcset": ", ".join(f"{opcoes[variante]} {largura}w" for variante, largura in VARIANTES.items()),
+            "variantes": opcoes}
@@ -0,0 +1,63 @@
+import sys
+import json
+from functools import partial
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent / "rag"))
+import assistente as modulo_assistente
+import indice
+from alteracoes import RegistroAlteracoes
+
+
+def imovel(codigo, preco="R$ 100.000,00"):
+    return {"codigo": codigo, "titulo": f"Imóvel {codigo}", "preco": preco, "caracteristicas": {}}
+
+
+def gravar_dados(data_dir, imoveis):
+    with open(data_dir / "imoveis_com_links.json", 'w', encoding='utf-8') as f:
+        json.dump(imoveis, f)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Diretório de dados temporário com snapshot e registro próprios; sem modelo de linguagem."""
+    gravar_dados(tmp_path, [imovel("1"), imovel("2")])
+    snapshot = tmp_path / "indice_imoveis.bin"
+    monkeypatch.setattr(modulo_assistente, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(modulo_assistente, "carregar_indice", partial(indice.carregar_indice, snapshot=snapshot))
+    monkeypatch.setattr(modulo_assistente, "gerar_snapshot", partial(indice.gerar_snapshot, snapshot=snapshot))
+    monkeypatch.setattr(modulo_assistente, "RegistroAlteracoes", lambda: RegistroAlteracoes(tmp_path / "imoveis_wal.jsonl"))
+    monkeypatch.setattr(modulo_assistente, "criar_modelo", lambda: None)
+    return tmp_path
+
+
+def test_alteracao_sobrevive_a_troca_dos_dados(data_dir):
+    assistente = modulo_assistente.AssistenteImobiliaria()
+    assistente.alterar_imovel({"op": "salvar", "imovel": imovel("3")})
+
+    # Nova raspagem troca os dados com alterações ainda no registro
+    gravar_dados(data_dir, [imovel("1"), imovel("2", "R$ 200.000,00"), imovel("4")])
+    # Alteração feita por um worker que ainda não recarregou o índice
+    assistente.alterar_imovel({"op": "remover", "codigo": "1"})
+
+    assert assistente.recarregar_dados()
+    assert assistente.indice.obter("3") is not None
+    assert assistente.indice.obter("1") is None
+    assert assistente.indice.obter("2")["preco"] == "R$ 200.000,00"
+    assert assistente.indice.obter("4") is not None
+    # O registro passa a apontar para a versão nova dos dados
+    base, alteracoes = assistente.registro.ler()
+    assert base == indice.carregar_indice(data_dir, snapshot=data_dir / "indice_imoveis.bin").versao
+    assert len(alteracoes) == 2
+
+    # Uma nova instância (outro worker, ou reinício) vê o mesmo resultado
+    outro = modulo_assistente.AssistenteImobiliaria()
+    assert outro.indice.versao == assistente.indice.versao
+
+    assert assistente.consolidar_alteracoes()
+    with open(data_dir / "imoveis_com_links.json", encoding='utf-8') as f:
+        assert sorted(item["codigo"] for item in json.load(f)) == ["2", "3", "4"]
+    assert assistente.registro.ler() == (assistente.indice.versao, [])
+    assert not assistente.consolidar_alteracoes()
@@ -0,0 +1,245 @@
+import sys
+import json
+import time
+import asyncio
+import threading
+from functools import partial
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(str(Path(__file__).parent.parent / "rag"))
+import app
+import assistente as modulo_assistente
+import indice
+from admissao import Faixa, Sobrecarga
+from alteracoes import RegistroAlteracoes
+from cache_http import CACHE_RESPOSTAS
+from sessoes import GerenciadorSessoes
+
+
+def imovel(codigo, dormitorios=2):
+    return {"codigo": codigo, "titulo": f"Casa {codigo}", "endereco": "Centro, Torres",
+            "preco": f"R$ {int(codigo) * 100}.000,00", "caracteristicas": {"Dormitórios": str(dormitorios)},
+            "descricao": "Casa ampla perto da praia " * 20}
+
+
+@pytest.fixture
+def dados(tmp_path, monkeypatch):
+    """Servidor sobre um diretório de dados temporário, sem modelo de linguagem nem tarefas periódicas."""
+    with open(tmp_path / "imoveis_com_links.json", 'w', encoding='utf-8') as f:
+        json.dump([imovel(str(codigo), codigo % 3 + 1) for codigo in range(1, 31)], f)
+    snapshot = tmp_path / "indice_imoveis.bin"
+    monkeypatch.setattr(modulo_assistente, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(modulo_assistente, "carregar_indice", partial(indice.carregar_indice, snapshot=snapshot))
+    monkeypatch.setattr(modulo_assistente, "gerar_snapshot", partial(indice.gerar_snapshot, snapshot=snapshot))
+    monkeypatch.setattr(modulo_assistente, "RegistroAlteracoes", lambda: RegistroAlteracoes(tmp_path / "imoveis_wal.jsonl"))
+    monkeypatch.setattr(modulo_assistente, "criar_modelo", lambda: None)
+
+    monkeypatch.setattr(app, "INTERVALO_RECARGA", 0)
+    monkeypatch.setattr(app, "INTERVALO_CONSOLIDACAO", 0)
+    monkeypatch.setattr(app, "assistente", None)
+    monkeypatch.setattr(app, "gerenciador_respostas", None)
+    monkeypatch.setattr(app, "erro_inicializacao", None)
+    monkeypatch.setattr(app, "gerenciador_sessoes", GerenciadorSessoes())
+    CACHE_RESPOSTAS.limpar()
+    return tmp_path
+
+
+def aguardar_pronto(cliente, limite=10):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        resposta = cliente.get("/pronto")
+        if resposta.status_code == 200:
+            return resposta
+        time.sleep(0.05)
+    raise AssertionError(f"Servidor não ficou pronto: {resposta.json()}")
+
+
+@pytest.fixture
+def cliente(dados):
+    with TestClient(app.app) as cliente:
+        aguardar_pronto(cliente)
+        yield cliente
+
+
+def test_pronto_so_depois_de_carregar_os_dados(dados, monkeypatch):
+    liberar = threading.Event()
+
+    def carregar_devagar():
+        liberar.wait(10)
+        return modulo_assistente.AssistenteImobiliaria()
+
+    monkeypatch.setattr(app, "AssistenteImobiliaria", carregar_devagar)
+    with TestClient(app.app) as cliente:
+        try:
+            # O servidor responde enquanto os dados ainda estão sendo carregados
+            assert cliente.get("/saude").json() == {"status": "ok"}
+            for rota in ("/pronto", "/buscar"):
+                resposta = cliente.get(rota)
+                assert resposta.status_code == 503
+                assert resposta.headers["Retry-After"] == "1"
+        finally:
+            liberar.set()
+        assert aguardar_pronto(cliente).json()["imoveis"] == 30
+        assert cliente.get("/buscar").status_code == 200
+
+
+def test_pronto_informa_erro_de_inicializacao(dados, monkeypatch):
+    def falhar():
+        raise RuntimeError("arquivo de imóveis ilegível")
+
+    monkeypatch.setattr(app, "AssistenteImobiliaria", falhar)
+    with TestClient(app.app) as cliente:
+        fim = time.monotonic() + 10
+        while app.erro_inicializacao is None and time.monotonic() < fim:
+            time.sleep(0.05)
+        resposta = cliente.get("/pronto")
+        assert resposta.status_code == 503
+        assert "arquivo de imóveis ilegível" in resposta.json()["detail"]
+        assert cliente.get("/saude").status_code == 200
+
+
+def test_buscar_revalida_com_etag(cliente):
+    sem_compressao = {"Accept-Encoding": "identity"}
+    primeira = cliente.get("/buscar", params={"dormitorios": 2}, headers=sem_compressao)
+    assert "Content-Encoding" not in primeira.headers
+    assert primeira.status_code == 200
+    assert len(primeira.json()) == 10
+    etag = primeira.headers["ETag"]
+
+    repetida = cliente.get("/buscar", params={"dormitorios": 2}, headers={**sem_compressao, "If-None-Match": etag})
+    assert repetida.status_code == 304
+    assert repetida.content == b""
+    assert repetida.headers["ETag"] == etag
+
+    # A versão comprimida é outra representação do mesmo recurso: também confere
+    comprimida = cliente.get("/buscar", params={"dormitorios": 2}, headers={"Accept-Encoding": "gzip"})
+    assert comprimida.headers["Content-Encoding"] == "gzip"
+    assert comprimida.headers["ETag"] != etag
+    assert comprimida.json() == primeira.json()
+    assert cliente.get("/buscar", params={"dormitorios": 2},
+                       headers={"If-None-Match": comprimida.headers["ETag"]}).status_code == 304
+
+    # Outros filtros são outro recurso
+    assert cliente.get("/buscar", params={"dormitorios": 3}, headers={**sem_compressao, "If-None-Match": etag}).status_code == 200
+
+    # Uma alteração nos dados muda a versão do índice e invalida o ETag
+    app.assistente.alterar_imovel({"op": "salvar", "imovel": imovel("1", dormitorios=3)})
+    alterada = cliente.get("/buscar", params={"dormitorios": 2}, headers={**sem_compressao, "If-None-Match": etag})
+    assert alterada.status_code == 200
+    assert alterada.headers["ETag"] != etag
+    assert "1" not in [item["codigo"] for item in alterada.json()]
+
+
+def test_faixa_recusa_quando_a_fila_esta_cheia():
+    async def cenario():
+        faixa = Faixa("teste", limite=1, fila_max=1)
+        liberar = asyncio.Event()
+
+        async def ocupar():
+            async with faixa.admitir():
+                await liberar.wait()
+
+        primeira = asyncio.create_task(ocupar())
+        segunda = asyncio.create_task(ocupar())
+        await asyncio.sleep(0)
+        assert (faixa.em_execucao, faixa.aguardando) == (1, 1)
+
+        # Sem vaga e com a fila cheia: recusada na hora, sem esperar
+        with pytest.raises(Sobrecarga):
+            async with faixa.admitir():
+                pass
+
+        liberar.set()
+        await asyncio.gather(primeira, segunda)
+        assert faixa.estado() == {"limite": 1, "fila_max": 1, "em_execucao": 0, "aguardando": 0,
+                                  "admitidas": 2, "recusadas": 1}
+
+    asyncio.run(cenario())
+
+
+def test_faixa_cheia_responde_503(cliente, monkeypatch):
+    monkeypatch.setattr(app, "FAIXA_RAPIDA", Faixa("rapida", limite=0, fila_max=0))
+    monkeypatch.setattr(app, "FAIXA_LLM", Faixa("llm", limite=0, fila_max=0))
+
+    for resposta in (cliente.get("/buscar"), cliente.post("/perguntar", json={"pergunta": "casa com 2 dormitórios"})):
+        assert resposta.status_code == 503
+        assert resposta.headers["Retry-After"] == "1"
+        assert "sobrecarregado" in resposta.json()["detail"]
+
+    # As rotas fora das faixas continuam respondendo
+    assert cliente.get("/pronto").status_code == 200
+    faixas = cliente.get("/metricas").json()["admissao"]["faixas"]
+    assert faixas["rapida"]["recusadas"] == 1
+    assert faixas["llm"]["recusadas"] == 1
+
+
+def test_resposta_assincrona(cliente):
+    pergunta = {"pergunta": "Quero uma casa com 2 dormitórios no centro", "assincrono": True}
+    inicial = cliente.post("/perguntar", json=pergunta).json()
+    # Os imóveis vêm na hora; o texto é gerado em segundo plano
+    assert inicial["resposta"] == ""
+    assert inicial["imoveis_relacionados"]
+    answer_id = inicial["answer_id"]
+
+    concluida = cliente.get(f"/respostas/{answer_id}", params={"aguardar": 5}).json()
+    assert concluida["answer_id"] == answer_id
+    assert concluida["status"] == "concluida"
+    assert concluida["resposta"]
+
+    assert cliente.get("/respostas/inexistente").status_code == 404
+
+    # Respostas concluídas há mais de RESPOSTA_TTL são descartadas na próxima submissão
+    app.gerenciador_respostas.ttl = -1
+    cliente.post("/perguntar", json=pergunta)
+    assert cliente.get(f"/respostas/{answer_id}").status_code == 404
+
+
+class ModeloTravado:
+    """Modelo que nunca termina de responder, até ser cancelado."""
+    nome = "travado"
+
+    def __init__(self):
+        self.cancelado = False
+
+    async def apredict(self, prompt):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelado = True
+            raise
+
+
+class RequisicaoDesconectada:
+    """Requisição cujo cliente desconecta na segunda verificação."""
+
+    def __init__(self):
+        self.verificacoes = 0
+
+    async def is_disconnected(self):
+        self.verificacoes += 1
+        return self.verificacoes >= 2
+
+
+def test_desconexao_cancela_a_chamada_ao_modelo(dados, monkeypatch):
+    monkeypatch.setattr(app, "INTERVALO_DESCONEXAO", 0.01)
+    monkeypatch.setattr(modulo_assistente, "LIMITE_LLM", 1)
+    assistente = modulo_assistente.AssistenteImobiliaria()
+    assistente.llm = ModeloTravado()
+    contexto = assistente.preparar_resposta("Quero uma casa com 2 dormitórios no centro")
+    assert contexto["prompt"]
+
+    async def cenario():
+        requisicao = RequisicaoDesconectada()
+        resultado = await app.executar_enquanto_conectado(requisicao, assistente.agerar_resposta(contexto))
+        assert resultado is None
+        assert requisicao.verificacoes == 2
+        await asyncio.sleep(0)
+        # A vaga do modelo foi liberada pela tarefa cancelada
+        assert assistente.llm.cancelado
+        assert assistente.fila_llm == 0
+        assert not assistente._semaforo_llm.locked()
+
+    asyncio.run(cenario())
@@ -0,0 +1,153 @@
+import sys
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+import requests
+
+sys.path.append(str(Path(__file__).parent.parent))
+from src.armazem_imagens import ArmazemImagens
+from src.baixador import Baixador, MetadadosUrls, HEADERS, TENTATIVAS
+
+
+class Servidor(BaseHTTPRequestHandler):
+    """Serve `conteudo` em qualquer caminho, com ETag e respostas 304."""
+
+    conteudo = b"imagem-1"
+    user_agents = []
+
+    def do_GET(self):
+        Servidor.user_agents.append(self.headers.get("User-Agent"))
+        etag = '"' + hashlib.sha1(self.conteudo).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(self.conteudo)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(self.conteudo)
+
+    def log_message(self, *_):
+        pass
+
+
+@pytest.fixture
+def url():
+    Servidor.conteudo = b"imagem-1"
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Servidor)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{servidor.server_port}/ig/il/foto.jpg"
+    servidor.shutdown()
+
+
+def test_baixar_depois_de_baixar_para_armazem(tmp_path, url):
+    metadados = MetadadosUrls(tmp_path / "metadados_urls.json")
+    armazem = ArmazemImagens(tmp_path / "armazem")
+    destino = tmp_path / "images" / "1.jpg"
+
+    with Baixador(workers=2, metadados=metadados) as baixador:
+        blob = baixador.baixar_para_armazem(url, armazem)["blob"]
+        # Mesma URL e mesmo conteúdo, agora para um arquivo: a entrada só tinha "blob"
+        resultado = baixador.baixar(url, destino)
+        assert destino.read_bytes() == b"imagem-1"
+        assert not resultado["inalterado"]
+        assert metadados.obter(url)["blob"] == blob
+
+        # Com o arquivo intacto, o próximo pedido é condicional
+        assert baixador.baixar(url, destino)["inalterado"]
+        assert baixador.baixar_para_armazem(url, armazem)["inalterado"]
+
+
+def test_user_agent_de_navegador(tmp_path, url):
+    Servidor.user_agents = []
+    with Baixador(metadados=MetadadosUrls(tmp_path / "metadados_urls.json")) as baixador:
+        baixador.baixar(url, tmp_path / "padrao.jpg")
+    with Baixador({"User-Agent": "Outro/1.0"}, metadados=MetadadosUrls(tmp_path / "outros.json")) as baixador:
+        baixador.baixar(url, tmp_path / "outro.jpg")
+    assert Servidor.user_agents == [HEADERS["User-Agent"], "Outro/1.0"]
+
+
+def test_conteudo_novo_invalida_o_blob_anterior(tmp_path, url):
+    metadados = MetadadosUrls(tmp_path / "metadados_urls.json")
+    armazem = ArmazemImagens(tmp_path / "armazem")
+    destino = tmp_path / "images" / "1.jpg"
+
+    with Baixador(workers=2, metadados=metadados) as baixador:
+        blob_antigo = baixador.baixar_para_armazem(url, armazem)["blob"]
+        Servidor.conteudo = b"imagem-2"
+        baixador.baixar(url, destino)
+        assert metadados.obter(url)["blob"] is None
+
+        # Sem o blob antigo registrado, a imagem nova é baixada para o armazém em vez de um 304
+        resultado = baixador.baixar_para_armazem(url, armazem)
+        assert not resultado["inalterado"]
+        assert resultado["blob"] != blob_antigo
+        assert armazem.caminho_blob(resultado["blob"]).read_bytes() == b"imagem-2"
+
+
+class Instavel(BaseHTTPRequestHandler):
+    """503 sempre em /fora, conexão fechada sem resposta em /cai, e em /corte a conexão
+    cai no meio do corpo na primeira vez."""
+
+    conteudo = bytes(range(256)) * 2048  # 512 KB: mais de um bloco de leitura
+    pedidos = {}
+
+    def do_GET(self):
+        Instavel.pedidos[self.path] = Instavel.pedidos.get(self.path, 0) + 1
+        if self.path == "/cai":
+            self.close_connection = True
+            return
+        if self.path == "/fora":
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        inicio = int(self.headers["Range"][len("bytes="):].rstrip("-")) if self.headers.get("Range") else 0
+        self.send_response(206 if inicio else 200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(self.conteudo) - inicio))
+        if inicio:
+            self.send_header("Content-Range", f"bytes {inicio}-{len(self.conteudo) - 1}/{len(self.conteudo)}")
+        self.end_headers()
+        if Instavel.pedidos[self.path] == 1:
+            self.wfile.write(self.conteudo[:300 * 1024])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(self.conteudo[inicio:])
+
+    def log_message(self, *_):
+        pass
+
+
+@pytest.fixture
+def instavel():
+    Instavel.pedidos = {}
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Instavel)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{servidor.server_port}"
+    servidor.shutdown()
+
+
+def test_uma_camada_de_tentativas(tmp_path, instavel):
+    with Baixador(metadados=MetadadosUrls(tmp_path / "metadados_urls.json")) as baixador:
+        baixador.sessao.get_adapter("http://").max_retries.backoff_factor = 0
+        with pytest.raises(requests.HTTPError):
+            baixador.baixar(f"{instavel}/fora", tmp_path / "fora.jpg")
+        # Só as tentativas do Retry da sessão, sem outra camada por cima
+        assert Instavel.pedidos["/fora"] == TENTATIVAS + 1
+        with pytest.raises(requests.ConnectionError):
+            baixador.baixar(f"{instavel}/cai", tmp_path / "cai.jpg")
+        assert Instavel.pedidos["/cai"] == TENTATIVAS + 1
+
+        # Corpo interrompido: retomado com Range de onde parou
+        resultado = baixador.baixar(f"{instavel}/corte", tmp_path / "corte.jpg")
+        assert resultado["retomado"]
+        assert (tmp_path / "corte.jpg").read_bytes() == Instavel.conteudo
+        assert Instavel.pedidos["/corte"] == 2
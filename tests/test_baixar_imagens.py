@@ -0,0 +1,85 @@
+import io
+import sys
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from PIL import Image, ImageDraw
+
+sys.path.append(str(Path(__file__).parent.parent))
+import baixar_imagens
+from src.armazem_imagens import ArmazemImagens
+from src.baixador import Baixador, MetadadosUrls
+
+
+def foto(variante, largura=320, qualidade=90):
+    """Uma "foto" com formas, para os hashes perceptuais terem estrutura."""
+    imagem = Image.new("RGB", (320, 240), "white")
+    desenho = ImageDraw.Draw(imagem)
+    if variante == "casa":
+        desenho.rectangle((60, 100, 260, 230), fill="brown")
+        desenho.polygon([(40, 100), (160, 20), (280, 100)], fill="darkred")
+    else:
+        desenho.ellipse((20, 20, 140, 140), fill="navy")
+        desenho.rectangle((180, 120, 310, 230), fill="green")
+    imagem = imagem.resize((largura, largura * 3 // 4))
+    saida = io.BytesIO()
+    imagem.save(saida, "JPEG", quality=qualidade)
+    return saida.getvalue()
+
+
+class Servidor(BaseHTTPRequestHandler):
+    arquivos = {}
+    pedidos = Counter()
+
+    def do_GET(self):
+        Servidor.pedidos[self.path] += 1
+        conteudo = self.arquivos[self.path]
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(conteudo)))
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+    def log_message(self, *_):
+        pass
+
+
+@pytest.fixture
+def servidor(tmp_path, monkeypatch):
+    Servidor.arquivos = {
+        "/il/1.jpg": foto("casa"),
+        "/il/2.jpg": foto("casa", largura=240, qualidade=40),  # mesma foto, menor e mais comprimida
+        "/il/3.jpg": foto("outra"),
+    }
+    Servidor.pedidos = Counter()
+    http = ThreadingHTTPServer(("127.0.0.1", 0), Servidor)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+
+    monkeypatch.setattr(baixar_imagens, "ARMAZEM", ArmazemImagens(tmp_path / "armazem"))
+    monkeypatch.setattr(baixar_imagens, "ARQUIVO_URLS_DUPLICADAS", tmp_path / "urls_duplicadas.json")
+    monkeypatch.setattr(baixar_imagens, "_baixador", Baixador(metadados=MetadadosUrls(tmp_path / "metadados.json")))
+    monkeypatch.setattr(baixar_imagens, "_hashes_perceptuais", {})
+    monkeypatch.setattr(baixar_imagens, "_hashes_por_conteudo", None)
+    monkeypatch.setattr(baixar_imagens, "_urls_duplicadas", None)
+    yield f"http://127.0.0.1:{http.server_port}"
+    baixar_imagens.baixador().encerrar()
+    http.shutdown()
+
+
+def test_quase_duplicatas_nao_sao_registradas_nem_baixadas_de_novo(servidor):
+    urls = [f"{servidor}/il/{n}.jpg" for n in (1, 2, 3)]
+
+    assert baixar_imagens.baixar_imagens_imovel("-100", urls) == 2
+    blobs = baixar_imagens.ARMAZEM.imagens("-100", baixar_imagens.COLECAO)
+    assert sorted(blobs) == ["1.jpg", "2.jpg"]
+    assert baixar_imagens.ARMAZEM.caminho_blob(blobs["2.jpg"]).read_bytes() == Servidor.arquivos["/il/3.jpg"]
+
+    # Na próxima execução a URL repetida nem é pedida
+    baixar_imagens.salvar_urls_duplicadas()
+    baixar_imagens._urls_duplicadas = None
+    assert baixar_imagens.baixar_imagens_imovel("-100", urls) == 2
+    assert Servidor.pedidos["/il/2.jpg"] == 1
+    assert Servidor.pedidos["/il/1.jpg"] == 2
@@ -0,0 +1,71 @@
+import io
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+sys.path.append(str(Path(__file__).parent.parent / "rag"))
+import imagens
+from armazem_imagens import ArmazemImagens
+from catalogo_imagens import CatalogoImagens, atualizar_catalogo, conectar
+
+
+def jpeg(largura):
+    saida = io.BytesIO()
+    Image.new("RGB", (largura, largura // 2), "red").save(saida, "JPEG")
+    return saida.getvalue()
+
+
+@pytest.fixture
+def catalogo(tmp_path, monkeypatch):
+    """Diretório images_new com uma imagem catalogada e o catálogo apontado pelo módulo."""
+    diretorio = tmp_path / "images_new"
+    (diretorio / "-100").mkdir(parents=True)
+    arquivo = diretorio / "-100" / "1.jpg"
+    arquivo.write_bytes(jpeg(200))
+
+    armazem = ArmazemImagens(tmp_path / "armazem")
+    monkeypatch.setattr(imagens, "ARMAZEM", armazem)
+    monkeypatch.setattr(imagens, "DIRETORIOS_LOCAIS", {"images": ("images_new", diretorio)})
+    monkeypatch.setattr(armazem, "fontes", lambda colecao: {"-100/1.jpg": arquivo} if colecao == "images_new" else {})
+
+    conexao = conectar(tmp_path / "catalogo.sqlite")
+    atualizar_catalogo(conexao, armazem, workers=1)
+    conexao.close()
+    monkeypatch.setattr(imagens, "CATALOGO", CatalogoImagens(tmp_path / "catalogo.sqlite"))
+    return arquivo
+
+
+def test_entrada_catalogo_confere_o_arquivo(catalogo):
+    entrada = imagens.entrada_catalogo("images/-100/1.jpg")
+    assert entrada["valida"] and entrada["largura"] == 200
+
+
+def test_entrada_catalogo_ignora_arquivo_alterado(catalogo):
+    # Arquivo trocado depois da catalogação: a largura e a validade registradas não valem mais
+    catalogo.write_bytes(b"<html>erro</html>")
+    assert imagens.entrada_catalogo("images/-100/1.jpg") is None
+
+    catalogo.write_bytes(jpeg(200))
+    info = catalogo.stat()
+    os.utime(catalogo, ns=(info.st_atime_ns, info.st_mtime_ns + 10**9))
+    assert imagens.entrada_catalogo("images/-100/1.jpg") is None
+
+
+def test_hashes_limitados_e_remotos_expiram(monkeypatch):
+    redimensionador = imagens.RedimensionadorImagens(cache=object())
+    monkeypatch.setattr(imagens, "IMAGEM_HASHES_MAX", 2)
+    remoto = ("remoto", "https://www.novatorres.com.br/ig/im/1.jpg", "https://www.novatorres.com.br/ig/il/1.jpg")
+    redimensionador._guardar_hash(remoto, "a")
+    redimensionador._guardar_hash(("local", "/x/1.jpg", 10, 1), "b")
+    redimensionador._guardar_hash(("local", "/x/2.jpg", 10, 1), "c")
+    assert redimensionador._hash_conhecido(remoto) is None
+    assert len(redimensionador.hashes) == 2
+
+    redimensionador._guardar_hash(remoto, "a")
+    assert redimensionador._hash_conhecido(remoto) == "a"
+    monkeypatch.setattr(imagens, "IMAGEM_HASHES_TTL", -1)
+    assert redimensionador._hash_conhecido(remoto) is None
+    assert redimensionador._hash_conhecido(("local", "/x/2.jpg", 10, 1)) == "c"
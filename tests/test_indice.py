@@ -0,0 +1,76 @@
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent / "rag"))
+from indice import IndiceImoveis, ListaImoveisMapeada, MAGIC
+
+
+@pytest.fixture
+def origem(tmp_path):
+    imoveis = [{"codigo": str(codigo), "titulo": f"Casa {codigo}", "endereco": "Centro, Torres",
+                "preco": f"R$ {codigo * 1000},00", "caracteristicas": {"dormitorios": str(codigo % 4)},
+                "links_imagens": ["https://www.novatorres.com.br/ig/il/1.jpg", ""]}
+               for codigo in range(1, 51)]
+    caminho = tmp_path / "imoveis_com_links.json"
+    caminho.write_text(json.dumps(imoveis), encoding='utf-8')
+    return caminho
+
+
+def test_snapshot_ida_e_volta(tmp_path, origem):
+    original = IndiceImoveis.do_json(origem)
+    snapshot = tmp_path / "indice.bin"
+    original.salvar_snapshot(snapshot)
+
+    carregado = IndiceImoveis.do_snapshot(snapshot, origem)
+    assert isinstance(carregado.imoveis, ListaImoveisMapeada)
+    assert carregado.versao == original.versao
+    assert list(carregado.imoveis) == list(original.imoveis)
+    assert list(carregado.precos) == list(original.precos)
+    assert list(carregado.dormitorios) == list(original.dormitorios)
+    assert carregado.localizacao == original.localizacao
+    assert carregado.obter("7") == original.obter("7")
+    assert carregado.filtrar({"dormitorios": 2}) == original.filtrar({"dormitorios": 2})
+
+
+def test_snapshot_corrompido_ou_desatualizado(tmp_path, origem):
+    snapshot = tmp_path / "indice.bin"
+    IndiceImoveis.do_json(origem).salvar_snapshot(snapshot)
+
+    conteudo = bytearray(snapshot.read_bytes())
+    conteudo[-1] ^= 0xFF
+    corrompido = tmp_path / "corrompido.bin"
+    corrompido.write_bytes(bytes(conteudo))
+    assert IndiceImoveis.do_snapshot(corrompido, origem) is None
+
+    invalido = tmp_path / "invalido.bin"
+    invalido.write_bytes(b"X" * len(MAGIC) + bytes(conteudo[len(MAGIC):]))
+    assert IndiceImoveis.do_snapshot(invalido, origem) is None
+
+    origem.write_text(origem.read_text(encoding='utf-8') + "\n", encoding='utf-8')
+    assert IndiceImoveis.do_snapshot(snapshot, origem) is None
+
+
+def test_cache_de_imoveis_com_varias_threads(tmp_path, origem):
+    snapshot = tmp_path / "indice.bin"
+    IndiceImoveis.do_json(origem).salvar_snapshot(snapshot)
+    carregado = IndiceImoveis.do_snapshot(snapshot, origem)
+    # Cache bem menor que o número de imóveis: descartes o tempo todo
+    carregado.imoveis.maximo_cache = 4
+    # Trocar de thread com frequência para expor disputas no cache
+    intervalo = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    def ler(inicio):
+        return [carregado.imoveis[(inicio + passo) % len(carregado.imoveis)]["codigo"] for passo in range(2000)]
+
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for inicio, codigos in zip(range(8), executor.map(ler, range(8))):
+                assert codigos[0] == str(inicio + 1)
+    finally:
+        sys.setswitchinterval(intervalo)
+    assert len(carregado.imoveis.cache) <= 4